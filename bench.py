@@ -0,0 +1,165 @@
+import argparse
+import concurrent.futures
+import json
+import os
+import subprocess
+import sys
+import time
+
+from runs import hyperpaynt_dir, paynt_exe, limit_resources
+from tab import parse_metrics
+
+qest_dir = os.path.join(hyperpaynt_dir, "qest")
+
+# the HyperPaynt tables of qest_eval.sh: projects, additional arguments, time limit, columns and metrics fields
+suites = {
+    "Table2-HyperPaynt": {
+        "projects": "eval/qest/HyperProb_bench", "args": [], "timeout": 3600,
+        "header": ["Case Study", "Feasible", "MDP size", "AR family size", "AR time", "AR iters", "Percentage explored"],
+        "fields": ["project", "feasible", "quotient_states", "family_size", "synthesis_time", "iterations_mdp", "explored"],
+    },
+    "Table3-HyperPaynt": {
+        "projects": "eval/qest/SD", "args": [], "timeout": 3600,
+        "header": ["Maze", "Feasible", "MDP size", "AR family size", "AR time", "AR iters", "Percentage explored"],
+        "fields": ["project", "feasible", "quotient_states", "family_size", "synthesis_time", "iterations_mdp", "explored"],
+    },
+    "Table4": {
+        "projects": ["eval/qest/SD/splash-1", "eval/qest/SD/larger-1", "eval/qest/SD/larger-3"],
+        "args": ["--explore_all"], "timeout": 7200,
+        "header": ["Maze", "AR time", "AR iters", "Percentage explored", "Feasible instances"],
+        "fields": ["project", "synthesis_time", "iterations_mdp", "explored", "ar_sat_members"],
+    },
+    "Table5-ProbNI": {
+        "projects": "eval/qest/ProbNI", "args": [], "timeout": 3600,
+        "header": ["Maze", "Feasible", "MDP size", "AR family size", "AR time", "AR iters"],
+        "fields": ["project", "feasible", "quotient_states", "family_size", "synthesis_time", "iterations_mdp"],
+    },
+    "Table5-Opacity": {
+        "projects": "eval/qest/Opacity", "args": [], "timeout": 3600,
+        "header": ["Maze", "MDP size", "AR family size", "AR time", "AR iters", "max distance"],
+        "fields": ["project", "quotient_states", "family_size", "synthesis_time", "iterations_mdp", "optimum"],
+    },
+}
+
+
+def discover_projects(root):
+    ''' Directories below root containing a sketch, in a deterministic order. '''
+    projects = []
+    for path, dirs, files in os.walk(os.path.join(hyperpaynt_dir, root)):
+        dirs.sort()
+        if "sketch.templ" in files:
+            projects.append(os.path.relpath(path, hyperpaynt_dir))
+    return sorted(projects)
+
+
+def suite_projects(suite):
+    projects = suite["projects"]
+    if isinstance(projects, list):
+        return projects
+    return discover_projects(projects)
+
+
+def run_id(table, project):
+    return f"{table}--{project.replace(os.sep, '_')}"
+
+
+def run_benchmark(task, runs_dir, method, memory_limit):
+    '''
+    Run HyperPaynt on a project, writing its output and metrics stream to the runs directory.
+    :return the record of the finished run
+    '''
+    table, project, args, timeout = task
+    identifier = run_id(table, project)
+    log_path = os.path.join(runs_dir, identifier + ".log")
+    metrics_path = os.path.join(runs_dir, identifier + ".jsonl")
+    if os.path.exists(metrics_path):
+        os.remove(metrics_path)
+
+    call = [sys.executable, paynt_exe, "--project", project, "--method", method, "--metrics", metrics_path] + args
+    start = time.time()
+    status = "finished"
+    with open(log_path, "w") as log:
+        log.write("$ " + " ".join(call) + "\n")
+        log.flush()
+        process = subprocess.Popen(call, stdout=log, stderr=subprocess.STDOUT, cwd=hyperpaynt_dir,
+                                   preexec_fn=limit_resources(timeout, memory_limit))
+        try:
+            returncode = process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            returncode = process.wait()
+            status = "timeout"
+    if status == "finished" and returncode != 0:
+        status = "failed"
+    return {"id": identifier, "table": table, "project": project, "status": status,
+            "returncode": returncode, "wall_time": time.time() - start}
+
+
+def read_results(results_path):
+    ''' Records of the runs finished by previous (possibly interrupted) sweeps. '''
+    results = {}
+    if not os.path.exists(results_path):
+        return results
+    with open(results_path) as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            results[record["id"]] = record
+    return results
+
+
+def write_table(table, suite, runs_dir):
+    ''' Write the CSV of a table from the metrics streams of its runs. '''
+    runs_path = os.path.join(runs_dir, table + ".jsonl")
+    with open(runs_path, "w") as runs_file:
+        for project in suite_projects(suite):
+            metrics_path = os.path.join(runs_dir, run_id(table, project) + ".jsonl")
+            if not os.path.exists(metrics_path):
+                continue
+            with open(metrics_path) as metrics_file:
+                runs_file.write(metrics_file.read())
+    parse_metrics(runs_path, os.path.join(qest_dir, table + ".csv"), suite["header"], suite["fields"])
+
+
+def main():
+    argp = argparse.ArgumentParser(description="run the HyperPaynt benchmarks of qest_eval.sh in parallel")
+    argp.add_argument("tables", nargs="*", default=list(suites), help=f"tables to regenerate: {', '.join(suites)}")
+    argp.add_argument("--jobs", type=int, default=os.cpu_count(), help="number of benchmarks run in parallel")
+    argp.add_argument("--method", default="ar", help="synthesis method")
+    argp.add_argument("--timeout", type=int, default=None, help="time limit of every run in seconds (CPU and wall)")
+    argp.add_argument("--memory_limit", type=int, default=None, help="memory limit of every run in MB")
+    argp.add_argument("--runs_dir", default=os.path.join(qest_dir, "runs"), help="directory of the run outputs")
+    argp.add_argument("--fresh", action="store_true", help="rerun benchmarks finished by a previous sweep")
+    args = argp.parse_args()
+
+    os.makedirs(args.runs_dir, exist_ok=True)
+    results_path = os.path.join(args.runs_dir, "results.jsonl")
+    finished = {} if args.fresh else read_results(results_path)
+
+    tasks = []
+    for table in args.tables:
+        suite = suites[table]
+        timeout = args.timeout if args.timeout is not None else suite["timeout"]
+        for project in suite_projects(suite):
+            if run_id(table, project) in finished:
+                continue
+            tasks.append((table, project, suite["args"], timeout))
+    print(f"{len(tasks)} benchmarks to run, {len(finished)} finished by previous sweeps", flush=True)
+
+    with open(results_path, "a") as results_file:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            futures = [pool.submit(run_benchmark, task, args.runs_dir, args.method, args.memory_limit) for task in tasks]
+            for future in concurrent.futures.as_completed(futures):
+                record = future.result()
+                results_file.write(json.dumps(record) + "\n")
+                results_file.flush()
+                print(f"> {record['id']}: {record['status']} in {round(record['wall_time'], 1)} s", flush=True)
+
+    for table in args.tables:
+        write_table(table, suites[table], args.runs_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,16 @@ import os
 from . import version
 
 from .hypersketch.hypersketch import HyperSketch
+from .hypersketch.hyperparser import HyperParser
 from .hypersynthesizers.hypersynthesizer import *
+from .synthesizers.models import MarkovChain
+from .synthesizers.statistic import Statistic
+from .profiler import Profiler
+from .synthesizers.quotient import QuotientContainer
+from .hypersynthesizers.hyperquotient import HyperPropertyQuotientContainer
+from .hypersynthesizers.frontier import Frontier
+from .hypersynthesizers.checkpoint import Checkpoint
+from .hypersynthesizers.searchtrace import SearchTrace
 
 import logging
 # logger = logging.getLogger(__name__)
@@ -41,9 +50,62 @@ def setup_logger(log_path = None):
 @click.option("--props", default="sketch.props", show_default=True, help="name of the properties file in the project")
 @click.option("--method", type=click.Choice(['onebyone', 'cegis', 'ar', 'hybrid'], case_sensitive=False), default="ar")
 @click.option("--explore_all", is_flag=True, default=False, help="explore all the design space")
+@click.option("--group_all_pairs", is_flag=True, default=False,
+    help="decide the instances of a hyperproperty for all pairs of quantified states as a single constraint")
+@click.option("--ce_wave_bisection", is_flag=True, default=False,
+    help="locate the violating wave of a counterexample by binary search instead of a linear scan")
+@click.option("--linear_solver", type=click.Choice(['gmmxx', 'native', 'eigen', 'elimination', 'topological']),
+    default=None, help="linear equation solver used for DTMCs [default: the one pinned for the project, or gmmxx]")
+@click.option("--minmax_method", type=click.Choice(['value_iteration', 'policy_iteration', 'topological',
+    'interval_iteration', 'optimistic_value_iteration', 'sound_value_iteration']),
+    default=None, help="min-max method used for MDPs [default: the one pinned for the project, or value_iteration]")
+@click.option("--solver_autotune", is_flag=True, default=False,
+    help="choose the fastest solvers meeting the precision by timing them on the first families explored by AR "
+         "(ar and hybrid methods) and pin them for later runs of the project in its solvers.json")
+@click.option("--precision_escalation", is_flag=True, default=False,
+    help="model check MDPs at a coarse precision first and refine only verdicts close to a threshold")
+@click.option("--coarse_precision", type=float, default=1e-3, show_default=True,
+    help="precision of the coarse model checking (see --precision_escalation)")
+@click.option("--adaptive_property_order", is_flag=True, default=False,
+    help="evaluate cheap and frequently refuting constraints first")
+@click.option("--qualitative_cache", is_flag=True, default=False,
+    help="strengthen reachability formulae by the probability-0/1 states precomputed once on the quotient (storm still runs its own precomputation on every family)")
+@click.option("--symbolic_precheck", type=click.Choice(["dd", "hybrid"]), default=None,
+    help="precheck the whole design space on the quotient built as a decision diagram by the given engine before synthesis: synthesis is skipped if no member can be a solution (families are not restricted symbolically)")
+@click.option("--minimize_quotient", is_flag=True, default=False,
+    help="minimize the quotient MDP by a bisimulation that preserves holes")
+@click.option("--prune_holes", is_flag=True, default=False,
+    help="fix holes that cannot affect any property to a single option (ignored when exploring all the design space)")
+@click.option("--merge_options", is_flag=True, default=False,
+    help="collapse hole options with indistinguishable actions into a single option (ignored when exploring all the design space)")
+@click.option("--metrics", type=click.Path(), default=None,
+    help="append the configuration, progress and summary of the run to this file as JSON lines")
+@click.option("--profiling", is_flag=True, default=False,
+    help="measure wall and CPU time of each phase and print the call tree of timers")
+@click.option("--export_trace", type=click.Path(), default=None,
+    help="export the profiled spans to this file in the Chrome trace format (chrome://tracing, speedscope)")
+@click.option("--frontier_memory", type=int, default=None,
+    help="memory budget of the AR frontier in MB; beyond it, undecided families are spilled to a file")
+@click.option("--spill_dir", type=click.Path(file_okay=False), default=None,
+    help="directory of the file with spilled families (default: system temporary directory)")
+@click.option("--checkpoint", type=click.Path(dir_okay=False), default=None,
+    help="periodically save the AR/hybrid search to this file and resume from it if it exists; on SIGTERM, "
+         "the search is saved once the current family is analyzed, since the signal is only handled after "
+         "the running model checking call returns (send SIGTERM well before a hard time limit)")
+@click.option("--checkpoint_period", type=int, default=300, show_default=True,
+    help="seconds between two checkpoints")
+@click.option("--track_memory", is_flag=True, default=False,
+    help="report the RSS, traced memory, AR frontier, live MDPs and solver assertions, also per profiled phase")
+@click.option("--record_trace", type=click.Path(dir_okay=False), default=None,
+    help="record the analysis and the split of every AR family to this file as JSON lines (see replay.py); "
+         "a run resumed from a checkpoint continues the trace")
 
 def paynt(
-        project, sketch, props, method, explore_all
+        project, sketch, props, method, explore_all, group_all_pairs, ce_wave_bisection,
+        linear_solver, minmax_method, solver_autotune, precision_escalation, coarse_precision,
+        adaptive_property_order, qualitative_cache, symbolic_precheck, minimize_quotient, prune_holes, merge_options,
+        metrics, profiling, export_trace, frontier_memory, spill_dir, checkpoint, checkpoint_period, track_memory,
+        record_trace
 ):
     logger.info("This is HyperPaynt version {}.".format(version()))
 
@@ -53,6 +115,39 @@ def paynt(
     sketch_path = os.path.join(project, sketch)
     properties_path = os.path.join(project, props)
 
+    HyperParser.group_all_pairs = group_all_pairs
+    HyperSynthesizerCEGIS.wave_bisection = ce_wave_bisection
+    # solvers given on the command line take precedence over the ones pinned for the project
+    MarkovChain.pinned_solvers_path = os.path.join(project, MarkovChain.pinned_solvers_file)
+    pinned_solvers = MarkovChain.pinned_solvers()
+    MarkovChain.linear_solver = linear_solver or pinned_solvers.get("linear_solver", MarkovChain.linear_solver)
+    MarkovChain.minmax_method = minmax_method or pinned_solvers.get("minmax_method", MarkovChain.minmax_method)
+    MarkovChain.autotune_solvers = solver_autotune
+    MarkovChain.precision_escalation = precision_escalation
+    MarkovChain.coarse_precision = coarse_precision
+    MarkovChain.adaptive_property_order = adaptive_property_order
+    QuotientContainer.use_qualitative_cache = qualitative_cache
+    HyperPropertyQuotientContainer.symbolic_precheck_engine = symbolic_precheck
+    HyperPropertyQuotientContainer.minimize = minimize_quotient
+    # fixing irrelevant holes or merging options would change the number of satisfying assignments
+    HyperPropertyQuotientContainer.prune_holes = prune_holes and not explore_all
+    HyperPropertyQuotientContainer.merge_options = merge_options and not explore_all
+    Frontier.memory_budget = frontier_memory
+    Frontier.spill_dir = spill_dir
+    Checkpoint.path = checkpoint
+    Checkpoint.period = checkpoint_period
+    SearchTrace.path = record_trace
+
+    Profiler.enabled = profiling or export_trace is not None or track_memory
+    Profiler.trace = export_trace is not None
+    Statistic.print_profiling = profiling
+    Statistic.metrics_path = metrics
+    # the solvers in effect, including the ones pinned for the project
+    Statistic.emit("config", **dict(click.get_current_context().params,
+        linear_solver=MarkovChain.linear_solver, minmax_method=MarkovChain.minmax_method))
+    if track_memory:
+        Statistic.start_memory_tracking()
+
     sketch = HyperSketch(sketch_path, properties_path)
     logger.info("Synthetizing an MDP scheduler wrt a hyperproperty")
 
@@ -78,6 +173,8 @@ def paynt(
     explore_all = explore_all or has_some_optimality
 
     synthesizer.run(explore_all)
+    if export_trace is not None:
+        Profiler.export_trace(export_trace)
 
 def main():
     # setup_logger("paynt.log")
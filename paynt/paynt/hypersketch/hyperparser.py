@@ -1,8 +1,9 @@
 import stormpy
 
-from .hyperproperty import HyperProperty, SchedulerOptimalityHyperProperty, HyperSpecification
+from .hyperproperty import HyperProperty, AllPairsHyperProperty, SchedulerOptimalityHyperProperty, HyperSpecification
 from ..sketch.holes import DesignSpace
 from ..sketch.property import Property, OptimalityProperty
+from ..sketch.sketch import Sketch
 
 from collections import defaultdict
 
@@ -24,6 +25,9 @@ class HyperParsingException(Exception):
 # TODO: implement parsing of OptimalityHyperProperty
 class HyperParser:
 
+    # whether the instances of a hyperproperty for all pairs of quantified states are grouped into one constraint
+    group_all_pairs = False
+
     def __init__(self):
         self.sched_quant_dict = {}
         self.state_quant_dict = {}
@@ -50,6 +54,13 @@ class HyperParser:
         DesignSpace.matching_hole_indexes = defaultdict(list)
 
         self.prism = None
+        # quotient MDP read from a DRN file (None for PRISM sketches)
+        self.explicit_model = None
+        # for an explicit model, the valuation of each state stored in the DRN file
+        self.state_names = None
+        # for a PRISM sketch, the values of the program variables in each initial state
+        self.initial_state_valuations = None
+        self.expression_manager = None
 
     def parse_scheduler_quants(self, path):
         # read lines
@@ -283,7 +294,7 @@ class HyperParser:
     # instantiate the properties for the initial states according to their quantifiers
     def spread_properties(self, nr_initial_states, model):
         n_sched_quants = len(self.sched_quant_dict)
-        assert model.has_state_valuations()
+        assert self.state_names is not None or model.has_state_valuations()
 
         for state_var, value in self.state_quant_dict.items():
             state_quant, associated_sched = value
@@ -291,7 +302,7 @@ class HyperParser:
             sched_index = list(self.sched_quant_dict).index(associated_sched)
             sched_quant_ref = f"sched_quant={sched_index}"
             for state in model.initial_states:
-                state_name = model.state_valuations.get_string(state)
+                state_name = self.state_name(model, state)
                 if sched_quant_ref in state_name or n_sched_quants == 1:
                     initial_states.append(state)
 
@@ -313,6 +324,13 @@ class HyperParser:
                 spread_lines = list(map(lambda x: self.grow_vertically(x, state_var, initial_states), self.lines))
                 self.lines = [item for sublist in spread_lines for item in sublist]
 
+    @staticmethod
+    def parse_formula(string, prism):
+        ''' Parse properties for the PRISM program, or without context for an explicit model. '''
+        if prism is None:
+            return stormpy.parse_properties_without_context(string)
+        return stormpy.parse_properties_for_prism_program(string, prism)
+
     def parse_hyperproperty(self, prop, prism):
         bound_re = re.compile(r'(.*?)\s--\s(.*?)$')
         prop_re = re.compile(r'(.*?(\{(\w+)\})(.*?))(\s(<=|<|=>|>)\s)(.*?(\{(\w+)\})(.*?))$')
@@ -354,11 +372,11 @@ class HyperParser:
             p = p.replace(match.group(4), reward_structure_match.group(1) + "=?" + reward_structure_match.group(2))
             other_p = None
 
-        ps = stormpy.parse_properties_for_prism_program(p, prism)
+        ps = self.parse_formula(p, prism)
         p = ps[0]
 
         if multitarget:
-            other_ps = stormpy.parse_properties_for_prism_program(other_p, prism)
+            other_ps = self.parse_formula(other_p, prism)
             other_p = other_ps[0]
         return HyperProperty(p, other_p, multitarget, state_quant, compare_state, op, bound)
 
@@ -384,7 +402,7 @@ class HyperParser:
         state_id = int(match.group(3))
         string = match.group(1) + match.group(4)
 
-        props = stormpy.parse_properties_for_prism_program(string, prism)
+        props = self.parse_formula(string, prism)
         prop = props[0]
         rf = prop.raw_formula
         assert rf.has_bound != rf.has_optimality_type, "optimizing formula contains a bound or a comparison formula does not"
@@ -422,8 +440,67 @@ class HyperParser:
 
             if indexes:
                 HyperSpecification.disjoint_indexes.append(indexes)
+        if HyperParser.group_all_pairs:
+            properties = self.group_pairs(properties)
         return HyperSpecification(properties, self.optimality_property, self.scheduler_optimality_hyperproperty)
 
+    def group_pairs(self, properties):
+        '''
+        Replace the conjunction of the instances of a hyperproperty for all pairs of states from two sets by a single
+        AllPairsHyperProperty; only constraints that are not part of a disjunction are considered.
+        :return the new list of constraints (HyperSpecification.disjoint_indexes is updated accordingly)
+        '''
+        # conjunctive instances of the same hyperproperty
+        instances = defaultdict(list)
+        for indexes in HyperSpecification.disjoint_indexes:
+            prop = properties[indexes[0]]
+            if len(indexes) != 1 or not isinstance(prop, HyperProperty):
+                continue
+            secondary_formula_str = str(prop.secondary_formula_str) if prop.multitarget else None
+            key = (str(prop.primary_formula_str), secondary_formula_str, prop.op, prop.min_bound)
+            instances[key].append(indexes[0])
+
+        grouped = {}
+        for key, indexes in instances.items():
+            if len(indexes) < 2:
+                continue
+            pairs = set([(properties[index].state, properties[index].other_state) for index in indexes])
+            states = sorted(set([state for state, _ in pairs]))
+            other_states = sorted(set([other_state for _, other_state in pairs]))
+            all_pairs = set([(state, other_state) for state in states for other_state in other_states])
+            distinct_pairs = set([(state, other_state) for state, other_state in all_pairs if state != other_state])
+            if pairs == all_pairs:
+                exclude_identical = False
+            elif pairs == distinct_pairs:
+                exclude_identical = True
+            else:
+                continue
+            group = AllPairsHyperProperty(properties[indexes[0]], states, other_states, exclude_identical)
+            logger.info(f"Grouping {len(indexes)} instances into a single constraint: {group}")
+            grouped[indexes[0]] = group
+            for index in indexes[1:]:
+                grouped[index] = None
+
+        if not grouped:
+            return properties
+
+        # rebuild the constraints and their disjunctions
+        new_properties = []
+        new_index = {}
+        for index, prop in enumerate(properties):
+            prop = grouped.get(index, prop)
+            if prop is None:
+                continue
+            new_index[index] = len(new_properties)
+            new_properties.append(prop)
+        disjoint_indexes = []
+        for indexes in HyperSpecification.disjoint_indexes:
+            indexes = [new_index[index] for index in indexes if index in new_index]
+            if indexes:
+                disjoint_indexes.append(indexes)
+        HyperSpecification.disjoint_indexes = disjoint_indexes
+        return new_properties
+
     def parse_properties(self, sketch_path, properties_path):
 
         # parsing the scheduler quantifiers
@@ -456,14 +533,26 @@ class HyperParser:
 
         # parse program
         logger.info(f"Loading sketch from {sketch_path}...")
-        logger.info(f"Assuming a sketch in a PRISM format ...")
-        prism = self.parse_program(sketch_path)
+        logger.info(f"Attempting to parse model in explicit format ...")
+        self.explicit_model = Sketch.read_explicit_model(sketch_path)
+        if self.explicit_model is not None:
+            logger.info(f"Successfully parsed model in explicit format.")
+            prism = None
+            self.state_names = self.read_state_names(sketch_path, self.explicit_model.nr_states)
+            self.expression_manager = stormpy.ExpressionManager()
+            # the explicit model is the quotient itself
+            dummy_model = self.explicit_model
+        else:
+            logger.info(f"Assuming a sketch in a PRISM format ...")
+            prism = self.parse_program(sketch_path)
+            self.expression_manager = prism.expression_manager
+
+            # dummy model for instantiating the properties
+            builder_options = stormpy.BuilderOptions()
+            builder_options.set_build_state_valuations(True)
+            dummy_model = stormpy.build_sparse_model_with_options(prism, builder_options)
+            self.initial_state_valuations = self.read_initial_state_valuations(prism, dummy_model)
         self.prism = prism
-
-        # dummy model for instantiating the properties
-        builder_options = stormpy.BuilderOptions()
-        builder_options.set_build_state_valuations(True)
-        dummy_model = stormpy.build_sparse_model_with_options(prism, builder_options)
         nr_initial_states = len(dummy_model.initial_states)
         logger.info(f"The model has {nr_initial_states} initial states...")
 
@@ -474,6 +563,54 @@ class HyperParser:
         logger.info(f"Found the following specification:\n {specification}")
         return specification, prism
 
+    @staticmethod
+    def read_initial_state_valuations(prism, model):
+        ''' For each initial state, the pairs of a program variable and its value. '''
+        variables = list(prism.global_boolean_variables) + list(prism.global_integer_variables)
+        for module in prism.modules:
+            variables += list(module.boolean_variables) + list(module.integer_variables)
+        valuations = {}
+        for state in model.initial_states:
+            valuation = []
+            for variable in variables:
+                var = variable.expression_variable
+                if var.has_boolean_type():
+                    valuation.append((var, model.state_valuations.get_boolean_value(state, var)))
+                else:
+                    valuation.append((var, model.state_valuations.get_integer_value(state, var)))
+            valuations[state] = valuation
+        return valuations
+
+    @staticmethod
+    def read_state_names(path, nr_states):
+        '''
+        Read the state valuations of an explicit model: export_to_drn stores the valuation of each state as a
+        comment right after the state line. For more than one scheduler quantifier, the valuations must contain
+        the variable sched_quant identifying the copy of the model a state belongs to.
+        '''
+        state_names = []
+        valuation_expected = False
+        with open(path) as file:
+            for line in file:
+                if line.startswith("state "):
+                    if valuation_expected:
+                        break
+                    valuation_expected = True
+                elif valuation_expected:
+                    if not line.startswith("//"):
+                        break
+                    state_names.append(line[2:].rstrip("\n"))
+                    valuation_expected = False
+        if len(state_names) != nr_states:
+            raise HyperParsingException(f"the explicit model {path} does not contain the valuation of every state")
+        return state_names
+
+    def state_name(self, model, state):
+        ''' The valuation of a state of the quotient as a string. '''
+        if self.state_names is not None:
+            return self.state_names[state]
+        return model.state_valuations.get_string(state)
+
     def parse_scheduler_variable(self, state_name):
 
         n_sched_quants = len(self.sched_quant_dict)
@@ -491,7 +628,7 @@ class HyperParser:
         return sched_index, sched_name, initial_states, hole_name
 
     def parse_state_name_expression(self, state_name, parse_state_quant= False):
-        expression_parser = stormpy.storage.ExpressionParser(self.prism.expression_manager)
+        expression_parser = stormpy.storage.ExpressionParser(self.expression_manager)
         expression_parser.set_identifier_mapping(dict())
         valuations_dict = {}
         l = state_name.replace('[', '').replace(']', '').split('&')
@@ -517,7 +654,7 @@ class HyperParser:
         return valuations_dict
 
     def check_constraint_inclusion(self, structural_constraint, c_schedulers, variable_expressions, associated_scheduler):
-        expression_parser = stormpy.storage.ExpressionParser(self.prism.expression_manager)
+        expression_parser = stormpy.storage.ExpressionParser(self.expression_manager)
         expression_parser.set_identifier_mapping(variable_expressions)
         modified = True
         while modified:
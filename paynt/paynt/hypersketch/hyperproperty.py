@@ -1,3 +1,4 @@
+import math
 import operator
 
 import stormpy
@@ -79,6 +80,84 @@ class HyperProperty(Property):
     def reward(self):
         return self.primary_formula.is_reward_operator
 
+    @property
+    def quantified_states(self):
+        ''' States in which the formulae of this hyperproperty are evaluated. '''
+        return [self.state, self.other_state]
+
+    def map_states(self, state_map):
+        self.state = state_map[self.state]
+        self.other_state = state_map[self.other_state]
+
+    def evaluated_pair(self, result, result_alt):
+        ''' The pair of states whose values decide this hyperproperty. '''
+        return self.state, self.other_state
+
+
+class AllPairsHyperProperty(HyperProperty):
+    '''
+    Conjunction of the instances of a hyperproperty for all pairs of distinct states from two sets, as produced by
+    universal state quantifiers. The conjunction holds iff it holds for the pair with the largest violation, which
+    is found from the two value vectors without enumerating the pairs.
+    '''
+
+    def __init__(self, prototype, states, other_states, exclude_identical):
+        other_prop = prototype.secondary_property if prototype.multitarget else None
+        super().__init__(prototype.primary_property, other_prop, prototype.multitarget,
+                         prototype.state, prototype.other_state, prototype.op, prototype.min_bound)
+        self.states = states
+        self.other_states = other_states
+        # whether pairs of identical states are excluded
+        self.exclude_identical = exclude_identical
+
+    def __str__(self):
+        secondary_formula_str = self.secondary_formula_str if self.multitarget else self.primary_formula_str
+        return f"{self.primary_formula_str}[{self.states}] {self.op} {secondary_formula_str}[{self.other_states}] " \
+               f"(all pairs) -- min_distance: {self.min_bound}"
+
+    @property
+    def quantified_states(self):
+        return list(self.states) + list(self.other_states)
+
+    def map_states(self, state_map):
+        super().map_states(state_map)
+        self.states = sorted(set([state_map[state] for state in self.states]))
+        self.other_states = sorted(set([state_map[state] for state in self.other_states]))
+
+    def value_badness(self, value):
+        ''' The larger, the more the value contributes to the violation. '''
+        if not self.result_valid(value):
+            return math.inf
+        return value if self.minimizing else -value
+
+    def threshold_badness(self, threshold):
+        return -threshold if self.minimizing else threshold
+
+    @staticmethod
+    def two_worst(states, badness):
+        worst = []
+        for state in states:
+            worst.append((badness[state], state))
+            worst.sort(reverse=True)
+            worst = worst[:2]
+        return worst
+
+    def evaluated_pair(self, result, result_alt):
+        value_badness = {state: self.value_badness(result.at(state)) for state in self.states}
+        threshold_badness = {state: self.threshold_badness(result_alt.at(state)) for state in self.other_states}
+        # badness is separable, hence the worst pair of distinct states is among the two worst states of each set
+        best_pair, best_badness = None, None
+        for value_bad, state in AllPairsHyperProperty.two_worst(self.states, value_badness):
+            for threshold_bad, other_state in AllPairsHyperProperty.two_worst(self.other_states, threshold_badness):
+                if self.exclude_identical and state == other_state:
+                    continue
+                badness = value_bad if value_bad == math.inf else value_bad + threshold_bad
+                if best_badness is None or badness > best_badness:
+                    best_pair, best_badness = (state, other_state), badness
+        assert best_pair is not None
+        # the pair is carried by the property result: scheduler selection and counterexamples read it from there
+        return best_pair
+
 
 # TODO: implement optimality hyperproperties
 class OptimalityHyperProperty(HyperProperty):
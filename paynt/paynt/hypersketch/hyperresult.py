@@ -12,11 +12,14 @@ class HyperPropertyResult:
         # result_alt is basically the secondary direction
         self.result_alt = result_alt
 
+        # the pair of states deciding the hyperproperty
+        self.state, self.other_state = prop.evaluated_pair(result, result_alt)
+
         #setting the result value
-        self.value = result.at(prop.state)
+        self.value = result.at(self.state)
 
         # set the threshold
-        self.threshold = result_alt.at(prop.other_state)
+        self.threshold = result_alt.at(self.other_state)
 
         self.sat = prop.satisfies_threshold(self.value, self.threshold)
 
@@ -24,8 +27,11 @@ class HyperPropertyResult:
         # TODO: implement me!
         self.improves_hyperoptimum = False
 
+        # whether the result was computed at the coarse precision (see MDP.full_precision_result)
+        self.coarse = False
+
     def __str__(self):
-        return f"{self.value}[{self.property.state}] {self.property.op} {self.threshold}[{self.property.other_state}]: {self.sat}"
+        return f"{self.value}[{self.state}] {self.property.op} {self.threshold}[{self.other_state}]: {self.sat}"
 
 
 class HyperConstraintsResult:
@@ -143,6 +149,55 @@ class HyperSpecificationResult:
         # constraints undecided
         return None, None, True
 
+    def priority_selections(self, family):
+        '''
+        Construct hole selections preferred by the schedulers of the undecided results, ordered from the most to
+        the least restrictive: (1) options on which all schedulers agree, with disagreements resolved by the option
+        rankings of the scores, (2) all options chosen by some scheduler.
+        :return a list of selections, each selection being a list of options for every hole of the family
+        '''
+        undecided = [self.constraints_result.results[index] for index in self.constraints_result.undecided_constraints]
+        if self.optimality_result is not None and self.optimality_result.can_improve:
+            undecided.append(self.optimality_result)
+
+        # collect the scheduler selections together with the option rankings of their scores
+        selections = []
+        for res in undecided:
+            if res.primary_selection is not None:
+                selections.append((res.primary_selection, res.primary_scores, res.property.minimizing))
+            if isinstance(res, MdpHyperPropertyResult) and res.secondary_selection is not None:
+                selections.append((res.secondary_selection, res.secondary_scores, not res.property.minimizing))
+        if not selections:
+            return []
+
+        consistent_selection = []
+        union_selection = []
+        for hole_index, hole in enumerate(family):
+            chosen = [[option for option in selection[hole_index] if option in hole.options]
+                      for selection, _, _ in selections]
+            chosen = [options for options in chosen if options]
+            if not chosen:
+                consistent_selection.append(hole.options)
+                union_selection.append(hole.options)
+                continue
+
+            union = list(set().union(*chosen))
+            union_selection.append(union)
+            agreed = list(set.intersection(*[set(options) for options in chosen]))
+            if not agreed:
+                # schedulers disagree: prefer the option ranked best by the first scheduler having a ranking
+                for _, scores, minimizing in selections:
+                    ranking = [] if scores is None else scores[1].get(hole_index, [])
+                    ranking = [option for option in ranking if option in union]
+                    if ranking:
+                        agreed = [ranking[-1] if minimizing else ranking[0]]
+                        break
+                else:
+                    agreed = union
+            consistent_selection.append(agreed)
+
+        return [consistent_selection, union_selection]
+
     def undecided_result(self):
         best_res = None
         max_score = 0
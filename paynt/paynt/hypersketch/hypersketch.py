@@ -15,6 +15,7 @@ class HyperSketch:
         Profiler.start("sketch")
 
         self.prism = None
+        self.explicit_model = None
         self.hole_expressions = None
 
         self.design_space = None
@@ -27,6 +28,7 @@ class HyperSketch:
         specification, prism = sketch_parser.parse_properties(sketch_path, properties_path)
         self.specification = specification
         self.prism = prism
+        self.explicit_model = sketch_parser.explicit_model
 
         # initializing the Model Checking options
         MarkovChain.initialize(self.specification.stormpy_formulae())
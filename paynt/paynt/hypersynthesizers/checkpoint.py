@@ -0,0 +1,154 @@
+import hashlib
+import os
+import pickle
+import signal
+import time
+
+from ..sketch.holes import DesignSpace
+from .searchtrace import SearchTrace
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class Checkpoint:
+    '''
+    Periodic snapshot of the AR loop (of AR and hybrid synthesis) allowing a later run to continue the search:
+    the frontier families, the explored and discarded counters, the statistics, the current optimum with its
+    assignment, the blocking clauses of the SAT solver and the length of the search trace.
+    '''
+
+    # checkpoint file (None to disable checkpoints); a run resumes from an existing checkpoint
+    path = None
+    # seconds between two checkpoints
+    period = 300
+
+    # format of the checkpoint file
+    version = 2
+
+    # counters of the statistic carried over to the resumed run
+    statistic_counters = [
+        "iterations_dtmc", "acc_size_dtmc", "acc_conflicts", "cegis_sat_members", "cegis_unsat_members",
+        "iterations_mdp", "acc_size_mdp", "acc_decided_families", "acc_decided_families_size",
+        "ar_sat_members", "ar_unsat_members",
+    ]
+
+    def __init__(self, synthesizer):
+        self.synthesizer = synthesizer
+        self.last_save = time.time()
+        self.interrupted = False
+        self.previous_handler = None
+        if Checkpoint.path is not None:
+            # save the search when terminated, e.g. by a time limit
+            self.previous_handler = signal.signal(signal.SIGTERM, self.interrupt)
+
+    def interrupt(self, signum, frame):
+        # Python runs signal handlers between bytecodes, i.e. only after a running storm call returns
+        logger.info("Termination requested, saving a checkpoint after the current iteration.")
+        self.interrupted = True
+
+    def fingerprint(self):
+        ''' Digest of the method, the design space and the specification the checkpoint belongs to. '''
+        sketch = self.synthesizer.sketch
+        digest = hashlib.sha256()
+        digest.update(self.synthesizer.method_name.encode())
+        for hole in sketch.design_space:
+            digest.update(f"{hole.name}:{hole.options}:{hole.option_labels}:{hole.associated_schedulers};".encode())
+        digest.update(str(sketch.specification).encode())
+        # parent infos refer to the choices and the states of the quotient, which depend on its construction
+        quotient = sketch.quotient
+        digest.update(f"{quotient.quotient_mdp.nr_states}:{quotient.quotient_mdp.nr_choices};".encode())
+        digest.update(f"{quotient.minimize}:{quotient.prune_holes}:{quotient.merge_options};".encode())
+        return digest.hexdigest()
+
+    def due(self):
+        if Checkpoint.path is None:
+            return False
+        return self.interrupted or time.time() - self.last_save >= Checkpoint.period
+
+    def save(self, families, assignment):
+        '''
+        Write the state of the search to the checkpoint file (atomically).
+        :param families frontier of the AR loop
+        :param assignment best assignment found so far (or None)
+        '''
+        try:
+            synthesizer = self.synthesizer
+            state = {
+                "version": Checkpoint.version,
+                "fingerprint": self.fingerprint(),
+                "families": families.snapshot(),
+                "explored": synthesizer.explored,
+                "discarded": synthesizer.sketch.quotient.discarded,
+                "since_last_optimum_update": synthesizer.since_last_optimum_update,
+                "synthesis_time": synthesizer.stat.synthesis_time.read(),
+                "statistic": {counter: getattr(synthesizer.stat, counter) for counter in Checkpoint.statistic_counters},
+                "optimum": synthesizer.current_optimum(),
+                "assignment": None if assignment is None else [list(hole.options) for hole in assignment],
+                "solver": DesignSpace.solver_snapshot(),
+                "trace_recorded": SearchTrace.path is not None,
+                "trace_offset": synthesizer.search_trace.offset(),
+            }
+            temporary_path = Checkpoint.path + ".tmp"
+            with open(temporary_path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, Checkpoint.path)
+        except Exception:
+            self.restore_handler()
+            raise
+        self.last_save = time.time()
+        logger.info(f"Checkpoint with {len(families)} undecided families saved to {Checkpoint.path}.")
+
+        if self.interrupted:
+            raise SystemExit(f"Synthesis interrupted, resume it by running again with --checkpoint {Checkpoint.path}")
+
+    def resume(self, families):
+        '''
+        Restore the search from the checkpoint file if it exists.
+        :param families frontier of the AR loop, replaced by the checkpointed families
+        :return best assignment found before the checkpoint (or None)
+        '''
+        if Checkpoint.path is None or not os.path.exists(Checkpoint.path):
+            return None
+        with open(Checkpoint.path, "rb") as f:
+            state = pickle.load(f)
+        if state["version"] != Checkpoint.version or state["fingerprint"] != self.fingerprint():
+            raise ValueError(f"The checkpoint {Checkpoint.path} belongs to a different sketch, specification or method")
+
+        if SearchTrace.path is not None and not state["trace_recorded"]:
+            raise ValueError(f"The checkpoint {Checkpoint.path} was saved without --record_trace, "
+                             f"the trace would miss the families analyzed before it")
+
+        synthesizer = self.synthesizer
+        synthesizer.search_trace.resume(state["trace_offset"])
+        families.restore(state["families"])
+        synthesizer.explored = state["explored"]
+        synthesizer.sketch.quotient.discarded = state["discarded"]
+        synthesizer.since_last_optimum_update = state["since_last_optimum_update"]
+        synthesizer.stat.synthesis_time.time += state["synthesis_time"]
+        for counter, value in state["statistic"].items():
+            setattr(synthesizer.stat, counter, value)
+        if state["optimum"] is not None:
+            synthesizer.sketch.specification.update_optimum(state["optimum"])
+        if state["solver"] is not None:
+            DesignSpace.solver_restore(state["solver"])
+
+        assignment = None
+        if state["assignment"] is not None:
+            assignment = synthesizer.sketch.design_space.copy()
+            assignment.assume_options(state["assignment"])
+        logger.info(f"Resumed from the checkpoint {Checkpoint.path}: {len(families)} undecided families, "
+                    f"{round(state['synthesis_time'], 1)} s of synthesis so far.")
+        return assignment
+
+    def restore_handler(self):
+        ''' Reinstall the SIGTERM handler replaced by the checkpoint. '''
+        if self.previous_handler is not None:
+            signal.signal(signal.SIGTERM, self.previous_handler)
+            self.previous_handler = None
+
+    def finished(self):
+        ''' The search is complete, a later run starts over. '''
+        self.restore_handler()
+        if Checkpoint.path is not None and os.path.exists(Checkpoint.path):
+            os.remove(Checkpoint.path)
@@ -0,0 +1,264 @@
+import os
+import pickle
+import tempfile
+from array import array
+
+from ..sketch.holes import DesignSpace, ParentInfo
+from ..synthesizers.statistic import object_size
+from ..profiler import Profiler
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class Frontier:
+    '''
+    Undecided families of the AR loop in their exploration order. Once the estimated memory of the resident
+    families exceeds the memory budget, the coldest families (the ones explored last) are spilled to a file
+    as the options of their refined holes together with the parent info, and they are reloaded when the
+    resident families are exhausted. The exploration order is the same as for a plain list.
+    '''
+
+    # memory budget of the resident families in MB (None for unbounded)
+    memory_budget = None
+    # directory of the spill file (None for the system temporary directory)
+    spill_dir = None
+    # fraction of the resident families spilled at once
+    spill_fraction = 0.5
+    # the bytes per family are re-estimated after this many families were added
+    estimate_period = 64
+    # number of families measured by an estimate
+    estimate_sample = 8
+
+    def __init__(self, design_space, dfs, properties):
+        '''
+        :param properties properties of the specification; analysis hints refer to them by their position, which
+          keeps the spilled and checkpointed hints valid across runs
+        '''
+        self.design_space = design_space
+        self.dfs = dfs
+
+        # the exploration order is head, spilled batches and tail; DFS explores from the end of head and
+        # keeps the tail empty, BFS explores from the start of head and appends to the tail while something is
+        # spilled or the tail is not empty yet
+        self.head = []
+        self.batches = []       # spilled batches: (file offset, number of families), in the exploration order
+        self.tail = []
+        self.spilled = 0
+
+        self.spill_file = None
+        self.properties = list(properties)
+        self.property_index = {id(prop): index for index, prop in enumerate(self.properties)}
+        self.num_specification_properties = len(self.properties)
+
+        self.bytes_per_family = None
+        self.added_since_estimate = 0
+        self.spills = 0
+        self.reloads = 0
+
+    def __len__(self):
+        return len(self.head) + self.spilled + len(self.tail)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def resident(self):
+        ''' Families kept in memory. '''
+        return self.head + self.tail
+
+    def append(self, family):
+        self.extend([family])
+
+    def extend(self, families):
+        if self.dfs or (not self.batches and not self.tail):
+            self.head.extend(families)
+        else:
+            self.tail.extend(families)
+        self.added_since_estimate += len(families)
+        self.check_budget()
+
+    def check_budget(self):
+        if Frontier.memory_budget is None or len(self.head) + len(self.tail) == 0:
+            return
+        if self.bytes_per_family is None or self.added_since_estimate >= Frontier.estimate_period:
+            self.estimate_bytes_per_family()
+        resident = len(self.head) + len(self.tail)
+        if resident > 1 and resident * self.bytes_per_family > Frontier.memory_budget * 2**20:
+            self.spill()
+
+    def pop(self):
+        if not self.head:
+            if self.batches:
+                self.reload()
+            else:
+                self.head, self.tail = self.tail, []
+        if self.dfs:
+            return self.head.pop(-1)
+        return self.head.pop(0)
+
+    def estimate_bytes_per_family(self):
+        ''' Estimate the memory of a resident family; objects shared by the sampled families are counted once. '''
+        resident = self.resident()
+        step = max(1, len(resident) // Frontier.estimate_sample)
+        sample = resident[::step][:Frontier.estimate_sample]
+        seen = set()
+        self.bytes_per_family = sum(object_size(family, seen) for family in sample) / len(sample)
+        self.added_since_estimate = 0
+
+    def compress_family(self, family):
+        ''' Options of the holes refined wrt the design space. '''
+        return [(hole_index, array("q", hole.options)) for hole_index, hole in enumerate(family)
+                if hole.options != self.design_space[hole_index].options]
+
+    def compress_parent_info(self, parent_info):
+        if parent_info is None:
+            return None
+        hints = None
+        if parent_info.analysis_hints is not None:
+            hints = []
+            for prop, (hint_prim, hint_seco) in parent_info.analysis_hints.items():
+                if id(prop) not in self.property_index:
+                    self.property_index[id(prop)] = len(self.properties)
+                    self.properties.append(prop)
+                hints.append((self.property_index[id(prop)], hint_prim, hint_seco))
+        return (parent_info.property_indices, hints, parent_info.refinement_depth, parent_info.selected_actions,
+                parent_info.hole_selected_actions, parent_info.splitters)
+
+    def decompress_family(self, hole_options, parent_info):
+        holes = self.design_space.subholes([(hole_index, list(options)) for hole_index, options in hole_options])
+        return DesignSpace(holes, parent_info)
+
+    def decompress_parent_info(self, record):
+        if record is None:
+            return None
+        parent_info = ParentInfo()
+        property_indices, hints, parent_info.refinement_depth, parent_info.selected_actions, \
+            parent_info.hole_selected_actions, parent_info.splitters = record
+        parent_info.property_indices = property_indices
+        if hints is not None:
+            parent_info.analysis_hints = {self.properties[index]: (hint_prim, hint_seco) for index, hint_prim, hint_seco in hints}
+        return parent_info
+
+    def spill(self):
+        ''' Write the coldest resident families to the spill file. '''
+        Profiler.start("frontier::spill")
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile(prefix="paynt-frontier-", dir=Frontier.spill_dir)
+        # DFS spills the bottom of the stack, BFS the end of the queue (preceding the spilled batches if no tail)
+        explored_after_batches = True
+        if self.dfs:
+            count = max(1, int(len(self.head) * Frontier.spill_fraction))
+            cold, self.head = self.head[:count], self.head[count:]
+        elif self.tail:
+            cold, self.tail = self.tail, []
+        else:
+            count = max(1, int(len(self.head) * Frontier.spill_fraction))
+            self.head, cold = self.head[:-count], self.head[-count:]
+            explored_after_batches = False
+
+        # parent infos shared by siblings are compressed and stored once
+        parent_records = {}
+        families = []
+        for family in cold:
+            key = id(family.parent_info)
+            if key not in parent_records:
+                parent_records[key] = self.compress_parent_info(family.parent_info)
+            families.append((self.compress_family(family), parent_records[key]))
+
+        self.spill_file.seek(0, os.SEEK_END)
+        offset = self.spill_file.tell()
+        pickle.dump(families, self.spill_file, protocol=pickle.HIGHEST_PROTOCOL)
+        batch = (offset, len(families))
+        if explored_after_batches:
+            self.batches.append(batch)
+        else:
+            self.batches.insert(0, batch)
+        self.spilled += len(families)
+        self.spills += 1
+        logger.debug(f"spilled {len(families)} families ({self.spilled} on disk, {len(self.head) + len(self.tail)} resident)")
+        Profiler.resume()
+
+    def reload(self):
+        ''' Load the spilled batch that is explored next. '''
+        Profiler.start("frontier::reload")
+        offset, count = self.batches.pop(-1) if self.dfs else self.batches.pop(0)
+        self.spill_file.seek(offset)
+        families = pickle.load(self.spill_file)
+        parent_infos = {}
+        for hole_options, parent_record in families:
+            if id(parent_record) not in parent_infos:
+                parent_infos[id(parent_record)] = self.decompress_parent_info(parent_record)
+            self.head.append(self.decompress_family(hole_options, parent_infos[id(parent_record)]))
+        self.spilled -= count
+        self.reloads += 1
+        if not self.batches:
+            # nothing is spilled anymore, the spill file can be reused from the start
+            self.spill_file.seek(0)
+            self.spill_file.truncate()
+        Profiler.resume()
+
+    def read_batch(self, batch):
+        offset, _ = batch
+        self.spill_file.seek(offset)
+        return pickle.load(self.spill_file)
+
+    def snapshot(self):
+        '''
+        All families in their exploration order as picklable records, for a checkpoint. Hints of properties that
+          are not a part of the specification are dropped with the whole hints of their parent.
+        '''
+        parent_records = {}
+        records = []
+
+        def add_resident(families):
+            for family in families:
+                key = id(family.parent_info)
+                if key not in parent_records:
+                    parent_records[key] = self.compress_parent_info(family.parent_info)
+                records.append((self.compress_family(family), parent_records[key]))
+
+        def add_spilled(batches):
+            for batch in batches:
+                records.extend(self.read_batch(batch))
+
+        # order in which a plain list would hold the families
+        if self.dfs:
+            add_spilled(self.batches)
+            add_resident(self.head)
+        else:
+            add_resident(self.head)
+            add_spilled(self.batches)
+            add_resident(self.tail)
+
+        # hints of properties outside of the specification cannot be matched in another run
+        checked = {}
+        for index, (hole_options, parent_record) in enumerate(records):
+            if parent_record is None or parent_record[1] is None:
+                continue
+            key = id(parent_record)
+            if key not in checked:
+                if any(prop_index >= self.num_specification_properties for prop_index, _, _ in parent_record[1]):
+                    parent_record = parent_record[:1] + (None,) + parent_record[2:]
+                checked[key] = parent_record
+            records[index] = (hole_options, checked[key])
+        return records
+
+    def restore(self, records):
+        ''' Replace the families by the ones of a snapshot. '''
+        self.head, self.tail, self.batches, self.spilled = [], [], [], 0
+        parent_infos = {}
+        for hole_options, parent_record in records:
+            if id(parent_record) not in parent_infos:
+                parent_info = self.decompress_parent_info(parent_record)
+                if parent_info is not None:
+                    # solver scopes of the ancestors are not restored: the families become children of the baseline
+                    parent_info.refinement_depth = 0
+                parent_infos[id(parent_record)] = parent_info
+            self.head.append(self.decompress_family(hole_options, parent_infos[id(parent_record)]))
+        self.bytes_per_family = None
+        self.check_budget()
+
+    def close(self):
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
@@ -2,10 +2,12 @@ import math
 from collections import defaultdict
 
 import stormpy
+from ..hypersketch.hyperproperty import HyperProperty, AllPairsHyperProperty, HyperSpecification
 from ..hypersketch.hyperresult import MdpHyperPropertyResult
 from ..profiler import Profiler
 from ..sketch.holes import Holes, Hole, DesignSpace
-from ..synthesizers.models import MarkovChain
+from ..sketch.property import Property
+from ..synthesizers.models import MarkovChain, MDP
 from ..synthesizers.quotient import QuotientContainer
 
 import logging
@@ -13,13 +15,41 @@ logger = logging.getLogger(__name__)
 
 
 class HyperPropertyQuotientContainer(QuotientContainer):
+
+    # whether the quotient is minimized by a hole-preserving bisimulation before synthesis
+    minimize = False
+    # whether holes that cannot affect any property are fixed to a single option before synthesis
+    prune_holes = False
+    # whether hole options with indistinguishable actions are collapsed into a single option
+    merge_options = False
+    # engine ("dd" or "hybrid") of the symbolic precheck deciding the whole design space before synthesis
+    symbolic_precheck_engine = None
+
     def __init__(self, sketch, parser):
         super().__init__(sketch)
 
-        # build the quotient
-        MarkovChain.builder_options.set_build_choice_labels(True)
-        self.quotient_mdp = stormpy.build_sparse_model_with_options(self.sketch.prism, MarkovChain.builder_options)
-        MarkovChain.builder_options.set_build_choice_labels(False)
+        # decide the whole design space on the symbolic quotient first: if no member can satisfy the
+        # specification, the sparse quotient is not built at all; otherwise, the sparse quotient is needed
+        # to construct the holes (and to pick a member if every member is a solution)
+        self.symbolic_verdict = None
+        if HyperPropertyQuotientContainer.symbolic_precheck_engine is not None:
+            if self.sketch.prism is None:
+                logger.info("The symbolic precheck requires a PRISM sketch, skipping it.")
+            else:
+                self.symbolic_verdict = self.symbolic_precheck(parser.initial_state_valuations)
+        if self.symbolic_verdict is False:
+            logger.info("Skipping the construction of the sparse quotient.")
+            self.sketch.design_space = DesignSpace(holes=Holes(), has_scheduler_hyperoptimality=sketch.specification.has_scheduler_hyperoptimality)
+            self.sketch.design_space.property_indices = self.sketch.specification.all_constraint_indices()
+            return
+
+        # build the quotient, unless it has been read from an explicit model
+        if self.sketch.explicit_model is not None:
+            self.quotient_mdp = self.sketch.explicit_model
+        else:
+            MarkovChain.builder_options.set_build_choice_labels(True)
+            self.quotient_mdp = stormpy.build_sparse_model_with_options(self.sketch.prism, MarkovChain.builder_options)
+            MarkovChain.builder_options.set_build_choice_labels(False)
         logger.debug(f"Constructed quotient MDP having {self.quotient_mdp.nr_states} states and {self.quotient_mdp.nr_choices} actions.")
 
         # to each state, construct a hole with options corresponding to actions
@@ -28,7 +58,7 @@ class HyperPropertyQuotientContainer(QuotientContainer):
         holes = Holes()
 
         assert self.quotient_mdp.has_choice_labeling()
-        assert self.quotient_mdp.has_state_valuations()
+        assert parser.state_names is not None or self.quotient_mdp.has_state_valuations()
 
         self.action_to_hole_options = []
 
@@ -44,7 +74,7 @@ class HyperPropertyQuotientContainer(QuotientContainer):
                 continue
 
             # a hole to be created
-            state_name = self.quotient_mdp.state_valuations.get_string(state)
+            state_name = parser.state_name(self.quotient_mdp, state)
             sched_id, associated_scheduler, initial_states, hole_name = parser.parse_scheduler_variable(state_name)
             variable_expressions = parser.parse_state_name_expression(state_name, parse_state_quant=True)
             asch_list = [associated_scheduler]
@@ -102,12 +132,292 @@ class HyperPropertyQuotientContainer(QuotientContainer):
             hole = Hole(hole_name, hole_options, hole_option_labels, initial_states=initial_states, associated_schedulers=asch_list)
             holes.append(hole)
 
+        if HyperPropertyQuotientContainer.minimize:
+            self.minimize_quotient(holes)
+
+        self.compute_default_actions()
+        self.compute_state_to_holes()
+
+        # the scheduler difference counts every hole and every option, hence no hole is irrelevant and
+        # no options are equivalent for scheduler hyperoptimality
+        if not sketch.specification.has_scheduler_hyperoptimality:
+            if HyperPropertyQuotientContainer.prune_holes:
+                self.prune_irrelevant_holes(holes)
+            if HyperPropertyQuotientContainer.merge_options:
+                self.merge_equivalent_options(holes)
+
         # now sketch has the corresponding design space
         self.sketch.design_space = DesignSpace(holes=holes, has_scheduler_hyperoptimality=sketch.specification.has_scheduler_hyperoptimality)
         self.sketch.design_space.property_indices = self.sketch.specification.all_constraint_indices()
 
-        self.compute_default_actions()
-        self.compute_state_to_holes()
+        if QuotientContainer.use_qualitative_cache:
+            self.compute_qualitative_cache(self.sketch.specification.stormpy_formulae())
+
+    def symbolic_state_filter(self, model, valuation):
+        ''' Construct a filter selecting the state with the given valuation of the program variables in the symbolic model. '''
+        manager = self.sketch.prism.expression_manager
+        conjuncts = []
+        for var, value in valuation:
+            if var.has_boolean_type():
+                value = manager.create_boolean(value)
+            else:
+                value = manager.create_integer(value)
+            conjuncts.append(stormpy.Expression.Eq(var.get_expression(), value))
+        return stormpy.create_filter_symbolic(model, stormpy.Expression.Conjunction(conjuncts))
+
+    def symbolic_value(self, model, formula, state, valuations, cache):
+        '''
+        Value of the formula in the given (initial) state of the symbolic quotient, over all schedulers.
+        :param valuations for each initial state, the values of the program variables
+        '''
+        key = (str(formula), state)
+        if key not in cache:
+            if HyperPropertyQuotientContainer.symbolic_precheck_engine == "dd":
+                result = stormpy.check_model_dd(model, formula, environment=MarkovChain.environment)
+            else:
+                result = stormpy.check_model_hybrid(model, formula, environment=MarkovChain.environment)
+            result.filter(self.symbolic_state_filter(model, valuations[state]))
+            cache[key] = result.min
+        return cache[key]
+
+    @staticmethod
+    def symbolic_error(value):
+        ''' Bound on the error of a value computed by the (not sound) value iteration of the symbolic engine. '''
+        if math.isinf(value):
+            return 0
+        return Property.mc_precision * max(1, abs(value))
+
+    def symbolic_satisfies(self, prop, value, threshold=None):
+        '''
+        Compare a symbolic value against the threshold of a constraint (or the value of the other state of a
+        hyperproperty).
+        :return True/False, or None if the errors of the values could flip the comparison
+        '''
+        if threshold is None:
+            satisfied = prop.satisfies_threshold(value)
+            thresholds = [(prop.threshold, 0)]
+        else:
+            satisfied = prop.satisfies_threshold(value, threshold)
+            thresholds = [(threshold, HyperPropertyQuotientContainer.symbolic_error(threshold))]
+        if MDP.within_error_band(value + prop.min_bound, thresholds, HyperPropertyQuotientContainer.symbolic_error(value)):
+            return None
+        return satisfied
+
+    def symbolic_pair_verdict(self, model, prop, state, other_state, valuations, cache):
+        ''' Decide a hyperproperty for the given pair of initial states, see symbolic_constraint_verdict. '''
+        other_best = prop.secondary_formula if prop.multitarget else prop.primary_formula_alt
+        other_worst = prop.secondary_formula_alt if prop.multitarget else prop.primary_formula
+        best = self.symbolic_value(model, prop.primary_formula, state, valuations, cache)
+        best_threshold = self.symbolic_value(model, other_best, other_state, valuations, cache)
+        verdict = self.symbolic_satisfies(prop, best, best_threshold)
+        if verdict is not True:
+            # the most favourable values violate the hyperproperty, or are too close to decide
+            return verdict
+        worst = self.symbolic_value(model, prop.primary_formula_alt, state, valuations, cache)
+        worst_threshold = self.symbolic_value(model, other_worst, other_state, valuations, cache)
+        return True if self.symbolic_satisfies(prop, worst, worst_threshold) is True else None
+
+    def symbolic_constraint_verdict(self, model, prop, valuations, cache):
+        '''
+        Decide a constraint for the whole design space from the extremal values over all schedulers of the
+        quotient: the constraint holds for every member if it holds for the least favourable values, and
+        for no member if it does not hold even for the most favourable ones. Comparisons within the error of
+        the values are not decided.
+        :return True/False, or None if undecided
+        '''
+        if isinstance(prop, AllPairsHyperProperty):
+            # a conjunction over the pairs: violated by a single violated pair, satisfied if every pair is
+            verdicts = [self.symbolic_pair_verdict(model, prop, state, other_state, valuations, cache)
+                        for state in prop.states for other_state in prop.other_states
+                        if not (prop.exclude_identical and state == other_state)]
+            if False in verdicts:
+                return False
+            return True if all(verdict is True for verdict in verdicts) else None
+        if isinstance(prop, HyperProperty):
+            return self.symbolic_pair_verdict(model, prop, prop.state, prop.other_state, valuations, cache)
+        verdict = self.symbolic_satisfies(prop, self.symbolic_value(model, prop.formula, prop.state, valuations, cache))
+        if verdict is not True:
+            return verdict
+        if self.symbolic_satisfies(prop, self.symbolic_value(model, prop.formula_alt, prop.state, valuations, cache)) is True:
+            return True
+        return None
+
+    def symbolic_precheck(self, valuations):
+        '''
+        Build the quotient as a decision diagram and model check the constraints with the symbolic engine:
+        if some disjunction of constraints is violated by the whole quotient, no member of the design space
+        can be a solution; if all disjunctions are satisfied by it, every member is.
+        :param valuations for each initial state, the values of the program variables
+        :return True/False, or None if undecided
+        '''
+        Profiler.start("quotient::symbolic_precheck")
+        specification = self.sketch.specification
+        model = stormpy.build_symbolic_model(self.sketch.prism, specification.stormpy_formulae())
+        logger.debug(f"Constructed symbolic quotient MDP having {model.nr_states} states and {model.nr_transitions} transitions.")
+
+        cache = {}
+        verdict = True
+        for group in HyperSpecification.disjoint_indexes:
+            group_verdicts = [self.symbolic_constraint_verdict(model, specification.constraints[index], valuations, cache) for index in group]
+            if True in group_verdicts:
+                continue
+            if all(group_verdict is False for group_verdict in group_verdicts):
+                verdict = False
+                break
+            verdict = None
+        logger.info(f"Symbolic precheck ({HyperPropertyQuotientContainer.symbolic_precheck_engine} engine) verdict for the whole design space: "
+                    f"{'undecided' if verdict is None else ('all SAT' if verdict else 'all UNSAT')}")
+        Profiler.resume()
+        return verdict
+
+    def minimize_quotient(self, holes):
+        '''
+        Replace the quotient MDP by its hole-preserving bisimulation quotient: states with holes, initial states
+        and states in which the properties are evaluated are kept as they are, other states with a single action
+        are lumped. Hole options, the initial states of holes and the property states are mapped to the
+        minimized MDP.
+        '''
+        Profiler.start("quotient::minimize_quotient")
+        nr_states = self.quotient_mdp.nr_states
+        # the counterexample generator identifies the initial states by their position, so these and the
+        # states in which the properties are evaluated are kept as they are, too
+        kept_states = set(self.quotient_mdp.initial_states) | self.property_states()
+        for hole in holes:
+            kept_states.update(hole.initial_states)
+        fixed_states = stormpy.BitVector(nr_states, [
+            state for state in range(nr_states)
+            if self.quotient_mdp.get_nr_available_actions(state) > 1 or state in kept_states
+        ])
+        minimizer = stormpy.synthesis.QuotientMinimizer(self.quotient_mdp, fixed_states)
+        minimized_mdp = minimizer.construct_mdp()
+        state_to_block = minimizer.state_to_block
+        choice_map = minimizer.choice_map
+
+        self.quotient_mdp = minimized_mdp
+        self.action_to_hole_options = [self.action_to_hole_options[choice] for choice in choice_map]
+        for hole in holes:
+            hole.initial_states = {state_to_block[state] for state in hole.initial_states}
+
+        specification = self.sketch.specification
+        properties = list(specification.constraints)
+        if specification.has_optimality:
+            properties.append(specification.optimality)
+        for prop in properties:
+            if isinstance(prop, HyperProperty):
+                prop.map_states(state_to_block)
+            else:
+                prop.state = state_to_block[prop.state]
+
+        logger.info(f"Bisimulation minimization reduced the quotient MDP from {nr_states} to "
+                    f"{minimized_mdp.nr_states} states and {minimized_mdp.nr_choices} actions")
+        Profiler.resume()
+
+    def property_states(self):
+        ''' Quotient states in which the properties of the specification are evaluated. '''
+        specification = self.sketch.specification
+        properties = list(specification.constraints)
+        if specification.has_optimality:
+            properties.append(specification.optimality)
+        property_states = set()
+        for prop in properties:
+            if isinstance(prop, HyperProperty):
+                property_states.update(prop.quantified_states)
+            else:
+                property_states.add(prop.state)
+        return property_states
+
+    def irrelevant_states(self):
+        '''
+        Identify quotient states whose choice cannot affect the value of any property in the states the
+        properties are evaluated in: states unreachable from these states, and states that are decided
+        for every formula, i.e. reach the target with probability 0 or 1 under all schedulers (probabilities)
+        or are targets or never reach the target (rewards).
+        :return a bitvector of irrelevant states
+        '''
+        specification = self.sketch.specification
+
+        # states reachable from the states in which the properties are evaluated
+        nr_states = self.quotient_mdp.nr_states
+        reachable = stormpy.get_reachable_states(
+            self.quotient_mdp, stormpy.BitVector(nr_states, list(self.property_states())),
+            stormpy.BitVector(nr_states, True), stormpy.BitVector(nr_states, False)
+        )
+
+        decided = stormpy.BitVector(nr_states, True)
+        for formula in specification.stormpy_formulae():
+            qualitative_states = self.qualitative_states(formula)
+            if qualitative_states is None:
+                # nothing is known about other formulae
+                return ~reachable
+            psi_states,prob0,prob1 = qualitative_states
+            if formula.is_probability_operator:
+                decided &= prob0 | prob1
+            else:
+                decided &= psi_states | prob0
+
+        return ~reachable | decided
+
+    def prune_irrelevant_holes(self, holes):
+        ''' Fix the holes associated only with irrelevant states to their first option. '''
+        Profiler.start("quotient::prune_irrelevant_holes")
+        irrelevant = self.irrelevant_states()
+        relevant_holes = set()
+        for state in range(self.quotient_mdp.nr_states):
+            if not irrelevant[state]:
+                relevant_holes.update(self.state_to_holes[state])
+
+        size_before = holes.size
+        pruned = 0
+        for hole_index, hole in enumerate(holes):
+            if hole_index in relevant_holes or hole.is_trivial:
+                continue
+            hole.assume_options([hole.options[0]])
+            pruned += 1
+        logger.info(f"Hole pruning fixed {pruned} out of {holes.num_holes} holes that cannot affect any property, "
+                    f"reducing the design space from {size_before} to {holes.size}")
+        Profiler.resume()
+
+    def merge_equivalent_options(self, holes):
+        '''
+        Collapse the options of each hole whose actions have the same successor distribution and the same
+        rewards in every state of the hole; the first option of each class is kept as its representative and
+        the class is remembered in the hole to report assignments with the original labels.
+        '''
+        Profiler.start("quotient::merge_equivalent_options")
+        choice_rewards = []
+        for reward_model in self.quotient_mdp.reward_models.values():
+            if reward_model.has_transition_rewards:
+                logger.debug("Transition rewards are not supported by option merging, skipping.")
+                Profiler.resume()
+                return
+            if reward_model.has_state_action_rewards:
+                choice_rewards.append(list(reward_model.state_action_rewards))
+
+        # for each hole and each of its options, the signatures of the corresponding actions in the hole states
+        option_signatures = [[[] for _ in hole.option_labels] for hole in holes]
+        tm = self.quotient_mdp.transition_matrix
+        for state in range(self.quotient_mdp.nr_states):
+            for choice in range(tm.get_row_group_start(state), tm.get_row_group_end(state)):
+                distribution = tuple((entry.column, entry.value()) for entry in tm.get_row(choice))
+                rewards = tuple(rewards[choice] for rewards in choice_rewards)
+                for hole_index, option in self.action_to_hole_options[choice].items():
+                    option_signatures[hole_index][option].append((state, distribution, rewards))
+
+        size_before = holes.size
+        merged = 0
+        for hole_index, hole in enumerate(holes):
+            representatives = {}
+            for option in hole.options:
+                signature = tuple(option_signatures[hole_index][option])
+                representatives.setdefault(signature, []).append(option)
+            if len(representatives) == hole.size:
+                continue
+            hole.equivalent_options = {options[0]: options for options in representatives.values()}
+            merged += hole.size - len(representatives)
+            hole.assume_options([options[0] for options in representatives.values()])
+        logger.info(f"Option merging collapsed {merged} options with indistinguishable actions, "
+                    f"reducing the design space from {size_before} to {holes.size}")
+        Profiler.resume()
 
     def scheduler_consistent_pctl(self, mdp, prop, result, initial_state):
         '''
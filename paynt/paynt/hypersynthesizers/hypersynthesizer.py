@@ -1,10 +1,14 @@
 import stormpy.synthesis
 
 from ..synthesizers.statistic import Statistic
+from ..synthesizers.models import MarkovChain
 from ..profiler import Timer, Profiler
 from ..hypersketch.hyperproperty import HyperProperty
 
 from ..hypersketch.hyperproperty import HyperSpecification
+from .frontier import Frontier
+from .checkpoint import Checkpoint
+from .searchtrace import SearchTrace
 
 import logging
 
@@ -25,6 +29,12 @@ class HyperSynthesizer:
         self.explored = 0
         self.multitarget_map = {}
         self.since_last_optimum_update = 0
+        # AR/CEGIS time allocation (hybrid only)
+        self.stage_control = None
+        # recorder of the AR search (AR and hybrid only)
+        self.search_trace = None
+        # MDPs of the first AR families and chains of their members the solvers are auto-tuned on
+        self.autotune_models = ([], []) if MarkovChain.autotune_solvers else None
 
     @property
     def method_name(self):
@@ -38,8 +48,33 @@ class HyperSynthesizer:
     def print_stats(self):
         self.stat.print()
 
+    def specification_properties(self):
+        ''' Properties of the specification in a fixed order. '''
+        spec = self.sketch.specification
+        return spec.constraints + [prop for prop in [spec.optimality, spec.sched_hyperoptimality] if prop is not None]
+
+    def current_optimum(self):
+        spec = self.sketch.specification
+        if spec.optimality is not None:
+            return spec.optimality.optimum
+        if spec.sched_hyperoptimality is not None:
+            return spec.sched_hyperoptimality.hyperoptimum
+        return None
+
     def run(self, explore_all):
-        assignment = self.synthesize(self.sketch.design_space, explore_all)
+        if self.sketch.quotient.symbolic_verdict is False:
+            logger.info("The whole design space violates the specification, skipping synthesis.")
+            self.stat.start()
+            assignment = None
+            self.stat.finished(assignment)
+        elif self.sketch.quotient.symbolic_verdict is True and not explore_all and not self.sketch.specification.has_optimality \
+                and not self.sketch.specification.has_scheduler_hyperoptimality:
+            logger.info("The whole design space satisfies the specification, picking any assignment.")
+            self.stat.start()
+            assignment = self.sketch.design_space.pick_any()
+            self.stat.finished(assignment)
+        else:
+            assignment = self.synthesize(self.sketch.design_space, explore_all)
 
         logger.info("Printing synthesized assignment below:")
         logger.info(";\n".join(str(assignment).split(",")))
@@ -130,10 +165,12 @@ class HyperSynthesizerAR(HyperSynthesizer):
         :return (1) family feasibility (True/False/None)
         :return (2) new satisfying assignment (or None)
         """
-        Profiler.start("synthesizer::analyze_family_ar")
+        Profiler.start("synthesizer::analyze_family_ar", {"family": self.stat.iterations_mdp} if Profiler.trace else None)
 
         self.sketch.quotient.build(family)
         self.stat.iteration_mdp(family.mdp.states)
+        if self.autotune_models is not None:
+            self.autotune_solvers(family)
 
         res = family.mdp.check_hyperspecification(self.sketch.specification,
                                                 property_indices=family.property_indices, short_evaluation=True)
@@ -141,12 +178,27 @@ class HyperSynthesizerAR(HyperSynthesizer):
         Profiler.resume()
 
         improving_assignment, improving_value, can_improve = res.improving(family)
+        self.search_trace.analysis(family, can_improve, improving_assignment, improving_value)
         if improving_value is not None:
             self.sketch.specification.update_optimum(improving_value)
             self.since_last_optimum_update = 0
 
         return can_improve, improving_assignment
 
+    def autotune_solvers(self, family):
+        '''
+        Collect the MDP of the family and a chain of one of its members; once MarkovChain.autotune_families
+        families are collected, choose the solvers by timing the candidates on these models.
+        '''
+        mdps, dtmcs = self.autotune_models
+        mdps.append(family.mdp.model)
+        dtmcs.append(self.sketch.quotient.build_chain(family.pick_any()).model)
+        if len(mdps) < MarkovChain.autotune_families:
+            return
+        logger.info(f"Auto-tuning the model checking solvers on the first {len(mdps)} families...")
+        MarkovChain.autotune(mdps, dtmcs, self.sketch.specification.stormpy_formulae())
+        self.autotune_models = None
+
     def synthesize(self, family, explore_all):
 
         logger.info("Synthesis initiated.")
@@ -156,17 +208,21 @@ class HyperSynthesizerAR(HyperSynthesizer):
 
         self.sketch.quotient.discarded = 0
 
-        satisfying_assignment = None
-        families = [family]
+        families = Frontier(family, HyperSynthesizerAR.exploration_order_dfs, self.specification_properties())
+        families.append(family)
+        self.stat.frontier = families
+        self.search_trace = SearchTrace(self, explore_all)
+        checkpoint = Checkpoint(self)
+        satisfying_assignment = checkpoint.resume(families)
         while families:
 
+            if checkpoint.due():
+                checkpoint.save(families, satisfying_assignment)
+
             if self.no_optimum_update_limit_reached():
                 break
 
-            if HyperSynthesizerAR.exploration_order_dfs:
-                family = families.pop(-1)
-            else:
-                family = families.pop(0)
+            family = families.pop()
 
             can_improve, improving_assignment = self.analyze_family_ar(family)
             if improving_assignment is not None:
@@ -181,7 +237,11 @@ class HyperSynthesizerAR(HyperSynthesizer):
             # undecided
             subfamilies = self.sketch.quotient.split(family)
             assert subfamilies
-            families = families + subfamilies
+            self.search_trace.split(family, subfamilies)
+            families.extend(subfamilies)
+        families.close()
+        self.search_trace.close()
+        checkpoint.finished()
 
         self.stat.finished(satisfying_assignment)
         Profiler.stop()
@@ -189,11 +249,24 @@ class HyperSynthesizerAR(HyperSynthesizer):
 
 
 class HyperSynthesizerCEGIS(HyperSynthesizer):
+    # locate the violating wave of a counterexample by galloping/binary search instead of a linear scan
+    wave_bisection = False
+    # DTMCs with at most this number of waves are always explored linearly
+    wave_bisection_linear_limit = 8
 
     @property
     def method_name(self):
         return "CEGIS"
 
+    def construct_ce_generator(self):
+        formulae = self.compute_multitarget_map()
+        ce_generator = stormpy.synthesis.CounterexampleGenerator(
+            self.sketch.quotient.quotient_mdp, self.sketch.design_space.num_holes,
+            self.sketch.quotient.state_to_holes, formulae)
+        ce_generator.set_wave_bisection(HyperSynthesizerCEGIS.wave_bisection,
+                                        HyperSynthesizerCEGIS.wave_bisection_linear_limit)
+        return ce_generator
+
     def generalize_conflict(self, assignment, conflict, scheduler_selection):
 
         if not HyperSynthesizer.incomplete_search:
@@ -249,6 +322,8 @@ class HyperSynthesizerCEGIS(HyperSynthesizer):
                 continue
             prop = self.sketch.specification.constraints[index]
             property_result = family.analysis_result.constraints_result.results[index] if family.analysis_result is not None else None
+            # the MDP values bound the conflicts, they must not carry the error of the coarse precision
+            property_result = family.mdp.full_precision_result(property_result)
             conflict_requests[index] = (prop, property_result)
 
         # group the conflicts based on the disjunctions
@@ -258,6 +333,7 @@ class HyperSynthesizerCEGIS(HyperSynthesizer):
             index = len(self.sketch.specification.constraints)
             prop = self.sketch.specification.optimality
             property_result = family.analysis_result.optimality_result if family.analysis_result is not None else None
+            property_result = family.mdp.full_precision_result(property_result)
             grouped.append([(index, (prop, property_result))])
 
         # construct conflict to each unsatisfiable property
@@ -272,8 +348,17 @@ class HyperSynthesizerCEGIS(HyperSynthesizer):
 
                 if isinstance(prop, HyperProperty):
 
+                    # the pair of states violating the hyperproperty in this DTMC (or in the MDP of the family)
+                    dtmc_result = spec.constraints_result.results[index]
+                    if dtmc_result is not None:
+                        state, other_state = dtmc_result.state, dtmc_result.other_state
+                    elif property_result is not None:
+                        state, other_state = property_result.primary.state, property_result.primary.other_state
+                    else:
+                        state, other_state = prop.state, prop.other_state
+
                     # prepare DTMC for CE generation
-                    ce_generator.prepare_replicated_dtmc(dtmc.model, dtmc.quotient_state_map, prop.state, prop.other_state)
+                    ce_generator.prepare_replicated_dtmc(dtmc.model, dtmc.quotient_state_map, state, other_state)
 
                     bounds = None
                     other_bounds = None
@@ -289,7 +374,7 @@ class HyperSynthesizerCEGIS(HyperSynthesizer):
                     Profiler.start("storm::construct_conflict")
                     conflict = ce_generator.construct_hyperconflict(index, secondary_index, prop.multitarget,
                                                                     prop.min_bound, bounds, other_bounds, family.mdp.quotient_state_map,
-                                                               prop.state, prop.other_state, prop.strict)
+                                                               state, other_state, prop.strict)
                     Profiler.resume()
 
                     overall_conflict = list(set(overall_conflict + conflict))
@@ -319,6 +404,8 @@ class HyperSynthesizerCEGIS(HyperSynthesizer):
         for conflict in conflicts:
             self.stat.add_conflict(conflict)
             pruning_estimate = family.exclude_assignment(assignment, conflict)
+            if self.stage_control is not None:
+                self.stage_control.prune_cegis(pruning_estimate)
             if pruning_estimate > int(self.sketch.design_space.size / 100):
                 logger.info(
                     f"A CE has just discarded around {int(pruning_estimate / self.sketch.design_space.size * 100)}% of the design space")
@@ -345,13 +432,9 @@ class HyperSynthesizerCEGIS(HyperSynthesizer):
         # build the quotient, map mdp states to hole indices
         self.sketch.quotient.build(family)
         self.sketch.quotient.compute_state_to_holes()
-        quotient_relevant_holes = self.sketch.quotient.state_to_holes
 
         # initialize CE generator
-        formulae = self.compute_multitarget_map()
-        ce_generator = stormpy.synthesis.CounterexampleGenerator(
-            self.sketch.quotient.quotient_mdp, self.sketch.design_space.num_holes,
-            quotient_relevant_holes, formulae)
+        ce_generator = self.construct_ce_generator()
 
         # use sketch design space as a SAT baseline
         self.sketch.design_space.sat_initialize()
@@ -373,6 +456,7 @@ class HyperSynthesizerCEGIS(HyperSynthesizer):
             # construct next assignment
             assignment = family.pick_assignment()
 
+        self.stat.collect_ce_stats(ce_generator)
         self.stat.finished(satisfying_assignment)
         Profiler.stop()
         return satisfying_assignment
@@ -387,6 +471,16 @@ class StageControl:
     # whether 1 AR followed by only CEGIS is performed
     only_cegis = False
 
+    # whether the time split adapts to the measured pruning throughput of both methods
+    adaptive = True
+    # bounds on the cegis efficiency, so that neither method starves and can still prove itself
+    efficiency_min = 0.1
+    efficiency_max = 10
+    # weight of the newly measured efficiency when smoothing
+    efficiency_smoothing = 0.5
+    # minimum CPU time (s) spent by each method before its throughput is trusted
+    warmup_time = 0.5
+
     def __init__(self):
         # timings
         self.timer_ar = Timer()
@@ -397,12 +491,50 @@ class StageControl:
         # =1 is fair, >1 favours cegis, <1 favours ar
         self.cegis_efficiency = 1
 
+        # number of design space members eliminated by each method
+        self.pruned_ar = 0
+        self.pruned_cegis = 0
+
+    def prune_ar(self, members):
+        self.pruned_ar += members
+
+    def prune_cegis(self, members):
+        self.pruned_cegis += members
+
+    def throughput(self, pruned, timer):
+        ''' Design space members eliminated per CPU second, None if not measured long enough. '''
+        time = timer.read()
+        if time < StageControl.warmup_time:
+            return None
+        return pruned / time
+
+    def update_efficiency(self):
+        ''' Shift the time allocation towards the method that currently prunes the design space faster. '''
+        if not StageControl.adaptive:
+            return
+        throughput_ar = self.throughput(self.pruned_ar, self.timer_ar)
+        throughput_cegis = self.throughput(self.pruned_cegis, self.timer_cegis)
+        if throughput_ar is None or throughput_cegis is None:
+            return
+
+        if throughput_ar == 0:
+            measured = StageControl.efficiency_max if throughput_cegis > 0 else 1
+        else:
+            measured = throughput_cegis / throughput_ar
+        measured = min(max(measured, StageControl.efficiency_min), StageControl.efficiency_max)
+
+        alpha = StageControl.efficiency_smoothing
+        self.cegis_efficiency = (1 - alpha) * self.cegis_efficiency + alpha * measured
+        logger.debug(f"AR throughput: {round(throughput_ar, 2)}/s, CEGIS throughput: {round(throughput_cegis, 2)}/s, "
+                     f"CEGIS efficiency: {round(self.cegis_efficiency, 2)}")
+
     def start_ar(self):
         self.timer_cegis.stop()
         self.timer_ar.start()
 
     def start_cegis(self):
         self.timer_ar.stop()
+        self.update_efficiency()
         self.timer_cegis.start()
 
     def cegis_has_time(self):
@@ -428,11 +560,30 @@ class StageControl:
 
 
 class SynthesizerHybrid(HyperSynthesizerAR, HyperSynthesizerCEGIS):
+    # whether CEGIS prefers assignments selected by the schedulers of the last AR analysis
+    scheduler_guided_cegis = True
+    # whether families decided by AR are excluded from the SAT solver used by CEGIS
+    learn_decided_families = True
 
     @property
     def method_name(self):
         return "hybrid"
 
+    def priority_subfamilies(self, family):
+        ''' Construct subfamilies that correspond to the scheduler selections of the last AR analysis. '''
+        if not SynthesizerHybrid.scheduler_guided_cegis or family.analysis_result is None:
+            return None
+
+        subfamilies = []
+        for selection in family.analysis_result.priority_selections(family):
+            priority_subfamily = family.copy()
+            priority_subfamily.assume_options(selection)
+            if subfamilies and priority_subfamily.size == subfamilies[-1].size:
+                # the less restrictive selection adds nothing new
+                continue
+            subfamilies.append(priority_subfamily)
+        return subfamilies
+
     def synthesize(self, family, explore_all):
 
         logger.info("Synthesis initiated.")
@@ -444,20 +595,23 @@ class SynthesizerHybrid(HyperSynthesizerAR, HyperSynthesizerCEGIS):
 
         self.stage_control = StageControl()
 
-        quotient_relevant_holes = self.sketch.quotient.state_to_holes
-        formulae = self.compute_multitarget_map()
-        ce_generator = stormpy.synthesis.CounterexampleGenerator(
-            self.sketch.quotient.quotient_mdp, self.sketch.design_space.num_holes,
-            quotient_relevant_holes, formulae)
+        ce_generator = self.construct_ce_generator()
 
         # use sketch design space as a SAT baseline
         self.sketch.design_space.sat_initialize()
 
         # AR loop
-        satisfying_assignment = None
-        families = [family]
+        families = Frontier(family, HyperSynthesizerAR.exploration_order_dfs, self.specification_properties())
+        families.append(family)
+        self.stat.frontier = families
+        self.search_trace = SearchTrace(self, explore_all)
+        checkpoint = Checkpoint(self)
+        satisfying_assignment = checkpoint.resume(families)
         while families:
 
+            if checkpoint.due():
+                checkpoint.save(families, satisfying_assignment)
+
             if self.no_optimum_update_limit_reached():
                 break
 
@@ -465,10 +619,7 @@ class SynthesizerHybrid(HyperSynthesizerAR, HyperSynthesizerCEGIS):
             self.stage_control.start_ar()
 
             # choose family
-            if HyperSynthesizerAR.exploration_order_dfs:
-                family = families.pop(-1)
-            else:
-                family = families.pop(0)
+            family = families.pop()
 
             # reset SMT solver level
             if HyperSynthesizerAR.exploration_order_dfs:
@@ -483,15 +634,16 @@ class SynthesizerHybrid(HyperSynthesizerAR, HyperSynthesizerCEGIS):
             if can_improve == False:
                 self.stat.add_decided_family(family, improving_assignment is not None)
                 self.explore(family)
+                self.stage_control.prune_ar(family.size)
+                if SynthesizerHybrid.learn_decided_families:
+                    family.exclude_family()
                 continue
 
             # undecided: initiate CEGIS analysis
             self.stage_control.start_cegis()
 
-            # construct priority subfamily that corresponds to primary scheduler
-            # scheduler_selection = family.analysis_result.optimality_result.primary_selection
-            # priority_subfamily = family.copy()
-            # priority_subfamily.assume_options(scheduler_selection)
+            # construct priority subfamilies that correspond to the primary/secondary schedulers
+            priority_subfamilies = self.priority_subfamilies(family)
 
             # explore family assignments
             sat = False
@@ -502,7 +654,7 @@ class SynthesizerHybrid(HyperSynthesizerAR, HyperSynthesizerCEGIS):
                     break
 
                 # pick assignment
-                assignment = family.pick_assignment_priority(None)
+                assignment = family.pick_assignment_priority(priority_subfamilies)
                 if assignment is None:
                     break
 
@@ -515,12 +667,14 @@ class SynthesizerHybrid(HyperSynthesizerAR, HyperSynthesizerCEGIS):
                         break
                     else:
                         pruning_estimate = family.exclude_assignment(assignment, [i for i in range(len(assignment))])
+                        self.stage_control.prune_cegis(pruning_estimate)
                         if pruning_estimate > int(self.sketch.design_space.size / 100):
                             logger.info(f"Discarding a SAT family which represents around {int(pruning_estimate / self.sketch.design_space.size * 100)}% of the design space")
 
                 self.stat.add_dtmc_sat_result(sat)
                 # move on to the next assignment
 
+            self.search_trace.cegis(family, sat)
             if sat and not explore_all:
                 break
 
@@ -529,10 +683,16 @@ class SynthesizerHybrid(HyperSynthesizerAR, HyperSynthesizerCEGIS):
                 self.explore(family)
                 continue
             subfamilies = self.sketch.quotient.split(family)
-            families = families + subfamilies
-
-        # ce_generator.print_profiling()
-
+            self.search_trace.split(family, subfamilies)
+            families.extend(subfamilies)
+        families.close()
+        self.search_trace.close()
+        checkpoint.finished()
+
+        logger.info(f"AR pruned {self.stage_control.pruned_ar} members in {round(self.stage_control.timer_ar.read(), 1)} s, "
+                    f"CEGIS pruned {self.stage_control.pruned_cegis} members in {round(self.stage_control.timer_cegis.read(), 1)} s, "
+                    f"final CEGIS efficiency: {round(self.stage_control.cegis_efficiency, 2)}")
+        self.stat.collect_ce_stats(ce_generator)
         self.stat.finished(satisfying_assignment)
         Profiler.stop()
         return satisfying_assignment
@@ -0,0 +1,161 @@
+import json
+import os
+
+from ..sketch.property import Property
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class SearchTrace:
+    '''
+    Recorder of the AR search (of AR and hybrid synthesis) as JSON lines: the model checking results of every
+    analyzed family, the scores and the split of every undecided family. Families are identified by their hole
+    masks, a bit mask of the options per hole. The trace is an oracle for replay.py, which explores the same
+    search with another frontier order or split policy without model checking.
+    '''
+
+    # trace file (None to disable recording)
+    path = None
+
+    # format of the trace file
+    version = 1
+
+    def __init__(self, synthesizer, explore_all):
+        self.synthesizer = synthesizer
+        self.explore_all = explore_all
+        self.file = None
+        self.properties = synthesizer.specification_properties()
+
+    @staticmethod
+    def hole_masks(family):
+        return [sum(1 << option for option in hole.options) for hole in family]
+
+    @staticmethod
+    def value(property_result):
+        return None if property_result is None else property_result.value
+
+    def write(self, event, **fields):
+        if self.file is None:
+            self.file = open(SearchTrace.path, "w")
+            self.write_header()
+        record = {"event": event}
+        record.update(fields)
+        self.file.write(json.dumps(record) + "\n")
+
+    def write_header(self):
+        sketch = self.synthesizer.sketch
+        spec = sketch.specification
+        properties = []
+        for prop in self.properties:
+            record = {"property": str(prop), "minimizing": prop.minimizing, "optimality": False}
+            if prop is spec.optimality or prop is spec.sched_hyperoptimality:
+                # improvements of the optimum below this difference are ignored
+                record["optimality"] = True
+                record["precision"] = Property.float_precision if prop is spec.optimality else 0
+            properties.append(record)
+        self.file.write(json.dumps({
+            "event": "header",
+            "version": SearchTrace.version,
+            "method": self.synthesizer.method_name,
+            "dfs": self.synthesizer.exploration_order_dfs,
+            "explore_all": self.explore_all,
+            "holes": [hole.name for hole in sketch.design_space],
+            "root": SearchTrace.hole_masks(sketch.design_space),
+            "properties": properties,
+        }) + "\n")
+
+    def property_index(self, prop):
+        for index, specification_property in enumerate(self.properties):
+            if specification_property is prop:
+                return index
+        raise ValueError(f"The undecided property {prop} is not a part of the specification")
+
+    def property_record(self, result):
+        if result is None:
+            return None
+        record = {"primary": SearchTrace.value(result.primary),
+                  "secondary": SearchTrace.value(getattr(result, "secondary", None))}
+        if hasattr(result, "can_improve"):
+            record["improving_value"] = result.improving_value
+            record["can_improve"] = result.can_improve
+        else:
+            record["feasibility"] = result.feasibility
+        return record
+
+    def analysis(self, family, can_improve, improving_assignment, improving_value):
+        '''
+        Record the analysis of a family, before the optimum is updated.
+        :param can_improve,improving_assignment,improving_value the interpreted result of the analysis
+        '''
+        if SearchTrace.path is None:
+            return
+        result = family.analysis_result
+        constraints = [self.property_record(res) for res in result.constraints_result.results]
+        optimality = result.optimality_result or result.sched_hyperoptimality_result
+        self.write("analysis",
+                   family=self.synthesizer.stat.iterations_mdp,
+                   masks=SearchTrace.hole_masks(family),
+                   states=family.mdp.states,
+                   constraints=constraints,
+                   feasibility=result.constraints_result.feasibility,
+                   optimality=self.property_record(optimality),
+                   # optimum the family was analyzed against
+                   optimum=self.synthesizer.current_optimum(),
+                   can_improve=can_improve,
+                   improving_value=improving_value,
+                   assignment=None if improving_assignment is None else SearchTrace.hole_masks(improving_assignment))
+
+    def split(self, family, subfamilies):
+        ''' Record the splitters of an undecided family, the scores they were chosen by and the subfamilies. '''
+        if SearchTrace.path is None:
+            return
+        result = family.analysis_result.undecided_result()
+        prop = self.property_index(result.property)
+        scores = {}
+        for direction in ["primary", "secondary"]:
+            direction_scores = getattr(result, f"{direction}_scores", None)
+            if direction_scores is None:
+                continue
+            hole_scores, options_rankings = direction_scores
+            scores[direction] = [[hole_index, score, options_rankings.get(hole_index)]
+                                 for hole_index, score in sorted(hole_scores.items())]
+        self.write("split",
+                   family=self.synthesizer.stat.iterations_mdp,
+                   property=prop,
+                   scores=scores,
+                   splitters=family.splitters,
+                   subfamilies=[SearchTrace.hole_masks(subfamily) for subfamily in subfamilies])
+
+    def cegis(self, family, sat):
+        ''' Record the outcome of CEGIS on an undecided family (hybrid only). '''
+        if SearchTrace.path is None:
+            return
+        self.write("cegis", family=self.synthesizer.stat.iterations_mdp, sat=sat, decided=not family.has_assignments)
+
+    def offset(self):
+        ''' Length of the trace written so far (None if nothing was written), stored in a checkpoint. '''
+        if self.file is None:
+            return None
+        self.file.flush()
+        return self.file.tell()
+
+    def resume(self, offset):
+        '''
+        Continue the trace of a run resumed from a checkpoint: the records written after the checkpoint are dropped,
+        since the resumed run analyzes those families again.
+        :param offset length of the trace when the checkpoint was saved
+        '''
+        if SearchTrace.path is None or offset is None:
+            return
+        if not os.path.exists(SearchTrace.path) or os.path.getsize(SearchTrace.path) < offset:
+            raise ValueError(f"The search trace {SearchTrace.path} does not contain the families of the checkpoint")
+        self.file = open(SearchTrace.path, "r+")
+        self.file.truncate(offset)
+        self.file.seek(offset)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            logger.info(f"Search trace recorded to {SearchTrace.path}.")
@@ -1,4 +1,7 @@
 import time
+import json
+import resource
+import tracemalloc
 
 
 class Timer:
@@ -34,71 +37,221 @@ class Timer:
             return self.time + (self.timestamp() - self.timer)
 
 
+class ProfilerNode:
+    ''' Node of the call tree of timers: a timer started while its parent was running. '''
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.children = {}
+        self.calls = 0
+        self.wall = 0       # total wall time, including the children
+        self.cpu = 0        # total cpu time, including the children
+        self.memory_peak = 0    # maximal growth of the traced Python memory during a call (bytes)
+        self.rss_growth = 0     # total growth of the peak resident set size during the calls (kilobytes)
+
+    def child(self, name):
+        node = self.children.get(name)
+        if node is None:
+            node = ProfilerNode(name, self)
+            self.children[name] = node
+        return node
+
+    @property
+    def self_wall(self):
+        return self.wall - sum(child.wall for child in self.children.values())
+
+    @property
+    def self_cpu(self):
+        return self.cpu - sum(child.cpu for child in self.children.values())
+
+
 class Profiler:
 
+    # if False, start/resume return immediately and nothing is measured (enabled by --profiling and related options)
+    enabled = False
+    # nodes below this percentage of the total wall time are aggregated in the report
     percentage_filter = 5
 
+    # whether the span of every timer is recorded for the export to the Chrome trace format
+    trace = False
+    # maximal number of recorded spans, to bound the memory of long runs
+    trace_max_events = 1000000
+
+    # whether the memory allocated during every timer is measured (requires tracemalloc to be tracing)
+    track_memory = False
+
     @staticmethod
     def initialize():
-        Profiler.timers = {}        # dictionary of all timers
-        Profiler.running = None     # currently running timer
-        Profiler.paused = []        # stack of paused timers
-        
-        Profiler.timer_total = Timer()
-        Profiler.timer_total.start()
+        Profiler.root = ProfilerNode("total")
+        Profiler.stack = []         # running timers: (node, wall start, cpu start, trace arguments, memory)
+        Profiler.events = []        # recorded spans
+        Profiler.events_dropped = 0
 
+        Profiler.wall_start = time.perf_counter()
+        Profiler.cpu_start = time.process_time()
+        Profiler.wall_total = None
+        Profiler.cpu_total = None
 
     @staticmethod
     def is_running():
-        return Profiler.running is not None
+        return len(Profiler.stack) > 0
 
     @staticmethod
-    def stop():
-        if not Profiler.is_running():
+    def start(timer_name = "-", args = None):
+        '''
+        Start a timer as a child of the running one.
+        :param args optional dictionary attached to the span of this timer in the trace; build it only if
+            Profiler.trace is set, it is dropped otherwise
+        '''
+        if not Profiler.enabled:
             return
-        Profiler.running.stop()
-        Profiler.running = None
+        parent = Profiler.stack[-1][0] if Profiler.stack else Profiler.root
+        memory = Profiler.start_memory() if Profiler.track_memory else None
+        if not Profiler.trace:
+            args = None
+        Profiler.stack.append((parent.child(timer_name), time.perf_counter(), time.process_time(), args, memory))
 
     @staticmethod
-    def pause():
-        if not Profiler.is_running():
+    def resume():
+        ''' Stop the running timer and continue with its parent. '''
+        if not Profiler.enabled or not Profiler.stack:
             return
-        Profiler.running.stop()
-        Profiler.paused += [Profiler.running]
-        Profiler.running = None
+        node, wall_start, cpu_start, args, memory = Profiler.stack.pop(-1)
+        wall_end = time.perf_counter()
+        node.wall += wall_end - wall_start
+        node.cpu += time.process_time() - cpu_start
+        node.calls += 1
+        if memory is not None:
+            Profiler.stop_memory(node, memory)
+        if Profiler.trace:
+            Profiler.record_span(node, wall_start, wall_end, args)
 
     @staticmethod
-    def resume():
-        Profiler.stop()
-        if Profiler.paused:
-            Profiler.running = Profiler.paused.pop(-1)
-            Profiler.running.start()
-    
+    def stop():
+        Profiler.resume()
+
+    @staticmethod
+    def start_memory():
+        '''
+        Memory at the start of a timer: [traced memory, peak of traced memory seen so far, peak RSS].
+        The tracemalloc peak is reset for every timer, so the peak seen by the running timer is saved first.
+        '''
+        if not tracemalloc.is_tracing():
+            return None
+        current, peak = tracemalloc.get_traced_memory()
+        if Profiler.stack and Profiler.stack[-1][4] is not None:
+            parent_memory = Profiler.stack[-1][4]
+            parent_memory[1] = max(parent_memory[1], peak)
+        tracemalloc.reset_peak()
+        return [current, current, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss]
+
     @staticmethod
-    def start(timer_name = "-"):
-        if Profiler.is_running():
-            Profiler.pause()
-        Profiler.timers[timer_name] = Profiler.timers.get(timer_name, Timer())
-        Profiler.timers[timer_name].start()
-        Profiler.running = Profiler.timers[timer_name]
+    def stop_memory(node, memory):
+        start, peak, rss_start = memory
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        node.memory_peak = max(node.memory_peak, peak - start)
+        node.rss_growth += resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_start
+        # the peak of this timer is also a peak of its parent
+        if Profiler.stack and Profiler.stack[-1][4] is not None:
+            parent_memory = Profiler.stack[-1][4]
+            parent_memory[1] = max(parent_memory[1], peak)
+
+    @staticmethod
+    def record_span(node, wall_start, wall_end, args):
+        if len(Profiler.events) >= Profiler.trace_max_events:
+            Profiler.events_dropped += 1
+            return
+        event = {
+            "name": node.name, "cat": node.parent.name, "ph": "X", "pid": 0, "tid": 0,
+            "ts": (wall_start - Profiler.wall_start) * 1e6, "dur": (wall_end - wall_start) * 1e6
+        }
+        if args:
+            event["args"] = args
+        Profiler.events.append(event)
+
+    @staticmethod
+    def wall_time():
+        if Profiler.wall_total is not None:
+            return Profiler.wall_total
+        return time.perf_counter() - Profiler.wall_start
+
+    @staticmethod
+    def cpu_time():
+        if Profiler.cpu_total is not None:
+            return Profiler.cpu_total
+        return time.process_time() - Profiler.cpu_start
+
+    @staticmethod
+    def print_node(node, depth, wall_total):
+        shown = [child for child in node.children.values() if child.wall / wall_total * 100 > Profiler.percentage_filter]
+        for child in sorted(shown, key=lambda child: -child.wall):
+            percentage = round(child.wall / wall_total * 100, 1)
+            memory = ""
+            if Profiler.track_memory:
+                memory = f", memory peak {round(child.memory_peak / 2**20, 1)} MB, RSS +{round(child.rss_growth / 1024, 1)} MB"
+            print(f"{'  ' * depth}> {child.name} : {percentage}% "
+                  f"(wall {round(child.wall, 2)} s, cpu {round(child.cpu, 2)} s, self {round(child.self_wall, 2)} s, "
+                  f"{child.calls} calls{memory})")
+            Profiler.print_node(child, depth + 1, wall_total)
+        hidden = [child for child in node.children.values() if child not in shown]
+        if hidden:
+            hidden_wall = sum(child.wall for child in hidden)
+            print(f"{'  ' * depth}> {len(hidden)} other timers : {round(hidden_wall / wall_total * 100, 1)}%")
 
     @staticmethod
     def print_all():
-        time_total = Profiler.timer_total.read()
-        covered = 0
+        if not Profiler.enabled:
+            return
+        wall_total = Profiler.wall_time()
+        if wall_total == 0:
+            return
+        covered = sum(child.wall for child in Profiler.root.children.values())
         print("profiling report:")
-        for timer_name, timer in Profiler.timers.items():
-            t = timer.read()
-            covered += t
-            percentage = round(t / time_total * 100, 1)
-            if percentage > Profiler.percentage_filter:
-                print(f'> {timer_name} : {percentage}%')
-        print(f"> covered {round(covered / time_total * 100, 0)}% of {round(time_total, 1)} sec")
+        Profiler.print_node(Profiler.root, 0, wall_total)
+        print(f"> covered {round(covered / wall_total * 100, 0)}% of {round(wall_total, 1)} sec "
+              f"(cpu {round(Profiler.cpu_time(), 1)} sec)")
+
+    @staticmethod
+    def memory_phases():
+        ''' Memory of every timer that allocated memory: its path in the call tree -> peak and RSS growth in MB. '''
+        phases = {}
+        stack = [(child, child.name) for child in Profiler.root.children.values()]
+        while stack:
+            node, path = stack.pop()
+            if node.memory_peak > 0 or node.rss_growth > 0:
+                phases[path] = {"memory_peak_mb": node.memory_peak / 2**20, "rss_growth_mb": node.rss_growth / 1024}
+            stack.extend((child, f"{path}/{child.name}") for child in node.children.values())
+        return phases
 
     @staticmethod
     def print():
-        Profiler.stop()
-        Profiler.timer_total.stop()
+        while Profiler.is_running():
+            Profiler.resume()
+        Profiler.wall_total = Profiler.wall_time()
+        Profiler.cpu_total = Profiler.cpu_time()
         Profiler.print_all()
 
-
+    @staticmethod
+    def export_trace(path):
+        '''
+        Export the recorded spans in the Chrome trace event format (chrome://tracing, Perfetto, speedscope);
+        timers that are still running are exported up to now.
+        '''
+        events = list(Profiler.events)
+        now = time.perf_counter()
+        for node, wall_start, _, args, _ in Profiler.stack:
+            event = {
+                "name": node.name, "cat": node.parent.name, "ph": "X", "pid": 0, "tid": 0,
+                "ts": (wall_start - Profiler.wall_start) * 1e6, "dur": (now - wall_start) * 1e6
+            }
+            if args:
+                event["args"] = args
+            events.append(event)
+        trace = {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped_events": Profiler.events_dropped}
+        }
+        with open(path, "w") as f:
+            json.dump(trace, f)
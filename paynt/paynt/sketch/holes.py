@@ -1,5 +1,7 @@
 import math
 import itertools
+import bisect
+from array import array
 
 import z3
 
@@ -24,11 +26,15 @@ class Hole:
       this order must be preserved in the refining process.
     '''
 
-    def __init__(self, name, options, option_labels, initial_states=None, associated_schedulers=None):
+    def __init__(self, name, options, option_labels, initial_states=None, associated_schedulers=None,
+                 equivalent_options=None):
         self.name = name
         self.options = options
         self.option_labels = option_labels
 
+        # (optional) for each representative option, the list of options with indistinguishable actions
+        self.equivalent_options = equivalent_options
+
         # the initial states from which this hole is reachable
         self.initial_states = initial_states
 
@@ -46,8 +52,13 @@ class Hole:
     def is_unrefined(self):
         return self.size == len(self.option_labels)
 
+    def option_label(self, option):
+        if self.equivalent_options is None or option not in self.equivalent_options:
+            return self.option_labels[option]
+        return "|".join([self.option_labels[equivalent] for equivalent in self.equivalent_options[option]])
+
     def __str__(self):
-        labels = [self.option_labels[option] for option in self.options]
+        labels = [self.option_label(option) for option in self.options]
         if self.size == 1:
             return "{}={}".format(self.name,labels[0]) + " - scheduler(s): " + str(self.associated_schedulers)
         else:
@@ -62,7 +73,8 @@ class Hole:
     def copy(self):
         # note that the copy is shallow, but after assuming some options
         # the options pointer points to the new list, hence the original hole is not modified.
-        return Hole(self.name, self.options, self.option_labels, initial_states=self.initial_states, associated_schedulers=self.associated_schedulers)
+        return Hole(self.name, self.options, self.option_labels, initial_states=self.initial_states,
+                    associated_schedulers=self.associated_schedulers, equivalent_options=self.equivalent_options)
 
 class Holes(list):
     ''' List of holes. '''
@@ -203,6 +215,26 @@ class Holes(list):
         return None
 
 
+class CompressedHint:
+    '''
+    Analysis hint of a parent family: the values of the MDP states indexed by their quotient states. The values
+      are kept in two arrays sorted by the quotient state instead of a dictionary of boxed numbers.
+    '''
+
+    def __init__(self, quotient_states, values):
+        order = sorted(range(len(quotient_states)), key=quotient_states.__getitem__)
+        self.states = array("q", [quotient_states[index] for index in order])
+        self.values = array("d", [values[index] for index in order])
+
+    def __getitem__(self, quotient_state):
+        index = bisect.bisect_left(self.states, quotient_state)
+        assert index < len(self.states) and self.states[index] == quotient_state
+        return self.values[index]
+
+    def __len__(self):
+        return len(self.states)
+
+
 class ParentInfo():
     '''
     Container for stuff to be remembered when splitting an undecided family
@@ -305,7 +337,8 @@ class DesignSpace(Holes):
         DesignSpace.solver_vars = [z3.Int(hole_index) for hole_index in self.hole_indices]
         for hole_index, hole in enumerate(self):
             var = DesignSpace.solver_vars[hole_index]
-            clauses = [var == option for option in hole.options]
+            # index the clauses by options: these need not be contiguous if some options have been pruned or merged
+            clauses = [var == option for option in range(len(hole.option_labels))]
             DesignSpace.solver_clauses.append(clauses)
 
     @property
@@ -360,14 +393,22 @@ class DesignSpace(Holes):
 
         return assignment
 
-    def pick_assignment_priority(self, priority_subfamily):
-        if priority_subfamily is None:
+    def pick_assignment_priority(self, priority_subfamilies):
+        '''
+        Pick any (feasible) hole assignment, preferring members of the priority subfamilies.
+        :param priority_subfamilies a subfamily or a list of subfamilies to explore first (in this order), or None
+        :return None if no instance remains
+        '''
+        if priority_subfamilies is None:
             return self.pick_assignment()
+        if isinstance(priority_subfamilies, DesignSpace):
+            priority_subfamilies = [priority_subfamilies]
 
-        # explore priority subfamily first
-        assignment = priority_subfamily.pick_assignment()
-        if assignment is not None:
-            return assignment
+        # explore priority subfamilies first
+        for priority_subfamily in priority_subfamilies:
+            assignment = priority_subfamily.pick_assignment()
+            if assignment is not None:
+                return assignment
 
         # explore remaining members
         return self.pick_assignment()
@@ -402,6 +443,67 @@ class DesignSpace(Holes):
 
         return pruning_estimate
 
+    def exclude_family(self):
+        '''
+        Exclude all members of this design space from the solver, e.g. after the family has been decided by AR.
+        If the solver scope of this family is open, the blocking clause is added to the scope of its parent,
+        so that it survives while the siblings of this family are explored.
+        :return number of excluded assignments
+        '''
+        if not self.encoded:
+            self.encode()
+
+        reopen_scope = self.refinement_depth > 0 and DesignSpace.solver_depth == self.refinement_depth
+        if reopen_scope:
+            DesignSpace.solver.pop()
+        DesignSpace.solver.add(z3.Not(self.encoding))
+        if reopen_scope:
+            DesignSpace.solver.push()
+
+        self.has_assignments = False
+        return self.size
+
+    @staticmethod
+    def solver_snapshot():
+        '''
+        Blocking clauses of the solver in a picklable form. All clauses exclude decided or conflicting members
+          (scopes only let them be dropped early), hence clauses of all open scopes are valid in the baseline.
+        '''
+        if DesignSpace.solver is None:
+            return None
+        var_to_hole = {var.get_id(): hole_index for hole_index, var in enumerate(DesignSpace.solver_vars)}
+
+        def term(expr):
+            if z3.is_false(expr):
+                return False
+            if z3.is_true(expr):
+                return True
+            if z3.is_not(expr):
+                return ("not", term(expr.arg(0)))
+            if z3.is_and(expr) or z3.is_or(expr):
+                return ("and" if z3.is_and(expr) else "or", [term(child) for child in expr.children()])
+            assert z3.is_eq(expr)
+            return ("eq", var_to_hole[expr.arg(0).get_id()], expr.arg(1).as_long())
+
+        return [term(assertion) for assertion in DesignSpace.solver.assertions()]
+
+    @staticmethod
+    def solver_restore(snapshot):
+        ''' Add the blocking clauses of a snapshot to the baseline of the solver initialized by sat_initialize. '''
+
+        def expr(term):
+            if isinstance(term, bool):
+                return z3.BoolVal(term)
+            if term[0] == "not":
+                return z3.Not(expr(term[1]))
+            if term[0] == "eq":
+                return DesignSpace.solver_clauses[term[1]][term[2]]
+            children = [expr(child) for child in term[1]]
+            return z3.And(children) if term[0] == "and" else z3.Or(children)
+
+        for term in snapshot:
+            DesignSpace.solver.add(expr(term))
+
     def sat_level(self):
         ''' Reset solver depth level to correspond to refinement level. '''
 
@@ -419,19 +521,19 @@ class DesignSpace(Holes):
         DesignSpace.solver_depth += 1
 
     def generalize_hint(self, hint):
-        hint_global = dict()
-        hint = list(hint.get_values())
-        for state in range(self.mdp.states):
-            hint_global[self.mdp.quotient_state_map[state]] = hint[state]
-        return hint_global
+        return CompressedHint(self.mdp.quotient_state_map, list(hint.get_values()))
 
     def generalize_hints(self, result):
+        # hints must not carry the error of the coarse precision
+        result = self.mdp.full_precision_result(result)
         prop = result.property
         hint_prim = self.generalize_hint(result.primary.result)
         hint_seco = self.generalize_hint(result.secondary.result) if result.secondary is not None else None
         return prop, (hint_prim, hint_seco)
 
     def collect_analysis_hints(self):
+        if not DesignSpace.store_hints:
+            return None
         Profiler.start("holes::collect_analysis_hints")
         res = self.analysis_result
         analysis_hints = dict()
@@ -471,14 +573,14 @@ class DesignSpace(Holes):
     def collect_parent_info(self):
         pi = ParentInfo()
         pi.hole_selected_actions = self.hole_selected_actions
-        pi.selected_actions = self.selected_actions
+        pi.selected_actions = array("q", self.selected_actions) if self.selected_actions is not None else None
         pi.refinement_depth = self.refinement_depth
         pi.analysis_hints = self.collect_analysis_hints()
         cr = self.analysis_result.constraints_result
         assert cr is not None
         pi.property_indices = cr.undecided_constraints if cr is not None else []
         pi.splitters = self.splitters
-        pi.mdp = self.mdp
+        # the MDP of this family is not retained: subfamilies restrict the quotient using the selected actions
         return pi
 
 
@@ -9,6 +9,8 @@ class PropertyResult:
         self.value = value
         self.sat = prop.satisfies_threshold(value)
         self.improves_optimum = None if not isinstance(prop, OptimalityProperty) else prop.improves_optimum(value)
+        # whether the result was computed at the coarse precision (see MDP.full_precision_result)
+        self.coarse = False
 
     def __str__(self):
         return f"{self.value}"
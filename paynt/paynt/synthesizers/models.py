@@ -1,14 +1,21 @@
+import json
+import math
+import os
+
 import stormpy
 from ..hypersketch.hyperproperty import HyperProperty
 from ..hypersketch.hyperresult import *
 
-from ..sketch.property import Property
-from ..profiler import Profiler
+from ..sketch.property import Property, OptimalityProperty
+from ..profiler import Profiler, Timer
 from ..sketch.result import ConstraintsResult, MdpPropertyResult, MdpConstraintsResult, SpecificationResult, \
     MdpOptimalityResult, PropertyResult
 
 from ..sketch.holes import DesignSpace
 
+import logging
+logger = logging.getLogger(__name__)
+
 
 class MarkovChain:
 
@@ -17,6 +24,37 @@ class MarkovChain:
     # model checking environment (method & precision)
     environment = None
 
+    # solvers used to model check chains (names of stormpy.EquationSolverType and stormpy.MinMaxMethod values)
+    linear_solver = "gmmxx"
+    minmax_method = "value_iteration"
+
+    # whether the solvers are chosen by timing the candidates below on the first families explored by AR
+    autotune_solvers = False
+    # number of these families (and of chains of their members) the candidates are timed on
+    autotune_families = 3
+    autotune_linear_solvers = ["gmmxx", "native", "eigen", "topological"]
+    autotune_minmax_methods = ["value_iteration", "topological", "interval_iteration",
+                               "optimistic_value_iteration", "sound_value_iteration", "policy_iteration"]
+    # solvers providing the reference values a candidate must match (up to float precision)
+    autotune_reference_linear_solver = "elimination"
+    autotune_reference_minmax_method = "policy_iteration"
+    # file in the project directory pinning the solvers chosen by auto-tuning for later runs (None if not pinned)
+    pinned_solvers_file = "solvers.json"
+    pinned_solvers_path = None
+
+    # whether MDPs are first model checked at a coarse precision by a sound method, and only re-checked at
+    # Property.mc_precision if the verdict lies within the error band
+    precision_escalation = False
+    coarse_precision = 1e-3
+    coarse_minmax_method = "sound_value_iteration"
+    coarse_environment = None
+
+    # whether groups of constraints are evaluated in the order of decreasing refutation rate per model checking time
+    adaptive_property_order = False
+
+    # weak set of all constructed chains, to count the live ones when memory is tracked (None otherwise)
+    live_chains = None
+
     @classmethod
     def initialize(cls, formulae):
         # builder options
@@ -26,21 +64,115 @@ class MarkovChain:
         cls.builder_options.set_add_overlapping_guards_label()
 
         # model checking environment
-        cls.environment = stormpy.Environment()
+        cls.environment = cls.construct_environment(cls.linear_solver, cls.minmax_method)
+        if cls.precision_escalation:
+            cls.coarse_environment = cls.construct_environment(
+                cls.linear_solver, cls.coarse_minmax_method, cls.coarse_precision, sound=True)
+
+    @staticmethod
+    def construct_environment(linear_solver, minmax_method, precision=None, sound=False):
+        if precision is None:
+            precision = Property.mc_precision
+        environment = stormpy.Environment()
+        se = environment.solver_environment
+        if sound:
+            se.set_force_sound()
+        se.set_linear_equation_solver_type(getattr(stormpy.EquationSolverType, linear_solver))
+        se.minmax_solver_environment.precision = stormpy.Rational(precision)
+        se.minmax_solver_environment.method = getattr(stormpy.MinMaxMethod, minmax_method)
+        return environment
+
+    @staticmethod
+    def time_solver(models, formulae, environment):
+        '''
+        Model check all formulae in the models using the given environment.
+        :return CPU time and the values in the initial states, or (None, None) if the solver fails
+        '''
+        timer = Timer()
+        values = []
+        timer.start()
+        try:
+            for model in models:
+                for formula in formulae:
+                    result = stormpy.model_checking(model, formula, only_initial_states=False,
+                                                    extract_scheduler=False, environment=environment)
+                    values += [result.at(state) for state in model.initial_states]
+        except Exception as e:
+            logger.debug(f"solver failed: {e}")
+            return None, None
+        timer.stop()
+        return timer.read(), values
+
+    @staticmethod
+    def values_match(values, reference):
+        for value, ref in zip(values, reference):
+            if value == ref:
+                # covers infinite rewards
+                continue
+            if math.isinf(value) or math.isinf(ref) or Property.above_float_precision(value, ref):
+                return False
+        return True
 
-        se = cls.environment.solver_environment
+    @classmethod
+    def autotune_method(cls, models, formulae, candidates, reference, make_environment):
+        ''' Pick the fastest candidate whose results match the reference solver. '''
+        _, reference_values = cls.time_solver(models, formulae, make_environment(reference))
+        best, best_time = None, None
+        for candidate in candidates:
+            time, values = cls.time_solver(models, formulae, make_environment(candidate))
+            if time is None:
+                logger.info(f"solver auto-tuning: {candidate} failed")
+                continue
+            if reference_values is not None and not cls.values_match(values, reference_values):
+                logger.info(f"solver auto-tuning: {candidate} does not meet the precision")
+                continue
+            logger.info(f"solver auto-tuning: {candidate} took {round(time, 3)} s")
+            if best_time is None or time < best_time:
+                best, best_time = candidate, time
+        return best
 
-        se.set_linear_equation_solver_type(stormpy.EquationSolverType.gmmxx)
-        se.minmax_solver_environment.precision = stormpy.Rational(Property.mc_precision)
-        se.minmax_solver_environment.method = stormpy.MinMaxMethod.value_iteration
-        #se.minmax_solver_environment.method = stormpy.MinMaxMethod.value_iteration
-        #se.minmax_solver_environment.method = stormpy.MinMaxMethod.sound_value_iteration
-        # se.minmax_solver_environment.method = stormpy.MinMaxMethod.interval_iteration
-        # se.minmax_solver_environment.method = stormpy.MinMaxMethod.optimistic_value_iteration
-        #se.minmax_solver_environment.method = stormpy.MinMaxMethod.topological
+    @classmethod
+    def autotune(cls, mdps, dtmcs, formulae):
+        '''
+        Time the candidate min-max methods on the given MDPs and the candidate linear equation solvers on the
+        given DTMCs, use the fastest ones that meet the precision and pin them for the project.
+        '''
+        Profiler.start("models::autotune")
+        minmax_method = cls.autotune_method(
+            mdps, formulae, cls.autotune_minmax_methods, cls.autotune_reference_minmax_method,
+            lambda method: cls.construct_environment(cls.linear_solver, method))
+        if minmax_method is not None:
+            cls.minmax_method = minmax_method
+
+        linear_solver = cls.autotune_method(
+            dtmcs, formulae, cls.autotune_linear_solvers, cls.autotune_reference_linear_solver,
+            lambda solver: cls.construct_environment(solver, cls.minmax_method))
+        if linear_solver is not None:
+            cls.linear_solver = linear_solver
+
+        cls.environment = cls.construct_environment(cls.linear_solver, cls.minmax_method)
+        if cls.precision_escalation:
+            cls.coarse_environment = cls.construct_environment(
+                cls.linear_solver, cls.coarse_minmax_method, cls.coarse_precision, sound=True)
+        logger.info(f"Solver auto-tuning chose linear solver {cls.linear_solver} and min-max method {cls.minmax_method}")
+        if cls.pinned_solvers_path is not None:
+            with open(cls.pinned_solvers_path, "w") as f:
+                json.dump({"linear_solver": cls.linear_solver, "minmax_method": cls.minmax_method}, f)
+            logger.info(f"Pinned the solvers for later runs of the project in {cls.pinned_solvers_path}")
+        Profiler.resume()
+
+    @classmethod
+    def pinned_solvers(cls):
+        ''' Solvers pinned for the project by an earlier auto-tuning (an empty dictionary if there are none). '''
+        if cls.pinned_solvers_path is None or not os.path.exists(cls.pinned_solvers_path):
+            return {}
+        with open(cls.pinned_solvers_path) as f:
+            return json.load(f)
 
     def __init__(self, model, quotient_container, quotient_state_map, quotient_choice_map):
         Profiler.start("models::MarkovChain")
+        if MarkovChain.live_chains is not None:
+            MarkovChain.live_chains.add(self)
         if model.labeling.contains_label("overlap_guards"):
             assert model.labeling.get_states("overlap_guards").number_of_set_bits() == 0
         self.model = model
@@ -83,17 +215,23 @@ class MarkovChain:
     def initial_states(self):
         return self.model.initial_states
 
-    def model_check_formula(self, formula):
+    def model_check_formula(self, formula, environment=None):
+        if environment is None:
+            environment = self.environment
+        if self.quotient_container.use_qualitative_cache:
+            formula = self.quotient_container.qualitative_formula(formula)
         result = stormpy.model_checking(
             self.model, formula, only_initial_states=False,
             extract_scheduler=(not self.is_dtmc),
             # extract_scheduler=True,
-            environment=self.environment
+            environment=environment
         )
         assert result is not None
         return result
 
     def model_check_formula_hint(self, formula, hint):
+        if self.quotient_container.use_qualitative_cache:
+            formula = self.quotient_container.qualitative_formula(formula)
         stormpy.synthesis.set_loglevel_off()
         task = stormpy.core.CheckTask(formula, only_initial_states=False)
         task.set_produce_schedulers(produce_schedulers=True)
@@ -146,6 +284,35 @@ class MarkovChain:
         Profiler.resume()
         return HyperPropertyResult(prop, result, result_alt)
 
+    def record_property(self, index, time, refuted):
+        ''' Update the model checking time and the refutation count of a constraint. '''
+        if not MarkovChain.adaptive_property_order:
+            return
+        statistics = type(self).property_statistics.setdefault(index, [0, 0, 0])
+        statistics[0] += 1
+        statistics[1] += time
+        statistics[2] += 1 if refuted else 0
+
+    def group_priority(self, group):
+        statistics = type(self).property_statistics
+        if any(index not in statistics for index in group):
+            # evaluate unseen constraints first to collect their statistics
+            return math.inf
+        cost = sum([statistics[index][1] / statistics[index][0] for index in group])
+        # the group is refuted only if all its constraints are refuted
+        refutation_rate = min([statistics[index][2] / statistics[index][0] for index in group])
+        return refutation_rate / max(cost, Property.float_precision)
+
+    def ordered_groups(self, grouped):
+        '''
+        Order the groups of constraints in a disjunction so that cheap and frequently refuting groups are
+        evaluated first; the order only matters for short evaluation, which stops at the first refuted group.
+        '''
+        if not MarkovChain.adaptive_property_order:
+            return grouped
+        # the sort is stable, hence groups with equal priority keep the order of the specification
+        return sorted(grouped, key=self.group_priority, reverse=True)
+
     def model_check_scheduler_difference(self, prop, family, alt=False):
         diff_count = 0
 
@@ -165,6 +332,9 @@ class MarkovChain:
 
 class DTMC(MarkovChain):
 
+    # for each constraint index, the number of checks, the total model checking time and the number of refutations
+    property_statistics = {}
+
     def check_constraints(self, properties, property_indices=None, short_evaluation=False):
         '''
         Check constraints.
@@ -210,15 +380,23 @@ class DTMC(MarkovChain):
             property_indices = [index for index,_ in enumerate(properties)]
 
         results = [None for prop in properties]
-        grouped = HyperSpecification.or_group_indexes(property_indices)
+        grouped = self.ordered_groups(HyperSpecification.or_group_indexes(property_indices))
+        # the constraints are timed only to order them adaptively
+        timer = Timer() if MarkovChain.adaptive_property_order else None
         for group in grouped:
             if not group:
                 continue
             unsat = True
             for index in group:
                 prop = properties[index]
+                if timer is not None:
+                    timer.reset()
+                    timer.start()
                 result = self.model_check_hyperproperty(prop) if isinstance(prop, HyperProperty) \
                     else self.model_check_property(prop)
+                if timer is not None:
+                    timer.stop()
+                    self.record_property(index, timer.read(), result.sat is False)
                 results[index] = result
                 unsat = False if result.sat is not False else unsat
             if short_evaluation and unsat:
@@ -249,6 +427,13 @@ class MDP(MarkovChain):
     # whether the secondary direction will be explored if primary is not enough
     compute_secondary_direction = False
 
+    # number of properties decided at the coarse precision and of properties re-checked at full precision
+    coarse_decided = 0
+    coarse_escalated = 0
+
+    # for each constraint index, the number of checks, the total model checking time and the number of refutations
+    property_statistics = {}
+
     def __init__(self, model, quotient_container, quotient_state_map, quotient_choice_map, design_space):
         super().__init__(model, quotient_container, quotient_state_map, quotient_choice_map)
 
@@ -256,6 +441,107 @@ class MDP(MarkovChain):
         self.analysis_hints = None
         self.quotient_to_restricted_action_map = None
 
+    @staticmethod
+    def coarse_error(value):
+        ''' Bound on the error of a value computed by a sound method at the coarse precision. '''
+        if math.isinf(value):
+            # infinite values stem from the exact qualitative analysis
+            return 0
+        # covers both absolute and relative termination criteria
+        return MarkovChain.coarse_precision * max(1, abs(value))
+
+    @staticmethod
+    def within_error_band(value, thresholds, error):
+        ''' Check whether some comparison of the value could be flipped by the errors of the operands. '''
+        if math.isinf(value):
+            return False
+        for threshold, threshold_error in thresholds:
+            if threshold is None or math.isinf(threshold):
+                continue
+            if abs(value - threshold) <= error + threshold_error + Property.float_precision:
+                return True
+        return False
+
+    def decided_at_coarse_precision(self, within_band):
+        if within_band:
+            MDP.coarse_escalated += 1
+        else:
+            MDP.coarse_decided += 1
+        return not within_band
+
+    def model_check_property(self, prop, alt=False):
+        if not MarkovChain.precision_escalation:
+            return super().model_check_property(prop, alt)
+
+        Profiler.start("  MC coarse")
+        formula = prop.formula if not alt else prop.formula_alt
+        result = self.model_check_formula(formula, MarkovChain.coarse_environment)
+        value = result.at(prop.state)
+        Profiler.resume()
+
+        # the value is compared against the threshold and, for optimality properties, against the optimum
+        thresholds = [(prop.threshold, 0)]
+        if isinstance(prop, OptimalityProperty):
+            thresholds.append((prop.optimum, 0))
+        within_band = MDP.within_error_band(value + prop.min_bound, thresholds, MDP.coarse_error(value))
+        if not self.decided_at_coarse_precision(within_band):
+            return super().model_check_property(prop, alt)
+        property_result = PropertyResult(prop, result, value)
+        property_result.coarse = True
+        return property_result
+
+    def model_check_hyperproperty(self, prop, alt=False):
+        if not MarkovChain.precision_escalation:
+            return super().model_check_hyperproperty(prop, alt)
+
+        Profiler.start("  MC coarse")
+        formula = prop.primary_formula if not alt else prop.primary_formula_alt
+        if prop.multitarget:
+            formula_alt = prop.secondary_formula if not alt else prop.secondary_formula_alt
+        else:
+            formula_alt = prop.primary_formula_alt if not alt else prop.primary_formula
+        result = self.model_check_formula(formula, MarkovChain.coarse_environment)
+        result_alt = self.model_check_formula(formula_alt, MarkovChain.coarse_environment)
+        Profiler.resume()
+
+        # both the value and the opposite-direction value it is compared against are approximate
+        state, other_state = prop.evaluated_pair(result, result_alt)
+        value = result.at(state)
+        threshold = result_alt.at(other_state)
+        within_band = MDP.within_error_band(
+            value + prop.min_bound, [(threshold, MDP.coarse_error(threshold))], MDP.coarse_error(value))
+        if not self.decided_at_coarse_precision(within_band):
+            return super().model_check_hyperproperty(prop, alt)
+        property_result = HyperPropertyResult(prop, result, result_alt)
+        property_result.coarse = True
+        return property_result
+
+    def full_precision_direction(self, prop, property_result, alt=False):
+        ''' Re-check a single direction at the full precision if it was decided at the coarse precision. '''
+        if property_result is None or not property_result.coarse:
+            return property_result
+        if isinstance(prop, HyperProperty):
+            return MarkovChain.model_check_hyperproperty(self, prop, alt)
+        return MarkovChain.model_check_property(self, prop, alt)
+
+    def full_precision_result(self, mdp_result):
+        '''
+        Re-check at the full precision the directions of an MDP property result that were decided at the coarse
+        precision. The verdicts of coarse results are sound, but their value vectors are off by up to
+        coarse_error in either direction and must not be used as counterexample bounds or model checking hints.
+        The result is updated in place.
+        '''
+        if mdp_result is None:
+            return None
+        prop = mdp_result.property
+        if mdp_result.primary is not None and mdp_result.primary.coarse:
+            mdp_result.primary = self.full_precision_direction(prop, mdp_result.primary, alt=False)
+            if isinstance(prop, HyperProperty) and not prop.multitarget and mdp_result.secondary is not None:
+                # the secondary direction swaps the vectors of the primary one
+                mdp_result.secondary = HyperPropertyResult(prop, mdp_result.primary.result_alt, mdp_result.primary.result)
+        mdp_result.secondary = self.full_precision_direction(prop, mdp_result.secondary, alt=True)
+        return mdp_result
+
     def check_property(self, prop):
 
         # check primary direction
@@ -276,6 +562,9 @@ class MDP(MarkovChain):
             return MdpPropertyResult(prop, primary, secondary, feasibility,
                                      selection, True, None, True)
 
+        # the scheduler is selected from the values, which are only approximate at the coarse precision
+        primary = self.full_precision_direction(prop, primary, alt=False)
+
         # check if the primary scheduler is consistent
         selection, _, _, scores, consistent = self.quotient_container.scheduler_consistent_pctl(
             self, prop, primary.result, prop.state)
@@ -309,6 +598,8 @@ class MDP(MarkovChain):
             return MdpOptimalityResult(prop, primary, None, None, None, False, None, None, False)
 
         # LB < OPT
+        # the scheduler is selected from the values, which are only approximate at the coarse precision
+        primary = self.full_precision_direction(prop, primary, alt=False)
         # check if LB is tight
         selection, _, _,scores,consistent = self.quotient_container.scheduler_consistent_pctl(self, prop, primary.result, prop.state)
         if consistent:
@@ -365,7 +656,11 @@ class MDP(MarkovChain):
 
         # primary direction is SAT
         # check secondary direction to show that all SAT
-        secondary = self.model_check_hyperproperty(prop, alt = True) if prop.multitarget else HyperPropertyResult(prop, primary.result_alt, primary.result)
+        if prop.multitarget:
+            secondary = self.model_check_hyperproperty(prop, alt = True)
+        else:
+            secondary = HyperPropertyResult(prop, primary.result_alt, primary.result)
+            secondary.coarse = primary.coarse
         feasibility = True if secondary.sat else None
 
         if feasibility:
@@ -377,9 +672,17 @@ class MDP(MarkovChain):
                                           None, False, None, None,
                                           None, False, None)
 
+        # the selections and the feasibility of the selected schedulers compare the values themselves, which are
+        # only approximate at the coarse precision
+        primary = self.full_precision_direction(prop, primary, alt=False)
+        if prop.multitarget:
+            secondary = self.full_precision_direction(prop, secondary, alt=True)
+        else:
+            secondary = HyperPropertyResult(prop, primary.result_alt, primary.result)
+
         # prepare for splitting on this property
-        state = prop.state
-        other_state = prop.other_state
+        state = primary.state
+        other_state = primary.other_state
         # compute the scores for splitting
         primary_selection, primary_consistent, primary_differences, \
             secondary_selection, secondary_consistent, secondary_differences, \
@@ -409,15 +712,23 @@ class MDP(MarkovChain):
             property_indices = [index for index, _ in enumerate(properties)]
 
         results = [None for prop in properties]
-        grouped = HyperSpecification.or_group_indexes(property_indices)
+        grouped = self.ordered_groups(HyperSpecification.or_group_indexes(property_indices))
+        # the constraints are timed only to order them adaptively
+        timer = Timer() if MarkovChain.adaptive_property_order else None
         for group in grouped:
             if not group:
                 continue
             unfeasible = True
             for index in group:
                 prop = properties[index]
+                if timer is not None:
+                    timer.reset()
+                    timer.start()
                 result = self.check_hyperproperty(prop) if isinstance(prop, HyperProperty) \
                     else self.check_property(prop)
+                if timer is not None:
+                    timer.stop()
+                    self.record_property(index, timer.read(), result.feasibility is False)
                 results[index] = result
                 unfeasible = False if result.feasibility is not False else unfeasible
             if short_evaluation and unfeasible:
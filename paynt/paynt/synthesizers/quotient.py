@@ -21,6 +21,9 @@ logger = logging.getLogger(__name__)
 
 class QuotientContainer:
 
+    # whether reachability formulae are strengthened by quotient-wide qualitative states
+    use_qualitative_cache = False
+
     def __init__(self, sketch):
         # model origin
         self.sketch = sketch
@@ -43,6 +46,12 @@ class QuotientContainer:
         # (optional) counter of discarded assignments
         self.discarded = None
 
+        # for each reachability path formula, labels of the quotient states reaching the target with probability 0
+        # and 1 under all schedulers
+        self.qualitative_labels = {}
+        # for each model-checked formula, its strengthened counterpart
+        self.qualitative_formulae = {}
+
     def compute_default_actions(self):
         self.default_actions = stormpy.BitVector(self.quotient_mdp.nr_choices, False)
         for choice in range(self.quotient_mdp.nr_choices):
@@ -61,6 +70,77 @@ class QuotientContainer:
                 relevant_holes.update(set(self.action_to_hole_options[action].keys()))
             self.state_to_holes.append(relevant_holes)
 
+    def state_formula_states(self, formula):
+        result = stormpy.model_checking(self.quotient_mdp, formula)
+        return result.get_truth_values()
+
+    def qualitative_states(self, formula):
+        '''
+        For an unbounded reachability formula phi U psi (or F psi), compute the quotient states reaching psi
+        with probability 0 and 1 under all schedulers.
+        :return target states, probability-0 states and probability-1 states, or None for other formulae
+        '''
+        path_formula = formula.subformula
+        if path_formula.is_eventually_formula:
+            phi_states = stormpy.BitVector(self.quotient_mdp.nr_states, True)
+            psi_states = self.state_formula_states(path_formula.subformula)
+        elif path_formula.is_until_formula:
+            phi_states = self.state_formula_states(path_formula.left_subformula)
+            psi_states = self.state_formula_states(path_formula.right_subformula)
+        else:
+            return None
+
+        # max-probability 0 states reach the target with probability 0 under all schedulers,
+        # min-probability 1 states reach it with probability 1 under all schedulers
+        prob0,_ = stormpy.compute_prob01max_states(self.quotient_mdp, phi_states, psi_states)
+        _,prob1 = stormpy.compute_prob01min_states(self.quotient_mdp, phi_states, psi_states)
+        return psi_states,prob0,prob1
+
+    def compute_qualitative_cache(self, formulae):
+        '''
+        For each unbounded reachability formula, label the quotient states reaching the target with probability 0
+        (resp. 1) under all schedulers. Every family MDP and chain is a restriction of the quotient and inherits
+        its labeling, so these states keep their qualitative value there. The formulae of the families are
+        strengthened by these labels (see qualitative_formula); storm still runs its prob0/prob1 precomputation
+        on every family, the strengthened formula only makes the cached states absorbing for it.
+        '''
+        Profiler.start("quotient::compute_qualitative_cache")
+        labeling = self.quotient_mdp.labeling
+        for formula in formulae:
+            if not formula.is_probability_operator:
+                continue
+            key = str(formula.subformula)
+            if key in self.qualitative_labels:
+                continue
+            qualitative_states = self.qualitative_states(formula)
+            if qualitative_states is None:
+                continue
+            _,prob0,prob1 = qualitative_states
+
+            index = len(self.qualitative_labels)
+            prob0_label, prob1_label = f"__prob0_{index}__", f"__prob1_{index}__"
+            labeling.add_label(prob0_label)
+            labeling.set_states(prob0_label, prob0)
+            labeling.add_label(prob1_label)
+            labeling.set_states(prob1_label, prob1)
+            self.qualitative_labels[key] = (prob0_label, prob1_label)
+            logger.debug(f"{key}: {prob0.number_of_set_bits()} quotient states have probability 0 "
+                         f"and {prob1.number_of_set_bits()} have probability 1 under all schedulers")
+        Profiler.resume()
+
+    def qualitative_formula(self, formula):
+        ''' Strengthen the formula by the quotient-wide qualitative states (if these were computed). '''
+        key = str(formula)
+        strengthened = self.qualitative_formulae.get(key)
+        if strengthened is None:
+            strengthened = formula
+            if formula.is_probability_operator:
+                labels = self.qualitative_labels.get(str(formula.subformula))
+                if labels is not None:
+                    strengthened = stormpy.synthesis.strengthen_reachability_formula(formula, *labels)
+            self.qualitative_formulae[key] = strengthened
+        return strengthened
+
     def select_actions(self, family):
         ''' Select non-default actions relevant in the provided design space. '''
         Profiler.start("quotient::select_actions")
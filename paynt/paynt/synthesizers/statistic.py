@@ -1,5 +1,15 @@
 from ..profiler import Timer,Profiler
-
+from .models import MarkovChain, MDP
+from ..sketch.property import Property
+from ..sketch.holes import DesignSpace
+
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+import weakref
 import logging
 logger = logging.getLogger(__name__)
 
@@ -20,6 +30,38 @@ def safe_division(dividend, divisor):
         logger.info(f"Overflow error when computing {dividend} / {divisor}, returning an integer instead of a float")
         return dividend // divisor
 
+def object_size(obj, seen):
+    '''
+    Size of a Python object including the containers and objects it references (objects in seen are skipped).
+    Chains, stormpy and z3 objects are counted without their contents, these are accounted separately.
+    '''
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, (MarkovChain, type)) or type(obj).__module__.startswith(("stormpy", "z3")):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, "__dict__"):
+            stack.append(obj.__dict__)
+    return size
+
+def resident_set_size():
+    ''' Current resident set size in bytes (the peak one if the current is not available). '''
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
 class Statistic:
     """General computation stats."""
 
@@ -27,6 +69,36 @@ class Statistic:
     status_period = 3
     print_profiling = False
 
+    # whether the memory is sampled in the status and the summary: RSS, traced Python memory, frontier of
+    # undecided families, live MDPs and solver assertions
+    track_memory = False
+    # number of frontier families measured to estimate the bytes per family
+    frontier_sample = 8
+
+    # file to which the events of the run are appended as JSON lines (None to disable)
+    metrics_path = None
+    metrics_file = None
+
+    @staticmethod
+    def emit(event, **fields):
+        ''' Append an event to the metrics stream; every line is flushed to keep interrupted runs analyzable. '''
+        if Statistic.metrics_path is None:
+            return
+        if Statistic.metrics_file is None:
+            Statistic.metrics_file = open(Statistic.metrics_path, "a")
+        record = {"event": event, "timestamp": time.time()}
+        record.update(fields)
+        Statistic.metrics_file.write(json.dumps(record, default=str) + "\n")
+        Statistic.metrics_file.flush()
+
+    @staticmethod
+    def start_memory_tracking():
+        ''' Start tracing the Python allocations; to be called before the sketch is parsed. '''
+        Statistic.track_memory = True
+        Profiler.track_memory = True
+        MarkovChain.live_chains = weakref.WeakSet()
+        tracemalloc.start()
+
     
     def __init__(self, sketch, synthesizer):
         
@@ -52,12 +124,33 @@ class Statistic:
         self.ar_unsat_members = 0
         self.ar_sat_members = 0
 
+        # counterexample generator stats (CEGIS and hybrid only)
+        self.ce_stats = None
+
         self.feasible = None
         self.assignment = None
 
         self.synthesis_time = Timer()
         self.status_horizon = Statistic.status_period
 
+        # frontier of undecided families of the AR loop (None for methods without a frontier)
+        self.frontier = None
+        self.max_frontier = 0
+        self.memory = None
+
+        if Statistic.metrics_path is not None:
+            quotient_states, quotient_actions = self.quotient_size()
+            Statistic.emit("quotient", method=synthesizer.method_name, quotient_states=quotient_states,
+                           quotient_actions=quotient_actions, holes=sketch.design_space.num_holes,
+                           family_size=sketch.design_space.size)
+
+    def quotient_size(self):
+        ''' States and actions of the quotient MDP (not built if the symbolic precheck refuted the design space). '''
+        quotient_mdp = self.sketch.quotient.quotient_mdp
+        if quotient_mdp is None:
+            return 0, 0
+        return quotient_mdp.nr_states, quotient_mdp.nr_choices
+
 
     def start(self):
         self.synthesis_time.start()
@@ -90,8 +183,65 @@ class Statistic:
         else:
             self.cegis_unsat_members += 1
 
+    def collect_ce_stats(self, ce_generator):
+        """ Read the conflict and timing stats accumulated by the counterexample generator. """
+        stats = ce_generator.stats
+        self.ce_stats = {
+            "formula_conflicts": list(stats.formula_conflicts),
+            "dtmcs_prepared": stats.dtmcs_prepared,
+            "waves_probed": stats.waves_probed,
+            "model_checks": stats.model_checks,
+            "preparation_time": stats.preparation_time / 1000,
+            "conflict_time": stats.conflict_time / 1000,
+            "model_checking_time": stats.model_checking_time / 1000,
+        }
+        logger.info(f"CE generator stats: {self.ce_stats}")
+
+    def sample_memory(self):
+        ''' Measure the memory of the run, see Statistic.track_memory. '''
+        memory = {
+            "rss_mb": resident_set_size() / 2**20,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "traced_mb": tracemalloc.get_traced_memory()[0] / 2**20 if tracemalloc.is_tracing() else None,
+            "live_mdps": sum(1 for chain in MarkovChain.live_chains if isinstance(chain, MDP)),
+            "live_dtmcs": sum(1 for chain in MarkovChain.live_chains if not isinstance(chain, MDP)),
+            "solver_assertions": len(DesignSpace.solver.assertions()) if DesignSpace.solver is not None else 0,
+        }
+        if self.frontier is not None:
+            self.max_frontier = max(self.max_frontier, len(self.frontier))
+            resident = self.frontier.resident()
+            step = max(1, len(resident) // Statistic.frontier_sample)
+            sample = resident[::step][:Statistic.frontier_sample]
+            memory.update({
+                "frontier": len(self.frontier),
+                "max_frontier": self.max_frontier,
+                "bytes_per_family": safe_division(sum(object_size(family, set()) for family in sample), len(sample)),
+                "spilled_families": self.frontier.spilled,
+            })
+        self.memory = memory
+        return memory
+
+    def memory_status(self):
+        memory = self.memory
+        status = f"RSS {round(memory['rss_mb'])} MB (peak {round(memory['peak_rss_mb'])} MB)"
+        if memory["traced_mb"] is not None:
+            status += f", traced {round(memory['traced_mb'])} MB"
+        if "frontier" in memory:
+            status += f", frontier {memory['frontier']} families ({round(memory['bytes_per_family'])} B/family" \
+                      f", {memory['spilled_families']} spilled)"
+        status += f", live MDPs {memory['live_mdps']}, live DTMCs {memory['live_dtmcs']}" \
+                  f", solver assertions {memory['solver_assertions']}"
+        return status
+
+    def fraction_explored(self):
+        ''' Fraction of the design space explored by the synthesizer, as reported by the summary and the metrics. '''
+        return self.synthesizer.explored / self.sketch.design_space.size
+
+    def fraction_rejected(self):
+        return (self.synthesizer.explored + self.synthesizer.sketch.quotient.discarded) / self.sketch.design_space.size
+
     def status(self):
-        fraction_rejected = (self.synthesizer.explored + self.synthesizer.sketch.quotient.discarded) / self.sketch.design_space.size
+        fraction_rejected = self.fraction_rejected()
         time_estimate = safe_division(self.synthesis_time.read(), fraction_rejected)
         percentage_rejected = int(fraction_rejected * 1000000) / 10000.0
         # percentage_rejected = fraction_rejected * 100
@@ -107,7 +257,10 @@ class Statistic:
         # elif ds.use_python_z3:
         #     sat_size = len(ds.solver.assertions())
 
-        return f"> Progress {percentage_rejected}%, elapsed {time_elapsed} s, iters = {iters}"
+        status = f"> Progress {percentage_rejected}%, elapsed {time_elapsed} s, iters = {iters}"
+        if Statistic.track_memory:
+            status += f"\n> Memory: {self.memory_status()}"
+        return status
 
     def print_status(self):
         if not self.synthesis_time.read() > self.status_horizon:
@@ -115,7 +268,11 @@ class Statistic:
 
         if Statistic.print_profiling:
             Profiler.print_all()
+        if Statistic.track_memory:
+            self.sample_memory()
         print(self.status(), flush=True)
+        Statistic.emit("progress", explored=self.fraction_explored() * 100, elapsed=self.synthesis_time.read(),
+                       iterations_mdp=self.iterations_mdp, iterations_dtmc=self.iterations_dtmc, memory=self.memory)
         self.status_horizon += Statistic.status_period
 
 
@@ -132,6 +289,8 @@ class Statistic:
         self.avg_size_mdp = safe_division(self.acc_size_mdp, self.iterations_mdp)
         self.avg_conflict_size = safe_division(sum([i*k for i,k in enumerate(self.acc_conflicts)]), sum(self.acc_conflicts))
         self.avg_decided_families_size = safe_division(self.acc_decided_families_size, self.acc_decided_families)
+        if Statistic.track_memory:
+            self.sample_memory()
 
     def get_summary(self):
         spec = self.sketch.specification
@@ -139,11 +298,10 @@ class Statistic:
                         + f"Optimality objective: {spec.optimality}\n Scheduler Hyperoptimality objective: {spec.sched_hyperoptimality}\n"
         disjoint_indexes = f" Indexes of formulae in OR relation with each other: {spec.disjoint_indexes}\n"
 
-        fraction_explored = int((self.synthesizer.explored / self.sketch.design_space.size) * 100)
+        fraction_explored = int(self.fraction_explored() * 100)
         explored = f"explored: {fraction_explored} %"
 
-        super_quotient_states = self.sketch.quotient.quotient_mdp.nr_states
-        super_quotient_actions = self.sketch.quotient.quotient_mdp.nr_choices
+        super_quotient_states, super_quotient_actions = self.quotient_size()
 
         cegis_sat_stats = f"CEGIS Sat members found: {self.cegis_sat_members}, CEGIS Unsat Members found: {self.cegis_unsat_members}"
         ar_sat_stats = f"AR Sat members found: {self.ar_sat_members}, AR Unsat Members found: {self.ar_unsat_members}"
@@ -167,6 +325,30 @@ class Statistic:
             family_stats += f"{ar_stats}\n"
         if self.iterations_dtmc > 0:
             family_stats += f"{cegis_stats}\n"
+        if self.ce_stats is not None:
+            ce = self.ce_stats
+            conflicts = sum(ce["formula_conflicts"])
+            family_stats += f"CE generator stats: conflicts per formula: {ce['formula_conflicts']}" \
+                            f", DTMCs prepared: {ce['dtmcs_prepared']}" \
+                            f", waves probed: {ce['waves_probed']} (avg {round(safe_division(ce['waves_probed'], conflicts), 2)} per conflict)" \
+                            f", sub-DTMC model checks: {ce['model_checks']}\n" \
+                            f"CE generator time: preparation {round(ce['preparation_time'], 2)} s" \
+                            f", conflicts {round(ce['conflict_time'], 2)} s" \
+                            f" (of which model checking {round(ce['model_checking_time'], 2)} s)\n"
+
+        if MarkovChain.precision_escalation:
+            family_stats += f"Precision escalation: {MDP.coarse_decided} MDP checks decided at precision " \
+                            f"{MarkovChain.coarse_precision}, {MDP.coarse_escalated} re-checked at {Property.mc_precision}\n"
+
+        if Statistic.track_memory and self.memory is not None:
+            family_stats += f"Memory: {self.memory_status()}"
+            if self.frontier is not None:
+                family_stats += f", max frontier {self.max_frontier} families"
+            family_stats += "\n"
+            phases = sorted(Profiler.memory_phases().items(), key=lambda phase: -phase[1]["memory_peak_mb"])
+            for path, phase in phases[:5]:
+                family_stats += f"  {path}: memory peak {round(phase['memory_peak_mb'], 1)} MB" \
+                                f", RSS +{round(phase['rss_growth_mb'], 1)} MB\n"
 
         feasible = "yes" if self.feasible else "no"
         result = f"feasible: {feasible}"
@@ -181,7 +363,50 @@ class Statistic:
         return summary
 
     
+    def get_metrics(self):
+        ''' Counters of the finished synthesis as a dictionary. '''
+        quotient_states, quotient_actions = self.quotient_size()
+        metrics = {
+            "method": self.synthesizer.method_name,
+            "feasible": self.feasible,
+            "synthesis_time": self.synthesis_time.time,
+            "family_size": self.sketch.design_space.size,
+            "holes": self.sketch.design_space.num_holes,
+            "quotient_states": quotient_states,
+            "quotient_actions": quotient_actions,
+            "explored": self.fraction_explored() * 100,
+            "iterations_mdp": self.iterations_mdp,
+            "avg_size_mdp": self.avg_size_mdp,
+            "decided_families": self.acc_decided_families,
+            "avg_decided_families_size": self.avg_decided_families_size,
+            "ar_sat_members": self.ar_sat_members,
+            "ar_unsat_members": self.ar_unsat_members,
+            "iterations_dtmc": self.iterations_dtmc,
+            "avg_size_dtmc": self.avg_size_dtmc,
+            "conflicts": sum(self.acc_conflicts),
+            "avg_conflict_size": self.avg_conflict_size,
+            "cegis_sat_members": self.cegis_sat_members,
+            "cegis_unsat_members": self.cegis_unsat_members,
+            "ce_stats": self.ce_stats,
+            "assignment": self.assignment,
+        }
+        spec = self.sketch.specification
+        if spec.has_optimality and spec.optimality.optimum is not None:
+            metrics["optimum"] = spec.optimality.optimum
+        if getattr(spec, "has_scheduler_hyperoptimality", False) and spec.sched_hyperoptimality.hyperoptimum is not None:
+            # optimal scheduler difference (MAX SD / MIN SD), e.g. the maximal distance of the Opacity benchmarks
+            metrics["optimum"] = spec.sched_hyperoptimality.hyperoptimum
+        if MarkovChain.precision_escalation:
+            metrics["coarse_decided"] = MDP.coarse_decided
+            metrics["coarse_escalated"] = MDP.coarse_escalated
+        if Statistic.track_memory:
+            metrics["memory"] = self.memory
+            metrics["memory_phases"] = Profiler.memory_phases()
+        return metrics
+
     def print(self):    
         if Statistic.print_profiling:
             Profiler.print_all()
         print(self.get_summary())
+        if Statistic.metrics_path is not None:
+            Statistic.emit("summary", **self.get_metrics())
@@ -0,0 +1,97 @@
+import csv
+import json
+import os
+import signal
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("stormpy.synthesis")
+
+from paynt.hypersketch.hypersketch import HyperSketch
+from paynt.hypersynthesizers.hypersynthesizer import HyperSynthesizerAR
+from paynt.hypersynthesizers.checkpoint import Checkpoint
+from paynt.hypersynthesizers.searchtrace import SearchTrace
+
+# A run recording its search trace is terminated, resumed from its checkpoint and its trace is replayed.
+# Run from the paynt directory with python -m pytest tests
+
+hyperpaynt_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+replay_exe = os.path.join(hyperpaynt_dir, "replay.py")
+project = os.path.join(hyperpaynt_dir, "eval", "SD", "simple")
+# the run is terminated after this many families are analyzed
+interrupt_after = 2
+
+
+@pytest.fixture
+def recording(tmp_path, monkeypatch):
+    ''' Record the trace and checkpoint after every family, keep the SIGTERM handler of the test process. '''
+    monkeypatch.setattr(SearchTrace, "path", str(tmp_path / "trace.jsonl"))
+    monkeypatch.setattr(Checkpoint, "path", str(tmp_path / "search.checkpoint"))
+    monkeypatch.setattr(Checkpoint, "period", 0)
+    handler = signal.getsignal(signal.SIGTERM)
+    yield tmp_path
+    signal.signal(signal.SIGTERM, handler)
+
+
+def synthesize(interrupt=False):
+    ''' Run AR exploring the whole design space, terminate it by SIGTERM after a few families if requested. '''
+    sketch = HyperSketch(os.path.join(project, "sketch.templ"), os.path.join(project, "sketch.props"))
+    synthesizer = HyperSynthesizerAR(sketch)
+    if interrupt:
+        analyze_family_ar = synthesizer.analyze_family_ar
+
+        def analyze_and_interrupt(family):
+            result = analyze_family_ar(family)
+            if synthesizer.stat.iterations_mdp == interrupt_after:
+                os.kill(os.getpid(), signal.SIGTERM)
+            return result
+        synthesizer.analyze_family_ar = analyze_and_interrupt
+    try:
+        synthesizer.synthesize(sketch.design_space, True)
+    finally:
+        synthesizer.search_trace.close()
+    return synthesizer
+
+
+def read_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def replay(trace_path, order, csv_path):
+    call = [sys.executable, replay_exe, trace_path, "--orders", order, "--policies", "recorded", "--csv", csv_path]
+    process = subprocess.run(call, cwd=hyperpaynt_dir, capture_output=True, text=True)
+    assert process.returncode == 0, process.stderr[-2000:]
+    with open(csv_path) as f:
+        return next(csv.DictReader(f))
+
+
+def test_record_resume_replay(recording):
+    trace_path = SearchTrace.path
+    complete = synthesize()
+    complete_trace = read_trace(trace_path)
+    if complete.stat.iterations_mdp <= interrupt_after:
+        pytest.skip("the search is too short to be interrupted")
+    os.remove(trace_path)
+
+    with pytest.raises(SystemExit):
+        synthesize(interrupt=True)
+    assert os.path.exists(Checkpoint.path)
+    interrupted_trace = read_trace(trace_path)
+    assert [record["family"] for record in interrupted_trace if record["event"] == "analysis"] == \
+        list(range(1, interrupt_after + 1))
+
+    resumed = synthesize()
+    assert not os.path.exists(Checkpoint.path)
+    assert resumed.stat.iterations_mdp == complete.stat.iterations_mdp
+    # the resumed run continues the trace, which then equals the trace of an uninterrupted run
+    assert read_trace(trace_path) == complete_trace
+
+    # replaying the recorded order and splits reproduces the run without model checking
+    order = "dfs" if complete_trace[0]["dfs"] else "bfs"
+    result = replay(trace_path, order, str(recording / "replay.csv"))
+    assert int(result["iterations"]) == complete.stat.iterations_mdp
+    assert int(result["unresolved"]) == 0
+    assert float(result["decided_fraction"]) == 1.0
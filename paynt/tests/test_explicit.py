@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+pytest.importorskip("stormpy.synthesis")
+
+from paynt.hypersketch.hypersketch import HyperSketch
+from paynt.hypersynthesizers.hypersynthesizer import HyperSynthesizerAR
+
+# An explicit DRN sketch with the state valuations stored as // comments after the state lines.
+# Run from the paynt directory with python -m pytest tests
+
+hyperpaynt_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+project = os.path.join(hyperpaynt_dir, "eval", "SD", "simple-drn")
+
+
+@pytest.fixture
+def sketch():
+    return HyperSketch(os.path.join(project, "sketch.drn"), os.path.join(project, "sketch.props"))
+
+
+def test_load_explicit_sketch(sketch):
+    # the DRN model is the quotient itself, no PRISM program is involved
+    assert sketch.prism is None
+    quotient_mdp = sketch.quotient.quotient_mdp
+    assert quotient_mdp.nr_states == 4
+    assert quotient_mdp.nr_choices == 6
+    assert list(quotient_mdp.initial_states) == [0, 1]
+
+    # a hole of two options for each of the initial states, named by the valuations in the comments
+    assert sketch.design_space.num_holes == 2
+    assert sketch.design_space.size == 4
+    for hole in sketch.design_space:
+        assert "s=" in hole.name
+        assert len(hole.options) == 2
+
+
+def test_synthesize_explicit_sketch(sketch):
+    # s1 must reach the target with a lower probability than s0: s0 takes a, or both take b
+    assignment = HyperSynthesizerAR(sketch).synthesize(sketch.design_space, False)
+    assert assignment is not None
@@ -0,0 +1,150 @@
+import pytest
+
+pytest.importorskip("z3")
+pytest.importorskip("stormpy.synthesis")
+
+from paynt.sketch.holes import Hole, DesignSpace, ParentInfo, CompressedHint
+from paynt.hypersynthesizers.frontier import Frontier
+
+# Run from the paynt directory with python -m pytest tests
+
+
+class Property:
+    ''' Stand-in for a specification property: hints are keyed by the property objects. '''
+
+    def __init__(self, name):
+        self.name = name
+
+
+properties = [Property("constraint"), Property("optimality")]
+
+
+def design_space():
+    return DesignSpace([Hole(f"h{index}", [0, 1, 2, 3], ["a", "b", "c", "d"]) for index in range(3)])
+
+
+def options(family):
+    return tuple(tuple(hole.options) for hole in family)
+
+
+def split(family):
+    ''' Halve the first non-trivial hole, as the AR loop splits an undecided family. '''
+    for hole_index, hole in enumerate(family):
+        if hole.size > 1:
+            break
+    else:
+        return []
+    parent_info = ParentInfo()
+    parent_info.property_indices = [0]
+    parent_info.refinement_depth = family.refinement_depth
+    parent_info.splitters = [hole_index]
+    parent_info.analysis_hints = {properties[0]: (CompressedHint([2, 0], [0.2, 0.0]), None)}
+    half = hole.size // 2
+    return [DesignSpace(family.subholes([(hole_index, hole.options[:half])]), parent_info),
+            DesignSpace(family.subholes([(hole_index, hole.options[half:])]), parent_info)]
+
+
+class ListFrontier(list):
+    ''' Reference frontier: a plain list explored from its end (DFS) or from its start (BFS). '''
+
+    def __init__(self, families, dfs):
+        super().__init__(families)
+        self.dfs = dfs
+
+    def pop(self):
+        return super().pop(-1 if self.dfs else 0)
+
+
+def explore(families, limit=None, spill_period=None):
+    '''
+    Pop the families in the exploration order, splitting each of them.
+    :param spill_period spill the frontier after this many families regardless of its memory
+    '''
+    explored = []
+    while families and (limit is None or len(explored) < limit):
+        family = families.pop()
+        explored.append(options(family))
+        families.extend(split(family))
+        if spill_period is not None and len(explored) % spill_period == 0 and len(families.resident()) > 1:
+            families.spill()
+    return explored
+
+
+def reference_order(dfs):
+    return explore(ListFrontier([design_space()], dfs))
+
+
+@pytest.fixture
+def budget():
+    ''' A budget small enough to spill whenever more than one family is resident. '''
+    previous = Frontier.memory_budget
+    Frontier.memory_budget = 1e-6
+    yield
+    Frontier.memory_budget = previous
+
+
+def frontier(dfs):
+    space = design_space()
+    families = Frontier(space, dfs, properties)
+    families.append(space)
+    return families
+
+
+@pytest.mark.parametrize("dfs", [True, False], ids=["dfs", "bfs"])
+def test_order_unchanged_by_spilling(dfs, budget):
+    families = frontier(dfs)
+    assert explore(families) == reference_order(dfs)
+    assert families.spills > 0 and families.reloads > 0
+    families.close()
+
+
+@pytest.mark.parametrize("spill_period", [2, 3, 5, 8])
+@pytest.mark.parametrize("dfs", [True, False], ids=["dfs", "bfs"])
+def test_order_unchanged_by_periodic_spilling(dfs, spill_period):
+    # families are added while batches are spilled and after they are all reloaded
+    families = frontier(dfs)
+    assert explore(families, spill_period=spill_period) == reference_order(dfs)
+    assert families.reloads > 0
+    families.close()
+
+
+@pytest.mark.parametrize("dfs", [True, False], ids=["dfs", "bfs"])
+def test_snapshot_restore(dfs, budget):
+    families = frontier(dfs)
+    explored = explore(families, limit=10)
+    assert families.spilled > 0
+    snapshot = families.snapshot()
+    families.close()
+
+    restored = Frontier(design_space(), dfs, properties)
+    restored.restore(snapshot)
+    assert explored + explore(restored) == reference_order(dfs)
+    restored.close()
+
+
+def test_spilled_parent_info(budget):
+    families = frontier(True)
+    families.pop()
+    families.extend(split(design_space()))
+    families.extend(split(design_space()))
+    assert families.spilled > 0
+    while families.head:
+        families.head.pop()
+    family = families.pop()
+    assert families.reloads == 1
+    parent_info = family.parent_info
+    assert parent_info.property_indices == [0]
+    assert parent_info.splitters == [0]
+    hint_prim, hint_seco = parent_info.analysis_hints[properties[0]]
+    assert hint_seco is None
+    assert hint_prim[0] == 0.0 and hint_prim[2] == 0.2
+    families.close()
+
+
+def test_compressed_hint():
+    hint = CompressedHint([7, 3, 5, 0], [0.7, 0.3, 0.5, 0.0])
+    assert len(hint) == 4
+    assert list(hint.states) == [0, 3, 5, 7]
+    assert [hint[state] for state in [7, 3, 5, 0]] == [0.7, 0.3, 0.5, 0.0]
+    with pytest.raises(AssertionError):
+        hint[4]
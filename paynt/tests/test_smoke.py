@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("stormpy.synthesis")
+
+# End-to-end runs of every synthesis method on a small project; all of them must reach the verdict of AR.
+# Run from the paynt directory with python -m pytest tests
+
+hyperpaynt_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+paynt_exe = os.path.join(hyperpaynt_dir, "paynt", "paynt.py")
+project = "eval/SD/simple"
+timeout = 600
+
+
+def synthesize(method, tmp_path, options=()):
+    ''' Run HyperPaynt and return the summary of its metrics. '''
+    metrics_path = tmp_path / f"{method}.jsonl"
+    call = [sys.executable, paynt_exe, "--project", project, "--method", method, "--metrics", str(metrics_path), *options]
+    process = subprocess.run(call, cwd=hyperpaynt_dir, capture_output=True, text=True, timeout=timeout)
+    assert process.returncode == 0, process.stderr[-2000:]
+    with open(metrics_path) as f:
+        records = [json.loads(line) for line in f]
+    summaries = [record for record in records if record.get("event") == "summary"]
+    assert summaries, "the run did not report a summary"
+    return summaries[-1]
+
+
+@pytest.fixture(scope="module")
+def ar_summary(tmp_path_factory):
+    return synthesize("ar", tmp_path_factory.mktemp("ar"))
+
+
+@pytest.mark.parametrize("method", ["cegis", "hybrid"])
+def test_method_agrees_with_ar(method, ar_summary, tmp_path):
+    summary = synthesize(method, tmp_path)
+    assert summary["feasible"] == ar_summary["feasible"]
+    assert summary["iterations_dtmc"] > 0
+
+
+def test_qualitative_cache_keeps_results(ar_summary, tmp_path):
+    # strengthening the reachability formulae by the cached probability-0/1 states must not change any value
+    summary = synthesize("ar", tmp_path, ["--qualitative_cache"])
+    for key in ["feasible", "assignment", "optimum", "iterations_mdp", "explored"]:
+        assert summary.get(key) == ar_summary.get(key)
@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from runs import hyperpaynt_dir, paynt_exe, limit_resources, read_metrics
+
+# fast projects whose synthesis is tracked for performance regressions
+projects = [
+    "eval/SD/simple",
+    "eval/HyperProb/TA/sketch_1",
+    "eval/HyperProb/TA/sketch_1_neg",
+    "eval/Heisenbugs",
+    "eval/Heisenbugs/3processes",
+]
+
+baselines_path = os.path.join(hyperpaynt_dir, "perf_baselines.json")
+
+# metrics compared against the baselines: relative tolerance and absolute slack (measurement noise of fast runs)
+tolerances = {
+    "synthesis_time": (0.2, 0.5),
+    "peak_rss_mb": (0.2, 20),
+    "iterations_mdp": (0, 0),
+    "iterations_dtmc": (0, 0),
+}
+
+
+def measure(project, method, timeout):
+    '''
+    Run HyperPaynt on a project in a child process.
+    :return dictionary of the measured metrics, or None if the run did not finish
+    '''
+    metrics_path = os.path.join(hyperpaynt_dir, "perf_runs", project.replace(os.sep, "_") + ".jsonl")
+    os.makedirs(os.path.dirname(metrics_path), exist_ok=True)
+    if os.path.exists(metrics_path):
+        os.remove(metrics_path)
+
+    call = [sys.executable, paynt_exe, "--project", project, "--method", method, "--metrics", metrics_path]
+    process = subprocess.Popen(call, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=hyperpaynt_dir,
+                               preexec_fn=limit_resources(timeout, None))
+    # wait4 reports the resource usage of this child only; the CPU limit does not stop a run blocked on I/O,
+    # hence the run is also killed at a wall-clock deadline
+    deadline = time.monotonic() + timeout
+    while True:
+        pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+        if pid != 0:
+            break
+        if time.monotonic() > deadline:
+            process.kill()
+            _, status, _ = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            return None
+        time.sleep(0.1)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        return None
+
+    runs = read_metrics(metrics_path)
+    if not runs or "summary" not in runs[-1]:
+        return None
+    summary = runs[-1]["summary"]
+    return {
+        "synthesis_time": summary["synthesis_time"],
+        "iterations_mdp": summary["iterations_mdp"],
+        "iterations_dtmc": summary["iterations_dtmc"],
+        "feasible": summary["feasible"],
+        "quotient_states": summary.get("quotient_states"),
+        "holes": summary.get("holes"),
+        "family_size": summary.get("family_size"),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": usage.ru_maxrss / 1024,
+    }
+
+
+def median_measurement(project, method, timeout, repetitions):
+    ''' Repeat the run and take the median of every numeric metric to reduce timing noise. '''
+    measurements = []
+    for _ in range(repetitions):
+        measurement = measure(project, method, timeout)
+        if measurement is None:
+            return None
+        measurements.append(measurement)
+    result = dict(measurements[0])
+    for metric in tolerances:
+        values = sorted(measurement[metric] for measurement in measurements)
+        result[metric] = values[len(values) // 2]
+    return result
+
+
+def regressions(measurement, baseline):
+    ''' Metrics that exceed their baseline by more than the tolerance. '''
+    found = []
+    if measurement["feasible"] != baseline["feasible"]:
+        found.append(f"feasible: {measurement['feasible']} (baseline {baseline['feasible']})")
+    for metric, (relative, absolute) in tolerances.items():
+        value, reference = measurement[metric], baseline[metric]
+        if value > reference * (1 + relative) + absolute:
+            found.append(f"{metric}: {round(value, 3)} (baseline {round(reference, 3)})")
+    return found
+
+
+def main():
+    argp = argparse.ArgumentParser(description="check the synthesis performance against the stored baselines")
+    argp.add_argument("--method", default="ar", help="synthesis method")
+    argp.add_argument("--timeout", type=int, default=600, help="time limit of every run in seconds")
+    argp.add_argument("--repetitions", type=int, default=3, help="runs per project, the median is compared")
+    argp.add_argument("--update", action="store_true", help="store the measurements as the new baselines")
+    args = argp.parse_args()
+
+    baselines = {}
+    if os.path.exists(baselines_path):
+        with open(baselines_path) as f:
+            baselines = json.load(f)
+    method_baselines = baselines.setdefault(args.method, {})
+
+    failed = False
+    for project in projects:
+        start = time.time()
+        measurement = median_measurement(project, args.method, args.timeout, args.repetitions)
+        if measurement is None:
+            print(f"> {project}: run failed or timed out")
+            failed = True
+            continue
+        print(f"> {project}: {measurement} ({round(time.time() - start, 1)} s)")
+        if args.update:
+            method_baselines[project] = measurement
+            continue
+        baseline = method_baselines.get(project)
+        if baseline is None:
+            # an unchecked project must not pass silently
+            print(f"  FAILED no baseline, record one on the reference machine with --update")
+            failed = True
+            continue
+        found = regressions(measurement, baseline)
+        for regression in found:
+            print(f"  REGRESSION {regression}")
+        failed = failed or len(found) > 0
+
+    if args.update:
+        with open(baselines_path, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baselines stored in {baselines_path}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+import argparse
+import collections
+import csv
+import heapq
+import itertools
+import json
+import math
+
+# Replay of a search trace recorded by paynt --record_trace. The recorded model checking results of the families
+# serve as an oracle, so alternative frontier orders and split policies are evaluated without any model checking.
+# A family that was not analyzed in the recorded run is resolved from the deepest recorded family containing it:
+# infeasibility and feasibility of the constraints are inherited by subfamilies and the optimality bound of the
+# container bounds the subfamily. Families that cannot be resolved this way would need model checking; they are
+# counted as unresolved and not explored further, unless --assume_undecided is given: then they are assumed to be
+# undecided (the worst case) and split by the scores of the container. Replaying the recorded order and splits
+# reproduces the run. Outcomes of CEGIS in hybrid traces are replayed as recorded.
+
+orders = ["dfs", "bfs", "largest", "smallest"]
+policies = ["recorded", "score", "halves", "widest"]
+
+
+def popcount(mask):
+    return bin(mask).count("1")
+
+
+def options(mask):
+    return [option for option in range(mask.bit_length()) if mask >> option & 1]
+
+
+def family_size(masks):
+    return math.prod(popcount(mask) for mask in masks)
+
+
+def contains(outer, inner):
+    return all(inner_mask & ~outer_mask == 0 for outer_mask, inner_mask in zip(outer, inner))
+
+
+class Trace:
+    ''' Analyzed families of a recorded run indexed by their hole masks. '''
+
+    def __init__(self, path):
+        self.header = None
+        by_index = {}
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                event = record.pop("event")
+                if event == "header":
+                    self.header = record
+                elif event == "analysis":
+                    by_index[record["family"]] = record
+                else:
+                    # split and cegis events belong to the family analyzed last
+                    by_index[record["family"]][event] = record
+        if self.header is None:
+            raise ValueError(f"{path} is not a search trace")
+
+        self.records = list(by_index.values())
+        self.oracle = {tuple(record["masks"]): record for record in self.records}
+        children = {tuple(masks) for record in self.records if "split" in record for masks in record["split"]["subfamilies"]}
+        self.roots = [record for record in self.records if tuple(record["masks"]) not in children]
+
+        self.optimality = None
+        for prop in self.header["properties"]:
+            if prop["optimality"]:
+                self.optimality = prop
+
+    def container(self, masks):
+        ''' Deepest recorded family containing the given one, following the recorded splits from the roots. '''
+        found = None
+        candidates = self.roots
+        while candidates:
+            current = [record for record in candidates if contains(record["masks"], masks)]
+            if not current:
+                break
+            found = current[0]
+            candidates = [self.oracle[tuple(child)] for child in found.get("split", {}).get("subfamilies", [])
+                          if tuple(child) in self.oracle]
+        return found
+
+
+class Replay:
+    ''' Exploration of the recorded search with a frontier order and a split policy. '''
+
+    def __init__(self, trace, order, policy, assume_undecided):
+        self.trace = trace
+        self.order = order
+        self.policy = policy
+        self.assume_undecided = assume_undecided
+
+        self.optimum = None
+        self.assignment = None
+        self.first_sat = None
+
+        self.iterations = 0
+        self.inferred = 0
+        self.assumed = 0
+        self.unresolved = 0
+        self.unresolved_size = 0
+        self.decided_size = 0
+
+    def improves(self, value, optimum):
+        prop = self.trace.optimality
+        if value is None:
+            return False
+        if optimum is None:
+            return True
+        if abs(value - optimum) <= prop["precision"]:
+            return False
+        return value < optimum if prop["minimizing"] else value > optimum
+
+    def infer(self, masks):
+        ''' Outcome of an unrecorded family derived from the deepest recorded family containing it. '''
+        container = self.trace.container(masks)
+        if container is None:
+            return None
+        feasibility = container["feasibility"]
+        record = {"masks": masks, "feasibility": feasibility, "optimality": None, "optimum": None,
+                  "can_improve": True, "improving_value": None, "assignment": None}
+        if container["optimality"] is not None:
+            # every member of the family is bounded by the optimality value of the container
+            record["optimality"] = {"primary": container["optimality"]["primary"]}
+        elif feasibility is True:
+            # every member satisfies the constraints, pick any
+            record["can_improve"] = False
+            record["assignment"] = [1 << options(mask)[0] for mask in masks]
+        if self.assume_undecided and "split" in container:
+            record["split"] = container["split"]
+        return record
+
+    def outcome(self, record):
+        '''
+        :return (1) whether the family is decided, None if its outcome needs model checking
+        :return (2) whether a satisfying assignment was found
+        '''
+        if record["feasibility"] is False:
+            return True, False
+
+        improved = False
+        optimality = record["optimality"]
+        if optimality is not None:
+            if not self.improves(optimality["primary"], self.optimum):
+                # the bound of the family does not improve the optimum
+                return True, False
+            improving_value = record["improving_value"]
+            if improving_value is not None and self.improves(improving_value, self.optimum):
+                self.optimum = improving_value
+                self.assignment = record["assignment"]
+                improved = True
+            elif not record["can_improve"] and record["optimum"] != self.optimum:
+                # the family was decided against another optimum
+                return None, False
+        elif record["assignment"] is not None:
+            self.assignment = record["assignment"]
+            improved = True
+
+        if not record["can_improve"]:
+            return True, improved
+        cegis = record.get("cegis")
+        if cegis is not None:
+            improved = improved or cegis["sat"]
+            if cegis["decided"]:
+                return True, improved
+        return False, improved
+
+    def splitter_scores(self, split):
+        ''' Scores of the holes combined as in the recorded run, and their option rankings. '''
+        scores = {}
+        rankings = {}
+        for direction in ["primary", "secondary"]:
+            for hole, score, ranking in split["scores"].get(direction, []):
+                scores[hole] = score if hole not in scores else (scores[hole] + score) / 2
+                rankings.setdefault(hole, ranking)
+        return scores, rankings
+
+    def ranked_options(self, split, hole, mask):
+        ''' Options of the hole from the most to the least preferred one. '''
+        _, rankings = self.splitter_scores(split)
+        minimizing = self.trace.header["properties"][split["property"]]["minimizing"]
+        ranking = [option for option in rankings.get(hole) or [] if mask >> option & 1]
+        if minimizing:
+            ranking.reverse()
+        return ranking + [option for option in options(mask) if option not in ranking]
+
+    @staticmethod
+    def restrict(subfamilies, masks):
+        '''
+        Subfamilies of a container intersected with a family contained in it, None if they do not split the family.
+        '''
+        restricted = []
+        for subfamily in subfamilies:
+            intersection = [subfamily_mask & mask for subfamily_mask, mask in zip(subfamily, masks)]
+            if intersection == masks:
+                return None
+            if all(intersection):
+                restricted.append(intersection)
+        return restricted
+
+    def subfamilies(self, record):
+        ''' Subfamilies of an undecided family according to the split policy, None if they are not known. '''
+        split = record.get("split")
+        if split is None:
+            return None
+        masks = record["masks"]
+        if self.policy == "recorded":
+            return Replay.restrict(split["subfamilies"], masks)
+
+        scores, _ = self.splitter_scores(split)
+        splittable = [hole for hole in scores if popcount(masks[hole]) > 1]
+        if not splittable:
+            return Replay.restrict(split["subfamilies"], masks)
+        if self.policy == "widest":
+            splitter = max(splittable, key=lambda hole: (popcount(masks[hole]), scores[hole]))
+        else:
+            splitter = max(splittable, key=lambda hole: scores[hole])
+
+        ranking = self.ranked_options(split, splitter, masks[splitter])
+        if self.policy == "score":
+            # the best option against the rest
+            parts = [ranking[1:], ranking[:1]]
+        else:
+            half = len(ranking) // 2
+            parts = [ranking[half:], ranking[:half]]
+        # the preferred part is explored first by DFS
+        subfamilies = []
+        for part in parts:
+            subfamily = list(masks)
+            subfamily[splitter] = sum(1 << option for option in part)
+            subfamilies.append(subfamily)
+        return subfamilies
+
+    def run(self):
+        root = self.trace.header["root"]
+        root_size = family_size(root)
+        stop_at_sat = not self.trace.header["explore_all"] and self.trace.optimality is None
+
+        # DFS and BFS use a double-ended queue, the size orders a heap with ties broken by insertion
+        frontier = collections.deque() if self.order in ["dfs", "bfs"] else []
+        counter = itertools.count()
+
+        def push(masks):
+            if self.order in ["dfs", "bfs"]:
+                frontier.append(masks)
+            else:
+                size = family_size(masks)
+                heapq.heappush(frontier, (-size if self.order == "largest" else size, next(counter), masks))
+
+        def pop():
+            if self.order == "dfs":
+                return frontier.pop()
+            if self.order == "bfs":
+                return frontier.popleft()
+            return heapq.heappop(frontier)[2]
+
+        push(root)
+        while frontier:
+            masks = pop()
+            record = self.trace.oracle.get(tuple(masks))
+            inferred = record is None
+            if inferred:
+                record = self.infer(masks)
+            decided, sat = (None, False) if record is None else self.outcome(record)
+            subfamilies = None
+            if decided is False:
+                subfamilies = self.subfamilies(record)
+            if decided is None or (decided is False and subfamilies is None):
+                self.unresolved += 1
+                self.unresolved_size += family_size(masks)
+                continue
+
+            self.iterations += 1
+            if inferred:
+                if decided:
+                    self.inferred += 1
+                else:
+                    self.assumed += 1
+            if sat and self.first_sat is None:
+                self.first_sat = self.iterations
+                if stop_at_sat:
+                    break
+            if decided:
+                self.decided_size += family_size(masks)
+                continue
+            for subfamily in subfamilies:
+                push(subfamily)
+
+        return {
+            "order": self.order,
+            "policy": self.policy,
+            "iterations": self.iterations,
+            "inferred": self.inferred,
+            "assumed": self.assumed,
+            "unresolved": self.unresolved,
+            "unresolved_fraction": round(self.unresolved_size / root_size, 4),
+            "decided_fraction": round(self.decided_size / root_size, 4),
+            "first_sat": self.first_sat,
+            "optimum": self.optimum,
+        }
+
+
+def main():
+    argp = argparse.ArgumentParser(description="replay a recorded AR search with other frontier orders and split policies")
+    argp.add_argument("trace", help="search trace recorded by paynt --record_trace")
+    argp.add_argument("--orders", nargs="+", choices=orders, default=orders, help="frontier orders")
+    argp.add_argument("--policies", nargs="+", choices=policies, default=policies,
+                      help="split policies: the recorded splits, the best-scored option against the rest, "
+                           "the best-scored hole split in halves, the widest scored hole split in halves")
+    argp.add_argument("--assume_undecided", action="store_true",
+                      help="explore the families whose outcome needs model checking as undecided ones")
+    argp.add_argument("--csv", default=None, help="also write the results to this CSV file")
+    args = argp.parse_args()
+
+    trace = Trace(args.trace)
+    recorded_sat = [record["family"] for record in trace.records if record["assignment"] is not None]
+    print(f"> recorded {trace.header['method']} run ({'DFS' if trace.header['dfs'] else 'BFS'}): "
+          f"{len(trace.records)} families, first SAT at {recorded_sat[0] if recorded_sat else None}")
+
+    results = []
+    for order in args.orders:
+        for policy in args.policies:
+            result = Replay(trace, order, policy, args.assume_undecided).run()
+            results.append(result)
+            print(f"  {order:<8} {policy:<8}: {result['iterations']:>7} iterations "
+                  f"({result['inferred']} inferred, {result['assumed']} assumed undecided), "
+                  f"{result['unresolved']} unresolved ({result['unresolved_fraction'] * 100:.2f} % of the design space), "
+                  f"first SAT at {result['first_sat']}, optimum {result['optimum']}")
+
+    if args.csv is not None:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+
+
+if __name__ == "__main__":
+    main()
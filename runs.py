@@ -0,0 +1,43 @@
+import json
+import os
+import resource
+
+# Helpers shared by the benchmark scripts (bench.py, perf.py, scaling.py) that must not depend on tabulate.
+
+hyperpaynt_dir = os.path.dirname(os.path.abspath(__file__))
+paynt_exe = os.path.join(hyperpaynt_dir, "paynt", "paynt.py")
+
+
+def limit_resources(cpu_limit, memory_limit):
+    ''' Limits of a benchmark process, set in the child before executing HyperPaynt. '''
+    def set_limits():
+        if cpu_limit is not None:
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit))
+        if memory_limit is not None:
+            limit = memory_limit * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    return set_limits
+
+
+def read_metrics(path):
+    '''
+    Read the JSON lines written by HyperPaynt --metrics: a run starts with its config event; runs without a
+    summary (time outs) keep the quotient and the last progress event.
+    '''
+    runs = []
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # the last line of a killed run may be truncated
+                continue
+            event = record["event"]
+            if event == "config":
+                runs.append({"config": record})
+            elif runs:
+                runs[-1][event] = record
+    return runs
@@ -0,0 +1,299 @@
+import argparse
+import csv
+import os
+import random
+
+from perf import measure
+
+# Generator of parametrized grid sketches following the hand-written models in eval/:
+#  - "sd": the comb maze of eval/SD/simple (vertical corridors joined at the top, a target at the bottom of the
+#    middle corridor, traps in the outer corridors), where the runs from different initial states must reach the
+#    target with decreasing probabilities;
+#  - "probni": the treasure grid of eval/ProbNI (random walls, treasures collected for a discounted reward), where
+#    the expected rewards from the initial states must be equal and all choices except the ones in cells with four
+#    exits must be the same for the two schedulers.
+
+directions = ["up", "right", "down", "left"]
+moves = {"up": (0, 1), "right": (1, 0), "down": (0, -1), "left": (-1, 0)}
+
+
+def cells_formula(cells):
+    if not cells:
+        return "false"
+    return "|".join(f"(x={x}&y={y})" for x, y in sorted(cells, key=lambda cell: (cell[1], cell[0])))
+
+
+def grid_picture(width, height, free, marks):
+    lines = []
+    for y in reversed(range(height)):
+        row = "".join(marks.get((x, y), "." if (x, y) in free else " ") for x in range(width))
+        lines.append(f"// {y:2} | {row}")
+    lines.append("//    " + "-" * (width + 2))
+    return "\n".join(lines)
+
+
+def scheduler_names(num_schedulers):
+    return ["sched"] + [f"sched{i}" for i in range(1, num_schedulers)]
+
+
+def state_quantifiers(quantifier, num_initial, num_schedulers):
+    schedulers = scheduler_names(num_schedulers)
+    sched_line = " ".join(f"ES {sched}" for sched in schedulers)
+    state_line = " ".join(f"{quantifier} s{i}({schedulers[i % num_schedulers]})" for i in range(num_initial))
+    restrict_line = " ".join(f"Restrict s{i} start{i}" for i in range(num_initial))
+    return sched_line, state_line, restrict_line
+
+
+def initial_state_labels(initial):
+    return "\n".join(f'label "start{i}" = (x={x}&y={y});' for i, (x, y) in enumerate(initial))
+
+
+def generate_sd(width, height, num_initial, num_schedulers):
+    ''' Comb maze of eval/SD/simple with width/2+1 corridors of the given height. '''
+    assert width >= 3 and width % 2 == 1 and height >= 3
+    # the constraints compare the runs from consecutive initial states, a single one leaves no constraint
+    assert num_initial >= 2, "the sd family needs at least two initial states"
+    corridors = list(range(0, width, 2))
+    top = height - 1
+    free = {(x, top) for x in range(width)} | {(x, y) for x in corridors for y in range(height)}
+    target = (corridors[len(corridors) // 2], 0)
+    traps = [(corridors[0], top - 1), (corridors[-1], top - 1)]
+    # initial states: top of the corridors and then the cells below, avoiding the target and the traps
+    candidates = [(x, y) for y in reversed(range(height)) for x in corridors if (x, y) != target and (x, y) not in traps]
+    assert num_initial <= len(candidates), "too many initial states for this grid"
+    initial = candidates[:num_initial]
+
+    exits = {direction: [] for direction in directions}
+    for (x, y) in free:
+        for direction, (dx, dy) in moves.items():
+            if (x + dx, y + dy) in free:
+                exits[direction].append((x, y))
+    marks = {target: "t", **{trap: "b" for trap in traps}, **{cell: "i" for cell in initial}}
+
+    sketch = f"""mdp
+
+{grid_picture(width, height, free, marks)}
+
+// walls in the maze
+formula u = {cells_formula(exits["up"])};
+formula r = {cells_formula(exits["right"])};
+formula d = {cells_formula(exits["down"])};
+formula l = {cells_formula(exits["left"])};
+
+// updates of coordinates (if possible)
+formula yu = u ? (y+1) : y;
+formula xr = r ? (x+1) : x;
+formula yd = d ? (y-1) : y;
+formula xl = l ? (x-1) : x;
+
+// trap states
+formula bad = {cells_formula(traps)};
+
+// specification of the maze
+// for every choice, there is still some small probability to not actually going where desired
+module maze
+    x : [0..{width - 1}];
+    y : [0..{top}];
+    // moving around the maze (all combinations)
+    [up]       !bad  -> 0.8: (y'=yu) + 0.08: (x'=xr) + 0.08: (x'=xl) + 0.04: (y'=yd);
+    [right]    !bad  -> 0.8: (x'=xr) + 0.08: (y'=yu) + 0.08: (y'=yd) + 0.04: (x'=xl);
+    [down]     !bad  -> 0.8: (y'=yd) + 0.08: (x'=xr) + 0.08: (x'=xl) + 0.04: (y'=yu);
+    [left]     !bad  -> 0.8: (x'=xl) + 0.08: (y'=yu) + 0.08: (y'=yd) + 0.04: (x'=xr);
+endmodule
+
+// initial states
+init ({" | ".join(f"x={x}&y={y}" for x, y in initial)}) endinit
+
+// goal of the robot
+label "target" = (x={target[0]}&y={target[1]});
+{initial_state_labels(initial)}
+"""
+    sched_line, state_line, restrict_line = state_quantifiers("E", num_initial, num_schedulers)
+    properties = [f'P{{s{i + 1}}}[F "target"] < P{{s{i}}}[F "target"]' for i in range(num_initial - 1)]
+    props = "\n".join([sched_line, state_line, restrict_line] + properties)
+    return sketch, props
+
+
+def random_grid(width, height, density, rng):
+    ''' Random set of free cells that is connected (grown from the cell (0,0)). '''
+    target = max(2, int(width * height * density))
+    free = {(0, 0)}
+    frontier = [(0, 0)]
+    while frontier and len(free) < target:
+        x, y = frontier[rng.randrange(len(frontier))]
+        dx, dy = moves[rng.choice(directions)]
+        cell = (x + dx, y + dy)
+        if 0 <= cell[0] < width and 0 <= cell[1] < height and cell not in free:
+            free.add(cell)
+            frontier.append(cell)
+    return free
+
+
+def generate_probni(width, height, num_initial, num_schedulers, num_treasures, seed):
+    ''' Treasure grid of eval/ProbNI with random walls. '''
+    rng = random.Random(seed)
+    free = random_grid(width, height, 0.6, rng)
+    cells = sorted(free)
+    rng.shuffle(cells)
+    assert num_initial + num_treasures <= len(cells), "too many initial states and treasures for this grid"
+    initial = cells[:num_initial]
+    treasures = cells[num_initial:num_initial + num_treasures]
+
+    exits = {direction: [] for direction in directions}
+    for (x, y) in free:
+        for direction, (dx, dy) in moves.items():
+            if (x + dx, y + dy) in free:
+                exits[direction].append((x, y))
+    marks = {**{cell: "t" for cell in treasures}, **{cell: "i" for cell in initial}}
+
+    treasure_formulae = "\n".join(f"formula t{i} = (x={x}&y={y});" for i, (x, y) in enumerate(treasures))
+    current_treasure = "(last_treasure)"
+    for i in reversed(range(num_treasures)):
+        current_treasure = f"(t{i} ? {i} : {current_treasure})"
+    updates = "\n".join(f"        [{a}] true -> (last_treasure'=current_treasure);" for a in ["up", "ri", "do", "le"])
+    discounting = "\n".join(f"        [{a}] true -> discount_factor : true + 1-discount_factor : (sink'=true);"
+                            for a in ["up", "ri", "do", "le"])
+
+    sketch = f"""mdp
+
+{grid_picture(width, height, free, marks)}
+
+formula up = {cells_formula(exits["up"])};
+
+formula right = {cells_formula(exits["right"])};
+
+formula down = {cells_formula(exits["down"])};
+
+formula left = {cells_formula(exits["left"])};
+
+formula yu = up ? (y+1) : y;
+formula xr = right ? (x+1) : x;
+formula yd = down ? (y-1) : y;
+formula xl = left ? (x-1) : x;
+
+
+module maze
+         x : [0..{width - 1}];
+         y : [0..{height - 1}];
+        [up] !goal & up   -> 0.9: (y'=yu) + 0.1: (x'=xr);
+        [ri] !goal & right   -> 0.9: (x'=xr) + 0.1: (y'=yd);
+        [do] !goal & down   -> 0.9: (y'=yd) + 0.1: (x'=xl);
+        [le] !goal & left   -> 0.9: (x'=xl) + 0.1: (y'=yu);
+endmodule
+
+{treasure_formulae}
+formula treasure = {" | ".join(f"t{i}" for i in range(num_treasures))};
+formula current_treasure = {current_treasure};
+
+module treasures
+        last_treasure : [-1..{num_treasures - 1}];
+{updates}
+endmodule
+
+rewards "rew"
+        current_treasure!=last_treasure : 100;
+endrewards
+
+
+formula goal = sink;
+
+const double discount_factor = 0.90;
+module discounting
+        sink : bool;
+{discounting}
+endmodule
+
+init (({" | ".join(f"(x={x} & y={y})" for x, y in initial)}) & !sink & last_treasure=-1) endinit
+
+{initial_state_labels(initial)}
+"""
+    schedulers = scheduler_names(num_schedulers)
+    sched_line, state_line, restrict_line = state_quantifiers("A", num_initial, num_schedulers)
+    lines = [sched_line, state_line, restrict_line]
+    lines.append(f"X[goal]({','.join(schedulers)})")
+    # free choices in cells with four exits, the same choices of all schedulers elsewhere
+    for mask in range(2 ** 5):
+        literals = [("" if mask & (1 << bit) == 0 else "!") + name
+                    for bit, name in enumerate(["up", "right", "down", "left", "treasure"])]
+        condition = "!goal & " + "  & ".join(literals)
+        if mask & 0b1111 == 0:
+            lines += [f"X[{condition}]({sched})" for sched in schedulers]
+        else:
+            lines.append(f"X[{condition}]({','.join(schedulers)})")
+    for i in range(num_initial):
+        lines.append(f'R{{s{i}}}{{"rew"}}>0 [F goal]')
+    for i in range(num_initial - 1):
+        lines.append(f'R{{s{i + 1}}}{{"rew"}}[F goal] <= R{{s{i}}}{{"rew"}}[F goal]')
+        lines.append(f'R{{s{i}}}{{"rew"}}[F goal] <= R{{s{i + 1}}}{{"rew"}}[F goal]')
+    return sketch, "\n".join(lines)
+
+
+def generate(family, width, height, num_initial, num_schedulers, num_treasures, seed):
+    if family == "sd":
+        return generate_sd(width, height, num_initial, num_schedulers)
+    return generate_probni(width, height, num_initial, num_schedulers, num_treasures, seed)
+
+
+def write_project(path, sketch, props):
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "sketch.templ"), "w") as f:
+        f.write(sketch)
+    with open(os.path.join(path, "sketch.props"), "w") as f:
+        f.write(props)
+
+
+def project_name(family, width, height, num_initial, num_schedulers):
+    return f"{family}-{width}x{height}-i{num_initial}-s{num_schedulers}"
+
+
+def main():
+    argp = argparse.ArgumentParser(description="generate grid sketches of increasing size and report how synthesis scales")
+    argp.add_argument("family", choices=["sd", "probni"], help="model family")
+    argp.add_argument("--sizes", nargs="+", default=["5x4", "9x6", "13x8"], help="grid sizes WIDTHxHEIGHT")
+    argp.add_argument("--initial", type=int, nargs="+", default=[2], help="numbers of initial states")
+    argp.add_argument("--schedulers", type=int, nargs="+", default=[1], help="numbers of scheduler quantifiers")
+    argp.add_argument("--treasures", type=int, default=3, help="number of treasures (probni)")
+    argp.add_argument("--seed", type=int, default=0, help="seed of the random walls (probni)")
+    argp.add_argument("--output", default="eval/generated", help="directory of the generated projects")
+    argp.add_argument("--run", action="store_true", help="synthesize every project and write the scaling report")
+    argp.add_argument("--methods", nargs="+", default=["ar"], help="synthesis methods compared in the report")
+    argp.add_argument("--timeout", type=int, default=3600, help="time limit of every run in seconds")
+    args = argp.parse_args()
+
+    projects = []
+    for size in args.sizes:
+        width, height = [int(n) for n in size.split("x")]
+        for num_initial in args.initial:
+            for num_schedulers in args.schedulers:
+                name = project_name(args.family, width, height, num_initial, num_schedulers)
+                path = os.path.join(args.output, name)
+                sketch, props = generate(args.family, width, height, num_initial, num_schedulers, args.treasures, args.seed)
+                write_project(path, sketch, props)
+                projects.append((name, path))
+                print(f"> generated {path}")
+
+    if not args.run:
+        return
+
+    report_path = os.path.join(args.output, f"scaling-{args.family}.csv")
+    fields = ["project", "method", "quotient_states", "holes", "family_size", "synthesis_time", "iterations_mdp",
+              "iterations_dtmc", "peak_rss_mb", "feasible"]
+    with open(report_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for name, path in projects:
+            for method in args.methods:
+                measurement = measure(path, method, args.timeout)
+                row = {"project": name, "method": method}
+                if measurement is None:
+                    row["synthesis_time"] = "Time Out"
+                else:
+                    row.update({field: measurement.get(field) for field in fields if field in measurement})
+                writer.writerow(row)
+                f.flush()
+                print(f"> {name} ({method}): {row}")
+    print(f"scaling report written to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
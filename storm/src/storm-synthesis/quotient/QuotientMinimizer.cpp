@@ -0,0 +1,193 @@
+#include "storm-synthesis/quotient/QuotientMinimizer.h"
+
+#include "storm/exceptions/InvalidArgumentException.h"
+#include "storm/exceptions/NotSupportedException.h"
+#include "storm/storage/sparse/ModelComponents.h"
+#include "storm/storage/SparseMatrix.h"
+#include "storm/models/sparse/StandardRewardModel.h"
+#include "storm/utility/constants.h"
+
+namespace storm {
+    namespace synthesis {
+
+            template<typename ValueType>
+            QuotientMinimizer<ValueType>::QuotientMinimizer(
+                storm::models::sparse::Mdp<ValueType> const& quotient, storm::storage::BitVector const& fixed_states
+            ) : quotient(quotient), fixed_states(fixed_states) {
+                auto const& row_groups = quotient.getTransitionMatrix().getRowGroupIndices();
+                for(uint64_t state = 0; state < quotient.getNumberOfStates(); state++) {
+                    STORM_LOG_THROW(
+                        fixed_states[state] || row_groups[state+1] - row_groups[state] == 1,
+                        storm::exceptions::InvalidArgumentException, "States with nondeterministic choices must be fixed."
+                    );
+                }
+                for(auto const& reward_model : quotient.getRewardModels()) {
+                    STORM_LOG_THROW(
+                        !reward_model.second.hasTransitionRewards(), storm::exceptions::NotSupportedException,
+                        "Transition rewards are not supported."
+                    );
+                }
+
+                this->computeInitialPartition();
+                while(this->refinePartition()) {}
+
+                this->block_representative.resize(this->num_blocks, this->quotient.getNumberOfStates());
+                for(uint64_t state = this->quotient.getNumberOfStates(); state > 0; state--) {
+                    this->block_representative[this->state_to_block[state-1]] = state-1;
+                }
+            }
+
+            template<typename ValueType>
+            void QuotientMinimizer<ValueType>::computeInitialPartition() {
+                // non-fixed states are grouped by their labels and by the rewards of their only choice
+                auto const& labeling = this->quotient.getStateLabeling();
+                std::vector<storm::storage::BitVector> label_states;
+                for(auto const& label : labeling.getLabels()) {
+                    label_states.push_back(labeling.getStates(label));
+                }
+                auto const& row_groups = this->quotient.getTransitionMatrix().getRowGroupIndices();
+
+                std::map<std::vector<ValueType>,uint64_t> key_to_block;
+                this->state_to_block.resize(this->quotient.getNumberOfStates());
+                this->num_blocks = 0;
+                for(uint64_t state = 0; state < this->quotient.getNumberOfStates(); state++) {
+                    if(this->fixed_states[state]) {
+                        this->state_to_block[state] = this->num_blocks++;
+                        continue;
+                    }
+                    std::vector<ValueType> key;
+                    for(auto const& states : label_states) {
+                        key.push_back(states[state] ? storm::utility::one<ValueType>() : storm::utility::zero<ValueType>());
+                    }
+                    for(auto const& reward_model : this->quotient.getRewardModels()) {
+                        auto const& rewards = reward_model.second;
+                        key.push_back(rewards.hasStateRewards() ? rewards.getStateReward(state) : storm::utility::zero<ValueType>());
+                        key.push_back(rewards.hasStateActionRewards() ? rewards.getStateActionReward(row_groups[state]) : storm::utility::zero<ValueType>());
+                    }
+                    auto result = key_to_block.emplace(key, this->num_blocks);
+                    if(result.second) {
+                        this->num_blocks++;
+                    }
+                    this->state_to_block[state] = result.first->second;
+                }
+            }
+
+            template<typename ValueType>
+            std::map<uint64_t,ValueType> QuotientMinimizer<ValueType>::lumpedDistribution(uint64_t choice) {
+                std::map<uint64_t,ValueType> distribution;
+                for(auto const& entry : this->quotient.getTransitionMatrix().getRow(choice)) {
+                    distribution[this->state_to_block[entry.getColumn()]] += entry.getValue();
+                }
+                return distribution;
+            }
+
+            template<typename ValueType>
+            bool QuotientMinimizer<ValueType>::refinePartition() {
+                // split each block according to the lumped distributions of its states; since each new block is
+                // contained in an old one, the partition is stable once the number of blocks does not grow
+                auto const& row_groups = this->quotient.getTransitionMatrix().getRowGroupIndices();
+                std::map<std::pair<uint64_t,std::vector<std::pair<uint64_t,ValueType>>>,uint64_t> signature_to_block;
+                std::vector<uint64_t> state_to_block(this->quotient.getNumberOfStates());
+                for(uint64_t state = 0; state < this->quotient.getNumberOfStates(); state++) {
+                    std::vector<std::pair<uint64_t,ValueType>> distribution;
+                    if(!this->fixed_states[state]) {
+                        auto lumped = this->lumpedDistribution(row_groups[state]);
+                        distribution.assign(lumped.begin(), lumped.end());
+                    }
+                    auto signature = std::make_pair(this->state_to_block[state], std::move(distribution));
+                    auto result = signature_to_block.emplace(std::move(signature), signature_to_block.size());
+                    state_to_block[state] = result.first->second;
+                }
+                bool refined = signature_to_block.size() > this->num_blocks;
+                this->state_to_block = std::move(state_to_block);
+                this->num_blocks = signature_to_block.size();
+                return refined;
+            }
+
+            template<typename ValueType>
+            storm::storage::SparseMatrix<ValueType> QuotientMinimizer<ValueType>::constructTransitionMatrix() {
+                auto const& row_groups = this->quotient.getTransitionMatrix().getRowGroupIndices();
+                storm::storage::SparseMatrixBuilder<ValueType> builder(0, this->num_blocks, 0, false, true, this->num_blocks);
+                this->choice_map.clear();
+                for(uint64_t block = 0; block < this->num_blocks; block++) {
+                    builder.newRowGroup(this->choice_map.size());
+                    auto state = this->block_representative[block];
+                    for(uint64_t choice = row_groups[state]; choice < row_groups[state+1]; choice++) {
+                        for(auto const& entry : this->lumpedDistribution(choice)) {
+                            builder.addNextValue(this->choice_map.size(), entry.first, entry.second);
+                        }
+                        this->choice_map.push_back(choice);
+                    }
+                }
+                return builder.build();
+            }
+
+            template<typename ValueType>
+            storm::models::sparse::StateLabeling QuotientMinimizer<ValueType>::constructStateLabeling() {
+                // states of a block agree on all labels
+                auto const& quotient_labeling = this->quotient.getStateLabeling();
+                storm::models::sparse::StateLabeling labeling(this->num_blocks);
+                for(auto const& label : quotient_labeling.getLabels()) {
+                    storm::storage::BitVector states(this->num_blocks, false);
+                    for(auto state : quotient_labeling.getStates(label)) {
+                        states.set(this->state_to_block[state]);
+                    }
+                    labeling.addLabel(label, std::move(states));
+                }
+                return labeling;
+            }
+
+            template<typename ValueType>
+            storm::models::sparse::ChoiceLabeling QuotientMinimizer<ValueType>::constructChoiceLabeling() {
+                auto const& quotient_labeling = this->quotient.getChoiceLabeling();
+                storm::models::sparse::ChoiceLabeling labeling(this->choice_map.size());
+                for(auto const& label : quotient_labeling.getLabels()) {
+                    labeling.addLabel(label);
+                }
+                for(uint64_t choice = 0; choice < this->choice_map.size(); choice++) {
+                    for(auto const& label : quotient_labeling.getLabelsOfChoice(this->choice_map[choice])) {
+                        labeling.addLabelToChoice(label, choice);
+                    }
+                }
+                return labeling;
+            }
+
+            template<typename ValueType>
+            storm::models::sparse::StandardRewardModel<ValueType> QuotientMinimizer<ValueType>::constructRewardModel(
+                storm::models::sparse::StandardRewardModel<ValueType> const& reward_model
+            ) {
+                boost::optional<std::vector<ValueType>> state_rewards, action_rewards;
+                if(reward_model.hasStateRewards()) {
+                    state_rewards = std::vector<ValueType>();
+                    for(auto state : this->block_representative) {
+                        state_rewards->push_back(reward_model.getStateReward(state));
+                    }
+                }
+                if(reward_model.hasStateActionRewards()) {
+                    action_rewards = std::vector<ValueType>();
+                    for(auto choice : this->choice_map) {
+                        action_rewards->push_back(reward_model.getStateActionReward(choice));
+                    }
+                }
+                return storm::models::sparse::StandardRewardModel<ValueType>(std::move(state_rewards), std::move(action_rewards));
+            }
+
+            template<typename ValueType>
+            std::shared_ptr<storm::models::sparse::Mdp<ValueType>> QuotientMinimizer<ValueType>::constructMdp() {
+                storm::storage::sparse::ModelComponents<ValueType> components;
+                components.transitionMatrix = this->constructTransitionMatrix();
+                assert(components.transitionMatrix.isProbabilistic());
+                components.stateLabeling = this->constructStateLabeling();
+                if(this->quotient.hasChoiceLabeling()) {
+                    components.choiceLabeling = this->constructChoiceLabeling();
+                }
+                for (auto const& reward_model : this->quotient.getRewardModels()) {
+                    auto constructed = this->constructRewardModel(reward_model.second);
+                    components.rewardModels.emplace(reward_model.first, constructed);
+                }
+                return std::make_shared<storm::models::sparse::Mdp<ValueType>>(std::move(components));
+            }
+
+            template class QuotientMinimizer<double>;
+    }
+}
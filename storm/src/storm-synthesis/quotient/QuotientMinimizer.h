@@ -0,0 +1,55 @@
+#pragma once
+
+#include "storm/models/sparse/Mdp.h"
+#include "storm/storage/BitVector.h"
+
+#include <map>
+
+namespace storm {
+    namespace synthesis {
+
+        template<typename ValueType>
+        class QuotientMinimizer {
+
+        public:
+
+            /**
+             * Minimize the quotient MDP by strong bisimulation that preserves holes: states marked as fixed (states
+             * with a nondeterministic choice) keep their own block and all their choices in the original order, the
+             * remaining states, which have a single choice, are lumped if they agree on the state labels, rewards
+             * and lumped successor distributions.
+             */
+            QuotientMinimizer(storm::models::sparse::Mdp<ValueType> const& quotient, storm::storage::BitVector const& fixed_states);
+
+            // construct the minimized MDP
+            std::shared_ptr<storm::models::sparse::Mdp<ValueType>> constructMdp();
+
+            // for each state of the quotient, its block (a state of the minimized MDP)
+            std::vector<uint64_t> state_to_block;
+            // for each choice of the minimized MDP, the corresponding choice of the quotient
+            std::vector<uint64_t> choice_map;
+            // number of blocks
+            uint64_t num_blocks;
+
+        private:
+
+            storm::models::sparse::Mdp<ValueType> const& quotient;
+            storm::storage::BitVector fixed_states;
+
+            // for each block, one of its states
+            std::vector<uint64_t> block_representative;
+
+            void computeInitialPartition();
+            // refine the partition once, return true if some block has been split
+            bool refinePartition();
+            std::map<uint64_t,ValueType> lumpedDistribution(uint64_t choice);
+
+            storm::storage::SparseMatrix<ValueType> constructTransitionMatrix();
+            storm::models::sparse::StateLabeling constructStateLabeling();
+            storm::models::sparse::ChoiceLabeling constructChoiceLabeling();
+            storm::models::sparse::StandardRewardModel<ValueType> constructRewardModel(
+                storm::models::sparse::StandardRewardModel<ValueType> const& reward_model
+            );
+        };
+    }
+}
@@ -4,6 +4,7 @@
 
 #include <queue>
 #include <deque>
+#include <algorithm>
 
 #include "storm/storage/BitVector.h"
 #include "storm/exceptions/UnexpectedException.h"
@@ -115,6 +116,8 @@ namespace storm {
                 this->formula_modified.push_back(modified_formula);     
             }
 
+            this->formula_conflicts.resize(formulae.size(), 0);
+
         }
 
         template <typename ValueType, typename StateType>
@@ -297,6 +300,9 @@ namespace storm {
             size_t other_state_quant
             ) {
             
+            this->timer_preparation.start();
+            this->dtmcs_prepared++;
+
             // Clear up previous DTMC metadata
             this->hole_wave.clear();
             this->wave_states.clear();
@@ -311,6 +317,7 @@ namespace storm {
             this->exploreReplicatedDtmc(
                 this->hole_wave, this->wave_states, initial_state, other_initial_state
             );
+            this->timer_preparation.stop();
 
         }
 
@@ -321,6 +328,9 @@ namespace storm {
             size_t state_quant
             ) {
 
+            this->timer_preparation.start();
+            this->dtmcs_prepared++;
+
             // Clear up previous DTMC metadata
             this->hole_wave.clear();
             this->wave_states.clear();
@@ -471,6 +481,7 @@ namespace storm {
                     }
                 }
             }
+            this->timer_preparation.stop();
         }
 
         template <typename ValueType, typename StateType>
@@ -649,6 +660,7 @@ namespace storm {
             this->timer_model_check.start();
             hint_result = storm::api::verifyWithSparseEngine<ValueType>(env, subdtmc, task);
             this->timer_model_check.stop();
+            this->model_checks++;
             storm::modelchecker::ExplicitQuantitativeCheckResult<ValueType>& result = hint_result->asExplicitQuantitativeCheckResult<ValueType>();
             return result[initial_state];
         }
@@ -689,37 +701,47 @@ namespace storm {
                 std::cout << this->hole_wave[hole] << ",";
             }
             std::cout << std::endl;*/
-            bool sat = true;
-            while(true) {
-                ValueType result = this->expandAndCheck(
-                    formula_index, matrix_subdtmc, labeling_subdtmc,
-                    reward_models_subdtmc, this->wave_states[wave], this->hint_result, state_quant
-                );
-
-                result = result + bound;
-                if(this->formula_safety[formula_index] && !strict) {
-                    // the formula is of type P <= bound
-                    sat = (result <= formula_bound) || abs(result - formula_bound) < exp(-5);
-                } else if (!strict){
-                    // the formula is of type P >= bound
-                    sat = (result >= formula_bound) || abs(result - formula_bound) < exp(-5);
-                } else if (this->formula_safety[formula_index]) {
-                    // the formula is of type P < bound
-                    sat = (result < formula_bound) && abs(result - formula_bound) > exp(-5);
-
-                } else {
-                    // the formula is of type P > bound
-                    sat = (result > formula_bound) && abs(result - formula_bound) > exp(-5);
-                }
+            uint_fast64_t probes = 0;
+            if(this->wave_bisection && wave_last >= this->wave_bisection_linear_limit) {
+                // A single working copy of the sub-DTMC is moved between the probed waves
+                std::vector<std::vector<std::pair<StateType,ValueType>>> matrix_probe = matrix_subdtmc;
+                std::unordered_map<std::string, storm::models::sparse::StandardRewardModel<ValueType>> reward_models_probe = reward_models_subdtmc;
+                uint_fast64_t expanded_waves = 0;
+                auto check_wave = [&](uint_fast64_t probe) {
+                    probes++;
+                    std::vector<StateType> to_expand = this->moveToWave(
+                        formula_index, probe, expanded_waves, matrix_subdtmc, reward_models_subdtmc,
+                        matrix_probe, reward_models_probe
+                    );
+                    ValueType result = this->expandAndCheck(
+                        formula_index, matrix_probe, labeling_subdtmc,
+                        reward_models_probe, to_expand, NULL, state_quant
+                    );
+                    return this->meetsBound(formula_index, result + bound, formula_bound, strict);
+                };
+                wave = this->locateViolatingWave(wave_last, check_wave);
+            } else {
+                bool sat = true;
+                while(true) {
+                    probes++;
+                    ValueType result = this->expandAndCheck(
+                        formula_index, matrix_subdtmc, labeling_subdtmc,
+                        reward_models_subdtmc, this->wave_states[wave], this->hint_result, state_quant
+                    );
+                    sat = this->meetsBound(formula_index, result + bound, formula_bound, strict);
 
-                // std::cout << "[storm] wave " << wave << "/" << wave_last << " : " << satisfied << std::endl;
-                if(!sat || wave == wave_last) {
-                    break;
-                } else {
-                    wave++;
+                    // std::cout << "[storm] wave " << wave << "/" << wave_last << " : " << satisfied << std::endl;
+                    if(!sat || wave == wave_last) {
+                        break;
+                    } else {
+                        wave++;
+                    }
                 }
             }
 
+            this->formula_conflicts[formula_index]++;
+            this->waves_probed += probes;
+
             // Return a set of critical holes
             std::vector<uint_fast64_t> critical_holes;
             for(uint_fast64_t hole = 0; hole < this->hole_count; hole++) {
@@ -777,45 +799,67 @@ namespace storm {
             uint_fast64_t wave_last = this->wave_states.size()-1;
             uint_fast64_t wave = 0;
 
-            bool sat = true;
-            while(true) {
-
-                // explore primary direction
-                ValueType result = this->expandAndCheck(
-                    primary_formula_index, matrix_subdtmc, labeling_subdtmc,
-                    reward_models_subdtmc, this->wave_states[wave], this->hint_result, state_quant
-                );
-
-                // explore secondary direction
-                ValueType formula_bound = this->expandAndCheck(
-                        secondary_formula_index, other_matrix_subdtmc, other_labeling_subdtmc,
-                        other_reward_models_subdtmc, this->wave_states[wave], this->other_hint_result, other_state_quant
+            uint_fast64_t probes = 0;
+            if(this->wave_bisection && wave_last >= this->wave_bisection_linear_limit) {
+                // A single working copy of each sub-DTMC is moved between the probed waves
+                std::vector<std::vector<std::pair<StateType,ValueType>>> matrix_probe = matrix_subdtmc;
+                std::unordered_map<std::string, storm::models::sparse::StandardRewardModel<ValueType>> reward_models_probe = reward_models_subdtmc;
+                uint_fast64_t expanded_waves = 0;
+                std::vector<std::vector<std::pair<StateType,ValueType>>> other_matrix_probe = other_matrix_subdtmc;
+                std::unordered_map<std::string, storm::models::sparse::StandardRewardModel<ValueType>> other_reward_models_probe = other_reward_models_subdtmc;
+                uint_fast64_t other_expanded_waves = 0;
+                auto check_wave = [&](uint_fast64_t probe) {
+                    probes++;
+                    std::vector<StateType> to_expand = this->moveToWave(
+                        primary_formula_index, probe, expanded_waves, matrix_subdtmc, reward_models_subdtmc,
+                        matrix_probe, reward_models_probe
+                    );
+                    ValueType result = this->expandAndCheck(
+                        primary_formula_index, matrix_probe, labeling_subdtmc,
+                        reward_models_probe, to_expand, NULL, state_quant
                     );
 
-                result = result + bound;
-                if(this->formula_safety[primary_formula_index] && !strict) {
-                    // the formula is of type P <= bound
-                    sat = (result <= formula_bound) || abs(result - formula_bound) < exp(-5);
-                } else if (!strict){
-                    // the formula is of type P >= bound
-                    sat = (result >= formula_bound) || abs(result - formula_bound) < exp(-5);
-                } else if (this->formula_safety[primary_formula_index]) {
-                    // the formula is of type P < bound
-                    sat = (result < formula_bound) && abs(result - formula_bound) > exp(-5);
-
-                } else {
-                    // the formula is of type P > bound
-                    sat = (result > formula_bound) && abs(result - formula_bound) > exp(-5);
-                }
+                    std::vector<StateType> other_to_expand = this->moveToWave(
+                        secondary_formula_index, probe, other_expanded_waves, other_matrix_subdtmc,
+                        other_reward_models_subdtmc, other_matrix_probe, other_reward_models_probe
+                    );
+                    ValueType formula_bound = this->expandAndCheck(
+                        secondary_formula_index, other_matrix_probe, other_labeling_subdtmc,
+                        other_reward_models_probe, other_to_expand, NULL, other_state_quant
+                    );
+                    return this->meetsBound(primary_formula_index, result + bound, formula_bound, strict);
+                };
+                wave = this->locateViolatingWave(wave_last, check_wave);
+            } else {
+                bool sat = true;
+                while(true) {
+                    probes++;
+
+                    // explore primary direction
+                    ValueType result = this->expandAndCheck(
+                        primary_formula_index, matrix_subdtmc, labeling_subdtmc,
+                        reward_models_subdtmc, this->wave_states[wave], this->hint_result, state_quant
+                    );
 
-                //std::cout << "[storm] wave " << wave << "/" << wave_last << " : " << sat << "\n";
-                if(!sat || wave == wave_last) {
-                    break;
-                }else{
-                    wave++;
+                    // explore secondary direction
+                    ValueType formula_bound = this->expandAndCheck(
+                            secondary_formula_index, other_matrix_subdtmc, other_labeling_subdtmc,
+                            other_reward_models_subdtmc, this->wave_states[wave], this->other_hint_result, other_state_quant
+                        );
+                    sat = this->meetsBound(primary_formula_index, result + bound, formula_bound, strict);
+
+                    //std::cout << "[storm] wave " << wave << "/" << wave_last << " : " << sat << "\n";
+                    if(!sat || wave == wave_last) {
+                        break;
+                    }else{
+                        wave++;
+                    }
                 }
             }
 
+            this->formula_conflicts[primary_formula_index]++;
+            this->waves_probed += probes;
+
             // Return a set of critical holes
             std::vector<uint_fast64_t> critical_holes;
             for(uint_fast64_t hole = 0; hole < this->hole_count; hole++) {
@@ -830,12 +874,126 @@ namespace storm {
             return critical_holes;
         }
 
+        template <typename ValueType, typename StateType>
+        bool CounterexampleGenerator<ValueType,StateType>::meetsBound(
+            uint_fast64_t formula_index,
+            ValueType result,
+            ValueType formula_bound,
+            bool strict
+        ) {
+            if(this->formula_safety[formula_index] && !strict) {
+                // the formula is of type P <= bound
+                return (result <= formula_bound) || abs(result - formula_bound) < exp(-5);
+            } else if (!strict){
+                // the formula is of type P >= bound
+                return (result >= formula_bound) || abs(result - formula_bound) < exp(-5);
+            } else if (this->formula_safety[formula_index]) {
+                // the formula is of type P < bound
+                return (result < formula_bound) && abs(result - formula_bound) > exp(-5);
+            } else {
+                // the formula is of type P > bound
+                return (result > formula_bound) && abs(result - formula_bound) > exp(-5);
+            }
+        }
+
+        template <typename ValueType, typename StateType>
+        std::vector<StateType> CounterexampleGenerator<ValueType,StateType>::moveToWave(
+            uint_fast64_t index,
+            uint_fast64_t wave,
+            uint_fast64_t & expanded_waves,
+            std::vector<std::vector<std::pair<StateType,ValueType>>> const& matrix_subdtmc,
+            std::unordered_map<std::string,storm::models::sparse::StandardRewardModel<ValueType>> const& reward_models_subdtmc,
+            std::vector<std::vector<std::pair<StateType,ValueType>>> & matrix_probe,
+            std::unordered_map<std::string,storm::models::sparse::StandardRewardModel<ValueType>> & reward_models_probe
+        ) {
+            std::vector<StateType> to_expand;
+            if(wave + 1 > expanded_waves) {
+                // Expand the waves above the previous probe
+                for(uint_fast64_t expanded = expanded_waves; expanded <= wave; expanded++) {
+                    to_expand.insert(to_expand.end(), this->wave_states[expanded].begin(), this->wave_states[expanded].end());
+                }
+            } else {
+                // Reroute the states of the waves above this probe to their shortcuts again
+                for(uint_fast64_t collapsed = wave + 1; collapsed < expanded_waves; collapsed++) {
+                    for(StateType state: this->wave_states[collapsed]) {
+                        matrix_probe[state] = matrix_subdtmc[state];
+                    }
+                    if(this->formula_reward[index]) {
+                        std::string const& name = this->formula_reward_name[index];
+                        storm::models::sparse::StandardRewardModel<ValueType> const& shortcut_rewards = reward_models_subdtmc.find(name)->second;
+                        storm::models::sparse::StandardRewardModel<ValueType> & probe_rewards = reward_models_probe.find(name)->second;
+                        for(StateType state: this->wave_states[collapsed]) {
+                            probe_rewards.setStateReward(state, shortcut_rewards.getStateReward(state));
+                        }
+                    }
+                }
+            }
+            expanded_waves = wave + 1;
+            return to_expand;
+        }
+
+        template <typename ValueType, typename StateType>
+        uint_fast64_t CounterexampleGenerator<ValueType,StateType>::locateViolatingWave(
+            uint_fast64_t wave_last,
+            std::function<bool(uint_fast64_t)> const& check_wave
+        ) {
+            // Galloping: probe waves 0,1,3,7,... until the formula is violated
+            uint_fast64_t low = 0;
+            uint_fast64_t high = wave_last;
+            uint_fast64_t probe = 0;
+            uint_fast64_t step = 1;
+            while(true) {
+                if(!check_wave(probe)) {
+                    high = probe;
+                    break;
+                }
+                if(probe == wave_last) {
+                    // every wave satisfies the formula
+                    return wave_last;
+                }
+                low = probe + 1;
+                probe = std::min(probe + step, wave_last);
+                step *= 2;
+            }
+
+            // Binary search: the first violating wave lies within [low,high]
+            while(low < high) {
+                uint_fast64_t middle = low + (high - low) / 2;
+                if(check_wave(middle)) {
+                    low = middle + 1;
+                } else {
+                    high = middle;
+                }
+            }
+            return high;
+        }
+
+        template <typename ValueType, typename StateType>
+        void CounterexampleGenerator<ValueType,StateType>::setWaveBisection(bool enabled, uint_fast64_t linear_limit) {
+            this->wave_bisection = enabled;
+            this->wave_bisection_linear_limit = linear_limit;
+        }
+
         template <typename ValueType, typename StateType>
         void CounterexampleGenerator<ValueType,StateType>::printProfiling() {
+            std::cout << "[s] preparation: " << this->timer_preparation << std::endl;
             std::cout << "[s] conflict: " << this->timer_conflict << std::endl;
             std::cout << "[s]     model checking: " << this->timer_model_check << std::endl;
         }
 
+        template <typename ValueType, typename StateType>
+        typename CounterexampleGenerator<ValueType,StateType>::GeneratorStats CounterexampleGenerator<ValueType,StateType>::stats() const {
+            GeneratorStats stats;
+            stats.formula_conflicts = this->formula_conflicts;
+            stats.dtmcs_prepared = this->dtmcs_prepared;
+            stats.waves_probed = this->waves_probed;
+            stats.model_checks = this->model_checks;
+            stats.preparation_time = this->timer_preparation.getTimeInMilliseconds();
+            stats.conflict_time = this->timer_conflict.getTimeInMilliseconds();
+            stats.model_checking_time = this->timer_model_check.getTimeInMilliseconds();
+            return stats;
+        }
+
          // Explicitly instantiate functions and classes.
         template class CounterexampleGenerator<double, uint_fast64_t>;
 
@@ -12,6 +12,8 @@
 #include "storm/models/sparse/Dtmc.h"
 #include "storm/utility/Stopwatch.h"
 
+#include <functional>
+
 namespace storm {
     namespace synthesis {
 
@@ -19,6 +21,23 @@ namespace storm {
         class CounterexampleGenerator {
         public:
 
+            struct GeneratorStats {
+                // For each formula, number of conflicts constructed wrt this formula
+                std::vector<uint_fast64_t> formula_conflicts;
+                // Number of DTMCs prepared for CE construction
+                uint_fast64_t dtmcs_prepared = 0;
+                // Total number of waves whose sub-DTMCs were model checked in the constructed conflicts
+                uint_fast64_t waves_probed = 0;
+                // Number of sub-DTMC model checks
+                uint_fast64_t model_checks = 0;
+                // Time spent exploring DTMCs (wave computation), in milliseconds
+                uint_fast64_t preparation_time = 0;
+                // Time spent constructing conflicts (including model checking), in milliseconds
+                uint_fast64_t conflict_time = 0;
+                // Time spent model checking sub-DTMCs, in milliseconds
+                uint_fast64_t model_checking_time = 0;
+            };
+
             /*!
              * Preprocess the quotient MDP and its bound on the reachability
              * probability before constructing counterexamples from various
@@ -94,13 +113,64 @@ namespace storm {
                 bool strict
                 );
 
+            /*!
+             * Choose the strategy used to locate the wave that violates the formula.
+             * @param enabled If true, the violating wave is located by a galloping
+             *   search followed by a binary search over the waves; otherwise, the
+             *   waves are expanded and checked one by one.
+             * @param linear_limit DTMCs having at most this number of waves are
+             *   always explored linearly.
+             */
+            void setWaveBisection(bool enabled, uint_fast64_t linear_limit);
+
             /*!
              * TODO
              */
             void printProfiling();
 
+            /*!
+             * Collect conflict and timing statistics accumulated so far.
+             */
+            GeneratorStats stats() const;
+
         protected:
 
+            /**
+             * Locate the first wave in which the (monotone) satisfaction check fails.
+             * @param wave_last Index of the last wave.
+             * @param check_wave Returns true if the sub-DTMC expanded up to the
+             *   given wave still satisfies the formula.
+             * @return The first violating wave, or wave_last if no wave violates
+             *   the formula.
+             */
+            uint_fast64_t locateViolatingWave(
+                uint_fast64_t wave_last,
+                std::function<bool(uint_fast64_t)> const& check_wave
+                );
+
+            /**
+             * Move a working copy of a sub-DTMC to the given wave: the states of the waves above the given one are
+             * rerouted to their shortcuts again, the states of the newly reached waves are returned to be expanded.
+             * @param expanded_waves (input/output) Number of waves expanded in the working copy.
+             * @param matrix_subdtmc Matrix of shortcuts.
+             * @param reward_models_subdtmc Reward models of the shortcuts.
+             * @param matrix_probe (input/output) Working copy of the matrix.
+             * @param reward_models_probe (input/output) Working copy of the reward models.
+             * @return states to expand by expandAndCheck
+             */
+            std::vector<StateType> moveToWave(
+                uint_fast64_t index,
+                uint_fast64_t wave,
+                uint_fast64_t & expanded_waves,
+                std::vector<std::vector<std::pair<StateType,ValueType>>> const& matrix_subdtmc,
+                std::unordered_map<std::string,storm::models::sparse::StandardRewardModel<ValueType>> const& reward_models_subdtmc,
+                std::vector<std::vector<std::pair<StateType,ValueType>>> & matrix_probe,
+                std::unordered_map<std::string,storm::models::sparse::StandardRewardModel<ValueType>> & reward_models_probe
+                );
+
+            /** Compare the result of a sub-DTMC against the bound of the formula. */
+            bool meetsBound(uint_fast64_t formula_index, ValueType result, ValueType formula_bound, bool strict);
+
             void exploreReplicatedDtmc (
                 std::vector<uint_fast64_t> &hole_wave,
                 std::vector<std::vector<StateType>> &wave_states,
@@ -194,9 +264,19 @@ namespace storm {
             std::shared_ptr<storm::modelchecker::CheckResult> hint_result;
             std::shared_ptr<storm::modelchecker::CheckResult> other_hint_result;
 
+            // Whether the violating wave is located by galloping/binary search
+            bool wave_bisection = false;
+            // DTMCs with at most this number of waves are explored linearly
+            uint_fast64_t wave_bisection_linear_limit = 8;
+
             // Profiling
+            storm::utility::Stopwatch timer_preparation;
             storm::utility::Stopwatch timer_conflict;
             storm::utility::Stopwatch timer_model_check;
+            std::vector<uint_fast64_t> formula_conflicts;
+            uint_fast64_t dtmcs_prepared = 0;
+            uint_fast64_t waves_probed = 0;
+            uint_fast64_t model_checks = 0;
 
         };
 
@@ -13,4 +13,5 @@ PYBIND11_MODULE(synthesis, m) {
     define_synthesis(m);
     define_pomdp(m);
     define_helpers(m);
+    define_quotient(m);
 }
@@ -5,6 +5,9 @@
 #include "storm/environment/Environment.h"
 #include "storm/api/verification.h"
 #include "storm/modelchecker/hints/ExplicitModelCheckerHint.h"
+#include "storm/logic/Formulas.h"
+#include "storm/utility/macros.h"
+#include "storm/exceptions/NotSupportedException.h"
 
 #include "storm/storage/SparseMatrix.h"
 
@@ -25,6 +28,34 @@ std::shared_ptr<storm::modelchecker::CheckResult> modelCheckWithHint(
     return storm::api::verifyWithSparseEngine<ValueType>(env, model, task);
 }
 
+std::shared_ptr<storm::logic::Formula> strengthenReachabilityFormula(
+    storm::logic::Formula const& formula,
+    std::string const& prob0_label,
+    std::string const& prob1_label
+) {
+    // P [phi U psi] is equivalent to P [(phi & !prob0) U (psi | prob1)] as long as prob0 (prob1) states reach psi
+    // with probability 0 (1) under all schedulers
+    storm::logic::ProbabilityOperatorFormula const& operator_formula = formula.asProbabilityOperatorFormula();
+    storm::logic::Formula const& path_formula = operator_formula.getSubformula();
+    std::shared_ptr<storm::logic::Formula const> phi, psi;
+    if(path_formula.isEventuallyFormula()) {
+        phi = std::make_shared<storm::logic::BooleanLiteralFormula>(true);
+        psi = path_formula.asEventuallyFormula().getSubformula().asSharedPointer();
+    } else {
+        STORM_LOG_THROW(path_formula.isUntilFormula(), storm::exceptions::NotSupportedException, "Only unbounded reachability formulae can be strengthened.");
+        phi = path_formula.asUntilFormula().getLeftSubformula().asSharedPointer();
+        psi = path_formula.asUntilFormula().getRightSubformula().asSharedPointer();
+    }
+    auto not_prob0 = std::make_shared<storm::logic::UnaryBooleanStateFormula>(
+        storm::logic::UnaryBooleanStateFormula::OperatorType::Not, std::make_shared<storm::logic::AtomicLabelFormula>(prob0_label)
+    );
+    auto prob1 = std::make_shared<storm::logic::AtomicLabelFormula>(prob1_label);
+    auto left = std::make_shared<storm::logic::BinaryBooleanStateFormula>(storm::logic::BinaryBooleanStateFormula::OperatorType::And, phi, not_prob0);
+    auto right = std::make_shared<storm::logic::BinaryBooleanStateFormula>(storm::logic::BinaryBooleanStateFormula::OperatorType::Or, psi, prob1);
+    auto until = std::make_shared<storm::logic::UntilFormula>(left, right);
+    return std::make_shared<storm::logic::ProbabilityOperatorFormula>(until, operator_formula.getOperatorInformation());
+}
+
 template<typename ValueType>
 std::shared_ptr<storm::modelchecker::CheckResult> getExpectedNumberOfVisits(storm::Environment const& env, std::shared_ptr<storm::models::sparse::Model<ValueType>> const& model,
 uint64_t initialState
@@ -46,6 +77,8 @@ void define_helpers(py::module& m) {
 
     m.def("model_check_with_hint", &modelCheckWithHint<double>, "Perform model checking using the sparse engine", py::arg("model"), py::arg("task"), py::arg("environment"), py::arg("hint_values"));
     
+    m.def("strengthen_reachability_formula", &strengthenReachabilityFormula, "Restrict the until-formula to states that are not known to reach the target with probability 0 and extend the target by states known to reach it with probability 1", py::arg("formula"), py::arg("prob0_label"), py::arg("prob1_label"));
+
     m.def("compute_expected_number_of_visits", &getExpectedNumberOfVisits<double>, py::arg("env"), py::arg("model"), py::arg("initialState"));
 
     m.def("construct_selection", [] ( storm::storage::BitVector default_actions, std::vector<uint_fast64_t> selected_actions) {
@@ -0,0 +1,15 @@
+#include "synthesis.h"
+
+#include "storm-synthesis/quotient/QuotientMinimizer.h"
+
+// Define python bindings
+void define_quotient(py::module& m) {
+
+    py::class_<storm::synthesis::QuotientMinimizer<double>>(m, "QuotientMinimizer", "Hole-preserving bisimulation minimization of a quotient MDP")
+        .def(py::init<storm::models::sparse::Mdp<double> const&, storm::storage::BitVector const&>(), "Constructor.", py::arg("quotient"), py::arg("fixed_states"))
+        .def("construct_mdp", &storm::synthesis::QuotientMinimizer<double>::constructMdp, "Construct the minimized MDP.")
+        .def_property_readonly("state_to_block", [](storm::synthesis::QuotientMinimizer<double>& minimizer) {return minimizer.state_to_block;}, "For each quotient state, the state of the minimized MDP.")
+        .def_property_readonly("choice_map", [](storm::synthesis::QuotientMinimizer<double>& minimizer) {return minimizer.choice_map;}, "For each choice of the minimized MDP, the corresponding quotient choice.")
+        .def_property_readonly("num_blocks", [](storm::synthesis::QuotientMinimizer<double>& minimizer) {return minimizer.num_blocks;}, "Number of states of the minimized MDP.")
+        ;
+}
@@ -5,6 +5,18 @@
 // Define python bindings
 void define_synthesis(py::module& m) {
 
+    using CeGeneratorStats = storm::synthesis::CounterexampleGenerator<>::GeneratorStats;
+
+    py::class_<CeGeneratorStats>(m, "CounterexampleGeneratorStats", "Conflict and timing stats of the counterexample generator")
+        .def_readonly("formula_conflicts", &CeGeneratorStats::formula_conflicts, "Number of conflicts constructed wrt each formula")
+        .def_readonly("dtmcs_prepared", &CeGeneratorStats::dtmcs_prepared, "Number of DTMCs prepared for CE construction")
+        .def_readonly("waves_probed", &CeGeneratorStats::waves_probed, "Total number of waves whose sub-DTMCs were model checked in the constructed conflicts")
+        .def_readonly("model_checks", &CeGeneratorStats::model_checks, "Number of sub-DTMC model checks")
+        .def_readonly("preparation_time", &CeGeneratorStats::preparation_time, "Time spent exploring DTMCs (ms)")
+        .def_readonly("conflict_time", &CeGeneratorStats::conflict_time, "Time spent constructing conflicts (ms)")
+        .def_readonly("model_checking_time", &CeGeneratorStats::model_checking_time, "Time spent model checking sub-DTMCs (ms)")
+        ;
+
     // Counterexample generation
     py::class_<storm::synthesis::CounterexampleGenerator<>>(
         m, "CounterexampleGenerator", "Counterexample generation"
@@ -45,18 +57,24 @@ void define_synthesis(py::module& m) {
             py::arg("primary_formula_index"), py::arg("secondary_formula_index"),py::arg("multitarget"), py::arg("bound"), py::arg("mdp_bounds"),py::arg("other_mdp_bounds"),
             py::arg("mdp_quotient_state_map"), py::arg("state_quant"), py::arg("other_state_quant"), py::arg("strict")
             )
+        .def(
+            "set_wave_bisection",
+            &storm::synthesis::CounterexampleGenerator<>::setWaveBisection,
+            "Locate the violating wave by galloping/binary search instead of a linear scan.",
+            py::arg("enabled"), py::arg("linear_limit") = 8
+            )
         .def(
             "print_profiling",
             &storm::synthesis::CounterexampleGenerator<>::printProfiling,
             "Print profiling stats."
             )
-        /*.def_property_readonly(
+        .def_property_readonly(
             "stats",
             [](storm::synthesis::CounterexampleGenerator<> & counterexample) {
                 return counterexample.stats();
             },
             "Read stats."
-        );*/
+            )
         ;
     
 }
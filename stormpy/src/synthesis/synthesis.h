@@ -5,3 +5,4 @@
 void define_synthesis(py::module& m);
 void define_pomdp(py::module &m);
 void define_helpers(py::module &m);
+void define_quotient(py::module &m);
@@ -1,3 +1,5 @@
+import os
+
 import pytest
 
 import stormpy._config as config
@@ -21,3 +23,7 @@ dft = pytest.mark.skipif(not has_dft, reason="No support for DFTs")
 gspn = pytest.mark.skipif(not has_gspn, reason="No support for GSPNs")
 pars = pytest.mark.skipif(not has_pars, reason="No support for parametric model checking")
 numpy_avail = pytest.mark.skipif(not has_numpy, reason="Numpy not available")
+
+# Microbenchmarks are slow, run them only on request
+has_benchmark = "STORMPY_BENCHMARK" in os.environ
+benchmark = pytest.mark.skipif(not has_benchmark, reason="Benchmarks are enabled by setting STORMPY_BENCHMARK")
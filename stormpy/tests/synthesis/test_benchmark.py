@@ -0,0 +1,189 @@
+import time
+
+import pytest
+
+import stormpy
+import stormpy.synthesis
+
+from configurations import benchmark
+
+# Microbenchmarks of the bindings on the synthesis hot path. Every binding is timed on a grid MDP of
+# representative quotient sizes and the time of a call is split into
+#  - overhead: time of the call on a single-state model (crossing the boundary, argument dispatch),
+#  - solver: the remaining time of the call.
+# The conversions of the containers are not timed separately: no binding accepts pre-converted C++ vectors,
+# so they cannot be isolated from the call and are included in the solver time.
+# Run with STORMPY_BENCHMARK=1 python -m pytest -s tests/synthesis/test_benchmark.py
+
+grid_sizes = [1, 10, 30, 100]
+repetitions = 5
+
+grid_program = """
+mdp
+
+const int N = {size};
+
+formula up = y < N-1;
+formula right = x < N-1;
+
+module grid
+    x : [0..N-1] init 0;
+    y : [0..N-1] init 0;
+
+    [up] up -> 0.9: (y'=y+1) + 0.1: (x'=min(x+1,N-1));
+    [right] right -> 0.9: (x'=x+1) + 0.1: (y'=min(y+1,N-1));
+    [stay] !up | !right -> 0.5: (x'=min(x+1,N-1)) + 0.5: (y'=min(y+1,N-1));
+endmodule
+
+rewards "steps"
+    true : 1;
+endrewards
+
+label "goal" = x=N-1 & y=N-1;
+"""
+
+reachability = "Pmax=? [F \"goal\"]"
+expected_steps = "R{\"steps\"}min=? [F \"goal\"]"
+
+
+def timed(call, *args):
+    ''' Minimal wall time of a call over the repetitions, together with the result of the last call. '''
+    best = None
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        result = call(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def report(binding, grid, overhead, total):
+    solver = max(total - overhead, 0)
+    print(f"\n{binding:<42} states {grid.mdp.nr_states:>6}: total {total * 1e3:9.3f} ms, overhead {overhead * 1e6:9.1f} us, "
+          f"solver {solver * 1e3:9.3f} ms")
+
+
+class Grid:
+    ''' Grid MDP with its first-choice DTMC, as built by the quotient containers. '''
+
+    def __init__(self, path):
+        program = stormpy.parse_prism_program(path)
+        self.properties = stormpy.parse_properties_for_prism_program(f"{reachability}; {expected_steps}", program)
+        self.formulae = [prop.raw_formula for prop in self.properties]
+        options = stormpy.BuilderOptions(self.formulae)
+        options.set_build_choice_labels()
+        options.set_build_all_reward_models()
+        self.mdp = stormpy.build_sparse_model_with_options(program, options)
+
+        self.all_states = stormpy.BitVector(self.mdp.nr_states, True)
+        self.first_choices = [self.mdp.nondeterministic_choice_indices[state] for state in range(self.mdp.nr_states)]
+        self.all_choices = list(range(self.mdp.nr_choices))
+        self.selection = stormpy.synthesis.construct_selection(stormpy.BitVector(self.mdp.nr_choices, False), self.first_choices)
+
+        submodel = stormpy.construct_submodel(self.mdp, self.all_states, self.selection, False, stormpy.SubsystemBuilderOptions())
+        self.state_map = list(submodel.new_to_old_state_mapping)
+        matrix = submodel.model.transition_matrix
+        matrix.make_row_grouping_trivial()
+        components = stormpy.storage.SparseModelComponents(matrix, submodel.model.labeling, submodel.model.reward_models)
+        self.dtmc = stormpy.storage.SparseDtmc(components)
+
+        # every state with a choice is a hole of its own
+        self.mdp_holes = []
+        for state in range(self.mdp.nr_states):
+            choices = self.mdp.nondeterministic_choice_indices[state + 1] - self.mdp.nondeterministic_choice_indices[state]
+            self.mdp_holes.append({state} if choices > 1 else set())
+
+
+@pytest.fixture(scope="module", params=grid_sizes, ids=[f"grid{size}" for size in grid_sizes])
+def grid(request, tmp_path_factory):
+    path = tmp_path_factory.mktemp("grid") / f"grid{request.param}.nm"
+    path.write_text(grid_program.format(size=request.param))
+    return Grid(str(path))
+
+
+@pytest.fixture(scope="module")
+def trivial(tmp_path_factory):
+    ''' Single-state grid measuring the per-call overhead of the bindings. '''
+    path = tmp_path_factory.mktemp("grid") / "grid1.nm"
+    path.write_text(grid_program.format(size=1))
+    return Grid(str(path))
+
+
+@benchmark
+class TestBindingsBenchmark:
+
+    def test_construct_submodel(self, grid, trivial):
+        def construct(model):
+            return stormpy.construct_submodel(model.mdp, model.all_states, model.selection, False, stormpy.SubsystemBuilderOptions())
+        overhead, _ = timed(construct, trivial)
+        total, submodel = timed(construct, grid)
+        assert submodel.model.nr_states <= grid.mdp.nr_states
+        report("construct_submodel", grid, overhead, total)
+
+    def test_model_checking(self, grid, trivial):
+        def check(model):
+            return stormpy.model_checking(model.mdp, model.formulae[0], only_initial_states=False, extract_scheduler=True)
+        overhead, _ = timed(check, trivial)
+        total, result = timed(check, grid)
+        assert len(result.get_values()) == grid.mdp.nr_states
+        report("model_checking", grid, overhead, total)
+
+    def test_model_check_with_hint(self, grid, trivial):
+        stormpy.synthesis.set_loglevel_off()
+        environment = stormpy.Environment()
+        hints = {}
+        for model in [grid, trivial]:
+            hints[model] = list(stormpy.model_checking(model.mdp, model.formulae[0], only_initial_states=False).get_values())
+
+        def check(model):
+            task = stormpy.core.CheckTask(model.formulae[0], only_initial_states=False)
+            task.set_produce_schedulers(produce_schedulers=True)
+            return stormpy.synthesis.model_check_with_hint(model.mdp, task, environment, hints[model])
+        overhead, _ = timed(check, trivial)
+        total, result = timed(check, grid)
+        assert result.has_scheduler
+        report("model_check_with_hint", grid, overhead, total)
+
+    def test_multiply_with_vector(self, grid, trivial):
+        values = {}
+        for model in [grid, trivial]:
+            values[model] = stormpy.model_checking(model.mdp, model.formulae[0], only_initial_states=False).get_values()
+
+        def multiply(model):
+            return stormpy.synthesis.multiply_with_vector(model.mdp.transition_matrix, values[model])
+        overhead, _ = timed(multiply, trivial)
+        total, choice_values = timed(multiply, grid)
+        assert len(choice_values) == grid.mdp.nr_choices
+        report("multiply_with_vector", grid, overhead, total)
+
+    def test_compute_expected_number_of_visits(self, grid, trivial):
+        environment = stormpy.Environment()
+
+        def visits(model):
+            return stormpy.synthesis.compute_expected_number_of_visits(environment, model.dtmc, model.dtmc.initial_states[0])
+        overhead, _ = timed(visits, trivial)
+        total, result = timed(visits, grid)
+        assert len(result.get_values()) == grid.dtmc.nr_states
+        report("compute_expected_number_of_visits", grid, overhead, total)
+
+    def test_construct_selection(self, grid, trivial):
+        def select(model):
+            return stormpy.synthesis.construct_selection(stormpy.BitVector(model.mdp.nr_choices, False), model.all_choices)
+        overhead, _ = timed(select, trivial)
+        total, selection = timed(select, grid)
+        assert selection.number_of_set_bits() == grid.mdp.nr_choices
+        report("construct_selection", grid, overhead, total)
+
+    def test_counterexample_generator(self, grid, trivial):
+        def construct(model):
+            return stormpy.synthesis.CounterexampleGenerator(model.mdp, model.mdp.nr_states, model.mdp_holes, model.formulae)
+        overhead, _ = timed(construct, trivial)
+        total, generator = timed(construct, grid)
+        report("CounterexampleGenerator", grid, overhead, total)
+
+        def conflict():
+            generator.prepare_dtmc(grid.dtmc, grid.state_map, 0)
+            return generator.construct_conflict(0, 0.5, 0, None, grid.state_map, 0, False)
+        total, holes = timed(conflict)
+        assert all(hole < grid.mdp.nr_states for hole in holes)
+        report("CounterexampleGenerator.construct_conflict", grid, 0, total)
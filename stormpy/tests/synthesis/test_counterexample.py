@@ -0,0 +1,94 @@
+import pytest
+
+import stormpy
+import stormpy.synthesis
+
+# Galloping/binary search for the violating wave must yield the same conflicts as the linear wave expansion.
+
+grid_program = """
+mdp
+
+const int N = 6;
+
+formula up = y < N-1;
+formula right = x < N-1;
+
+module grid
+    x : [0..N-1] init 0;
+    y : [0..N-1] init 0;
+
+    [up] up -> 0.9: (y'=y+1) + 0.1: (x'=min(x+1,N-1));
+    [right] right -> 0.9: (x'=x+1) + 0.1: (y'=min(y+1,N-1));
+    [stay] !up | !right -> 0.5: (x'=min(x+1,N-1)) + 0.5: (y'=min(y+1,N-1));
+endmodule
+
+rewards "steps"
+    true : 1;
+endrewards
+
+label "goal" = x=N-1 & y=N-1;
+"""
+
+expected_steps = "R{\"steps\"}min=? [F \"goal\"]"
+
+
+@pytest.fixture(scope="module")
+def grid(tmp_path_factory):
+    path = tmp_path_factory.mktemp("grid") / "grid.nm"
+    path.write_text(grid_program)
+    program = stormpy.parse_prism_program(str(path))
+    formulae = [prop.raw_formula for prop in stormpy.parse_properties_for_prism_program(expected_steps, program)]
+    options = stormpy.BuilderOptions(formulae)
+    options.set_build_choice_labels()
+    options.set_build_all_reward_models()
+    mdp = stormpy.build_sparse_model_with_options(program, options)
+
+    # the DTMC of the first choices, every state with a choice is a hole of its own
+    all_states = stormpy.BitVector(mdp.nr_states, True)
+    first_choices = [mdp.nondeterministic_choice_indices[state] for state in range(mdp.nr_states)]
+    selection = stormpy.synthesis.construct_selection(stormpy.BitVector(mdp.nr_choices, False), first_choices)
+    submodel = stormpy.construct_submodel(mdp, all_states, selection, False, stormpy.SubsystemBuilderOptions())
+    matrix = submodel.model.transition_matrix
+    matrix.make_row_grouping_trivial()
+    components = stormpy.storage.SparseModelComponents(matrix, submodel.model.labeling, submodel.model.reward_models)
+    dtmc = stormpy.storage.SparseDtmc(components)
+    state_map = list(submodel.new_to_old_state_mapping)
+    mdp_holes = []
+    for state in range(mdp.nr_states):
+        choices = mdp.nondeterministic_choice_indices[state + 1] - mdp.nondeterministic_choice_indices[state]
+        mdp_holes.append({state} if choices > 1 else set())
+
+    mdp_bounds = stormpy.model_checking(mdp, formulae[0], only_initial_states=False, extract_scheduler=True)
+    dtmc_value = stormpy.model_checking(dtmc, formulae[0], only_initial_states=True).at(dtmc.initial_states[0])
+    return mdp, dtmc, state_map, mdp_holes, formulae, mdp_bounds, dtmc_value
+
+
+def conflicts(grid, bisection, thresholds):
+    ''' Conflicts for every threshold and the number of probed waves. '''
+    mdp, dtmc, state_map, mdp_holes, formulae, mdp_bounds, _ = grid
+    generator = stormpy.synthesis.CounterexampleGenerator(mdp, mdp.nr_states, mdp_holes, formulae)
+    # a limit of 0 applies bisection to every DTMC
+    generator.set_wave_bisection(bisection, 0)
+    found = []
+    for threshold in thresholds:
+        generator.prepare_dtmc(dtmc, state_map, 0)
+        found.append(sorted(generator.construct_conflict(0, threshold, 0, mdp_bounds, state_map, 0, False)))
+    return found, generator.stats.waves_probed
+
+
+def test_bisection_matches_linear_expansion(grid):
+    mdp, _, _, mdp_holes, _, mdp_bounds, dtmc_value = grid
+    lower_bound = mdp_bounds.at(mdp.initial_states[0])
+    # thresholds from violated by the shortcuts alone to satisfied by the whole DTMC
+    thresholds = [lower_bound - 1] + [lower_bound + (dtmc_value - lower_bound) * step / 10 for step in range(11)] + [dtmc_value + 1]
+
+    linear, linear_probes = conflicts(grid, False, thresholds)
+    bisection, bisection_probes = conflicts(grid, True, thresholds)
+    assert bisection == linear
+
+    # the conflicts grow with the threshold, from no hole to every hole of the DTMC
+    sizes = [len(conflict) for conflict in linear]
+    assert sizes == sorted(sizes)
+    assert sizes[0] == 0
+    assert sizes[-1] == sum(1 for holes in mdp_holes if holes)
+    assert bisection_probes < linear_probes
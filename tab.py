@@ -3,6 +3,8 @@ from tabulate import tabulate
 import argparse
 import os
 
+from runs import read_metrics
+
 maze_re = re.compile(f'Loading properties from .*?eval/qest/.*?/./(.*?)/')
 time_re = re.compile(f'synthesis time: ([0-9]+\.[0-9]+)(.*)$') # match.group(1) is the time required by the experiment
 iters_re = re.compile(f'iterations: ([0-9]+)(.*)') # match.group(1) is the number of iterations
@@ -134,6 +136,34 @@ def parseHyperprob(path, tab_name, header, required):
     text_file.write(tabResults)
     text_file.close()
 
+def metrics_row(run, fields):
+    row = []
+    summary = run.get("summary")
+    progress = run.get("progress", {})
+    for field in fields:
+        if summary is not None and field in summary:
+            value = summary[field]
+        elif summary is None and field == "synthesis_time":
+            value = "Time Out"
+        elif summary is None and field in progress:
+            value = progress[field]
+        else:
+            value = run.get("quotient", {}).get(field, run["config"].get(field))
+        row.append("?" if value is None else value)
+    return row
+
+def parse_metrics(path, tab_name, header, fields):
+    results = [metrics_row(run, fields) for run in read_metrics(path)]
+    tabResults = tabulate(results, headers=header)
+
+    # remove potential previous data for security
+    if os.path.exists(tab_name):
+        os.remove(tab_name)
+
+    text_file = open(tab_name, "w")
+    text_file.write(tabResults)
+    text_file.close()
+
 if __name__ == '__main__':
     argp = argparse.ArgumentParser()
     argp.add_argument('exp', type=str, nargs='+', help='which experiment needs to be parsed?')
@@ -182,9 +212,10 @@ if __name__ == '__main__':
         parse(path, "qest/Table5-Opacity.csv", header,
               [maze_re, mdp_size_re, family_size_re, time_re, iters_re, distance_re])
 
-
-
-
-
-
-
+    if argument == "metrics":
+        # python3 tab.py metrics <metrics.jsonl> <table>
+        path, tab_name = args.exp[1], args.exp[2]
+        header = [
+            "Project", "Feasible", "MDP size", "AR family size", "AR time", "AR iters", "Percentage explored"]
+        parse_metrics(path, tab_name, header,
+              ["project", "feasible", "quotient_states", "family_size", "synthesis_time", "iterations_mdp", "explored"])